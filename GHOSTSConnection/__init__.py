@@ -1,10 +1,13 @@
 import os
 from sys import platform
 
-from requests import get, post, delete, put
+from requests import Session
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
 import logging
 import json
+import time
 from datetime import datetime, timezone
 import random
 import toml
@@ -40,6 +43,10 @@ class GHOSTSConnection:
     SIM_FILE_PATH = ''
     TEST_SESSION = False
     config_data = {}
+    # Seconds for which a confirmed connection is trusted by connection_alive()
+    CONNECTION_TTL = 5.0
+    # Concurrent requests for the batch methods (and pooled connections kept alive)
+    MAX_WORKERS = 8
 
     def __init__(self, num_attackers: int = 1, num_defenders: int = 1, local_session: bool = False,
                  test_session: bool = False):
@@ -76,6 +83,10 @@ class GHOSTSConnection:
                                      log_file=os.path.join(os.getcwd(), ghosts_log_path),
                                      format_str='%(asctime)s: [%(levelname)s] %(message)s',
                                      )
+        # One keep-alive session for every request, sized for the batch methods
+        self._session = Session()
+        self._session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=self.MAX_WORKERS))
+        self._connection_confirmed = None
         self.NUM_ATTACKERS = num_attackers
         self.NUM_DEFENDERS = num_defenders
         self.SIMULATION_ID = str(uuid4())[0:8]
@@ -103,9 +114,10 @@ class GHOSTSConnection:
     def confirm_connection(self) -> bool:
         ghosts_logger.info(f'Attempting to confirm connection to GHOSTS_API | http://{self.CONN_URL}/api/home')
         try:
-            test_data = get(url=f'http://{self.CONN_URL}/api/home', timeout=3)
+            test_data = self._session.get(url=f'http://{self.CONN_URL}/api/home', timeout=3)
             if test_data.status_code == 200:
                 ghosts_logger.debug(msg=f'Connection Confirmation: {str(test_data.content.decode("utf-8"))}')
+                self._connection_confirmed = time.monotonic()
                 return True
             else:
                 ghosts_logger.debug(msg=f'Could not confirm connection to GHOSTS API '
@@ -116,33 +128,53 @@ class GHOSTSConnection:
                 msg=f'GHOSTS-API is not currently responding, check the container status. | {e}')
             return False
 
+    # Like confirm_connection(), but trusts a connection confirmed within the last CONNECTION_TTL seconds
+    # rather than making another round trip to the GHOSTS API
+    def connection_alive(self) -> bool:
+        if self._connection_confirmed is not None \
+                and time.monotonic() - self._connection_confirmed < self.CONNECTION_TTL:
+            return True
+        return self.confirm_connection()
+
+    # Run fn on each of the argument tuples concurrently, returning the results in order
+    def _batch(self, fn, args_list: list) -> list:
+        if len(args_list) <= 1:
+            return [fn(*args) for args in args_list]
+        with ThreadPoolExecutor(max_workers=min(self.MAX_WORKERS, len(args_list))) as executor:
+            return list(executor.map(lambda args: fn(*args), args_list))
+
     # Create the specified number of attacker machines
     def create_attacker_machines(self) -> list:
-        machines_created = []
-        for a in range(0, self.NUM_ATTACKERS):
-            self.logger_sim.info(f'NUM ATTACKERS {self.NUM_ATTACKERS}')
-            self.logger_sim.info(f'Creating Attacker_{a}')
-            ret_dict = self.create_machine(f'Attacker_{a}', 'Attacker')
-            if ret_dict is None:
-                self.logger_sim.error(f'Unable to create Attacker_{a}.')
-                ghosts_logger.error(f'Unable to create Attacker_{a}.')
-            else:
-                machines_created.append(ret_dict)
-        return machines_created
+        self.logger_sim.info(f'NUM ATTACKERS {self.NUM_ATTACKERS}')
+        return self._create_player_machines('Attacker', self.NUM_ATTACKERS)
 
     # Create the specified number of defender machines
     def create_defender_machines(self) -> list:
+        return self._create_player_machines('Defender', self.NUM_DEFENDERS)
+
+    def _create_player_machines(self, machine_type: str, count: int) -> list:
         machines_created = []
-        for d in range(0, self.NUM_DEFENDERS):
-            self.logger_sim.info(f'Creating Defender_{d}')
-            ret_dict = self.create_machine(f'Defender_{d}', 'Defender')
-            if ret_dict is None:
-                self.logger_sim.error(f'Unable to create Defender_{d}.')
-                ghosts_logger.error(f'Unable to create Defender_{d}.')
+        names = [f'{machine_type}_{i}' for i in range(0, count)]
+        for name in names:
+            self.logger_sim.info(f'Creating {name}')
+        for name, ret_dict in zip(names, self.create_machines([(x, machine_type) for x in names])):
+            if not ret_dict:
+                self.logger_sim.error(f'Unable to create {name}.')
+                ghosts_logger.error(f'Unable to create {name}.')
             else:
-                machines_created.append(machines_created)
+                machines_created.append(ret_dict)
         return machines_created
 
+    # Create several machines concurrently from a list of (name, machine_type); returns the same as
+    # create_machine() for each, in order
+    def create_machines(self, machines: list) -> list:
+        created = self._batch(self._post_machine, machines)
+        # Record the ids in the order requested rather than the order created
+        for (name, machine_type), ret_dict in zip(machines, created):
+            if ret_dict:
+                self._record_machine(machine_type, ret_dict[name])
+        return created
+
     # Function to create a machine group within the environment
     def create_machinegroup(self, name: str) -> []:
         machine_group_uuid = str(uuid4())
@@ -151,9 +183,9 @@ class GHOSTSConnection:
             "groupMachines": []
         }
         machinegroup_req = json.dumps(machinegroup_req)
-        if self.confirm_connection():
+        if self.connection_alive():
             try:
-                req_status = post(url=f'http://{self.CONN_URL}/api/machinegroups',
+                req_status = self._session.post(url=f'http://{self.CONN_URL}/api/machinegroups',
                                   data=machinegroup_req,
                                   headers=JSON_HEADER,
                                   timeout=3)
@@ -174,6 +206,19 @@ class GHOSTSConnection:
 
     # Function to create a new machine within the environment
     def create_machine(self, name: str, machine_type: str) -> dict:
+        ret_dict = self._post_machine(name, machine_type)
+        if ret_dict:
+            self._record_machine(machine_type, ret_dict[name])
+        return ret_dict
+
+    def _record_machine(self, machine_type: str, machine_id: str):
+        if machine_type == 'Attacker':
+            self.attacker_Machine_Ids.append(machine_id)
+        else:
+            self.defender_Machine_Ids.append(machine_id)
+
+    # Create a machine in GHOSTS without recording it
+    def _post_machine(self, name: str, machine_type: str) -> dict:
         machine_json_req = {
             "name": name,
             "fqdn": "",
@@ -189,17 +234,13 @@ class GHOSTSConnection:
         }
         machine_json_req = json.dumps(machine_json_req)
         try:
-            req_status = post(url=f'http://{self.CONN_URL}/api/machines',
-                              data=machine_json_req,
-                              headers=JSON_HEADER,
-                              timeout=3)
+            req_status = self._session.post(url=f'http://{self.CONN_URL}/api/machines',
+                                            data=machine_json_req,
+                                            headers=JSON_HEADER,
+                                            timeout=3)
             if req_status.status_code == 201:
                 req_data = json.loads(req_status.content.decode('utf-8'))
                 ghosts_logger.debug(msg=f'New Machine created with id {req_data["id"]}')
-                if machine_type == 'Attacker':
-                    self.attacker_Machine_Ids.append(req_data['id'])
-                else:
-                    self.defender_Machine_Ids.append(req_data['id'])
                 return {name: str(req_data['id'])}
             else:
                 ghosts_logger.error(msg=f"Issue creating machine {name}. {str(req_status.content.decode('utf-8'))}")
@@ -221,7 +262,7 @@ class GHOSTSConnection:
     # Get an in depth report about a machine
     def get_machine_information(self, machine_id: str) -> dict:
         try:
-            test_data = get(url=f'http://{self.CONN_URL}/api/machines/{machine_id}')
+            test_data = self._session.get(url=f'http://{self.CONN_URL}/api/machines/{machine_id}')
             if test_data.status_code == 200:
                 ghosts_logger.debug(msg=f'Information about {machine_id}| {test_data.content.decode("utf-8")}')
                 return json.loads(test_data.content.decode('utf-8'))
@@ -234,13 +275,13 @@ class GHOSTSConnection:
     def list_machines(self) -> list:
         ret_list = []
         try:
-            test_data = get(url=f'http://{self.CONN_URL}/api/machines/list')
+            test_data = self._session.get(url=f'http://{self.CONN_URL}/api/machines/list')
             if test_data.status_code == 200:
                 machine_list = json.loads(test_data.content.decode('utf-8'))
                 ghosts_logger.debug(msg=f'List of Machines: {str(test_data.content.decode("utf-8"))}')
-                for m in machine_list:
+                machine_infos = self._batch(self.get_machine_information, [(m["id"],) for m in machine_list])
+                for m, machine_info in zip(machine_list, machine_infos):
                     try:
-                        machine_info = self.get_machine_information(m["id"])
                         if machine_info['status'] == "Active":
                             ret_list.append(m)
                             ghosts_logger.debug(msg=f'Appending {machine_info["name"]} with status {machine_info["status"]}')
@@ -304,6 +345,12 @@ class GHOSTSConnection:
             ghosts_logger.info(msg=f"Machine ID: {machine_id} could not be found in the current machines")
             return False
 
+    # Run several actions concurrently from a list of (action_data, machine_id, target_id); returns the
+    # result of run_action() for each, in order. Privileges are checked as each action is sent, so an
+    # action should not depend on a Gain Admin in the same batch.
+    def run_actions(self, actions: list) -> list:
+        return self._batch(self.run_action, actions)
+
     # Run an action with the passed in action data and the machine ID to run it on
     def run_action(self, action_data: dict, machine_id: str, target_id: str) -> bool:
         self.logger_sim.info(msg=f"Attempting to run action {action_data['Name']}")
@@ -311,7 +358,7 @@ class GHOSTSConnection:
         if action_data['Requires Admin'] == "True":
             if machine_id not in self.admin_matrix[target_id]:
                 has_privileges = False
-        if self.confirm_connection() and has_privileges:
+        if self.connection_alive() and has_privileges:
             # Check if admin is required to preform the action
             try:
                 utc_time = list(str(datetime.now(timezone.utc)))
@@ -339,10 +386,10 @@ class GHOSTSConnection:
                     }
                 }
                 timeline_action = json.dumps(timeline_action)
-                ret_data = post(url=f'http://{self.CONN_URL}/timelines',
-                                data=timeline_action,
-                                headers=JSON_HEADER,
-                                timeout=3)
+                ret_data = self._session.post(url=f'http://{self.CONN_URL}/timelines',
+                                              data=timeline_action,
+                                              headers=JSON_HEADER,
+                                              timeout=3)
                 if ret_data.status_code == 200:
                     # Succeeded in adding actions
                     if action_data['Name'] == 'Gain Admin':
@@ -363,7 +410,7 @@ class GHOSTSConnection:
     # Send a stop command to the machine (only used for removing machine from simulation as of now)
     def stop_machine(self, machine_id: str) -> bool:
         ghosts_logger.info(f'Stopping machine {machine_id}')
-        if self.confirm_connection():
+        if self.connection_alive():
             try:
                 utc_time = list(str(datetime.now(timezone.utc)))
                 utc_time = utc_time[0:24]
@@ -398,10 +445,10 @@ class GHOSTSConnection:
                     }
                 }
                 timeline_action = json.dumps(timeline_action)
-                ret_data = post(url=f'http://{self.CONN_URL}/timelines',
-                                data=timeline_action,
-                                headers=JSON_HEADER,
-                                timeout=3)
+                ret_data = self._session.post(url=f'http://{self.CONN_URL}/timelines',
+                                              data=timeline_action,
+                                              headers=JSON_HEADER,
+                                              timeout=3)
                 self.logger_sim.debug(msg=f'type={type(ret_data)}: data={ret_data.content.decode("utf-8")}')
                 if ret_data.status_code == 204:
                     self.logger_sim.info(msg=f"Action Stop_Machine was successful on {machine_id}")
@@ -417,7 +464,7 @@ class GHOSTSConnection:
     # Send a start command to the machine (Not used yet)
     def restart_machine(self, machine_id: str) -> bool:
         ghosts_logger.info(f'Restarting machine {machine_id}')
-        if self.confirm_connection():
+        if self.connection_alive():
             try:
                 utc_time = list(str(datetime.now(timezone.utc)))
                 utc_time = utc_time[0:24]
@@ -449,10 +496,10 @@ class GHOSTSConnection:
                     }
                 }
                 timeline_action = json.dumps(timeline_action)
-                ret_data = post(url=f'http://{self.CONN_URL}/timelines',
-                                data=timeline_action,
-                                headers=JSON_HEADER,
-                                timeout=3)
+                ret_data = self._session.post(url=f'http://{self.CONN_URL}/timelines',
+                                              data=timeline_action,
+                                              headers=JSON_HEADER,
+                                              timeout=3)
                 if ret_data.status_code == 200:
                     self.logger_sim.info(msg=f"Action Restart_Machine was run on {machine_id}")
                     return True
@@ -467,7 +514,7 @@ class GHOSTSConnection:
     def remove_machine(self, machine_id: str) -> bool:
         if self.stop_machine(machine_id):
             try:
-                ret_data = delete(f'http://{self.CONN_URL}/api/machines/{machine_id}')
+                ret_data = self._session.delete(f'http://{self.CONN_URL}/api/machines/{machine_id}')
                 if ret_data.status_code == 204:
                     self.logger_sim.info(f'Removed machine {machine_id} from GHOSTS')
                     ghosts_logger.info(f'Successfully removed machine {machine_id}')
@@ -485,6 +532,10 @@ class GHOSTSConnection:
             ghosts_logger.error(msg=f'Unable to remove machine {machine_id} due to bad response code')
             return False
 
+    # Remove several machines concurrently; returns the result of remove_machine() for each, in order
+    def remove_machines(self, machine_ids: list) -> list:
+        return self._batch(self.remove_machine, [(x,) for x in machine_ids])
+
     # End the simulation due to either error or completion
     def end_simulation(self, reason: str = "End of Simulation", maintain_env: bool = False, save_file: bool = True):
         self.logger_sim.error(msg=f'ENDING SIMULATION {self.SIMULATION_ID} due to the following reason: {reason}')
@@ -493,12 +544,13 @@ class GHOSTSConnection:
             curr_machines = self.list_machines()
             for m in curr_machines:
                 self.logger_sim.info(msg=f'Removing machine {m["id"]} from environment')
-                if not self.remove_machine(m['id']):
-                    ghosts_logger.error(msg='WARNING: Teardown was not 100% successful, '
-                                            'there may be remaining machines')
+            if not all(self.remove_machines([m['id'] for m in curr_machines])):
+                ghosts_logger.error(msg='WARNING: Teardown was not 100% successful, '
+                                        'there may be remaining machines')
         if not save_file or self.TEST_SESSION:
             os.remove(self.sim_file_path_full)
         self.logger_sim.info(F'=-=-=-=-= END OF SIMULATION {self.SIMULATION_ID} -=-=-=-=-=-')
+        self._session.close()
         for gh in ghosts_logger.handlers:
             gh.close()
         for sh in self.logger_sim.handlers:
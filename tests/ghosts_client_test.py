@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import uuid4
+
+import pytest
+from GHOSTSConnection import GHOSTSConnection
+
+
+# A stand-in for the GHOSTS API that counts the requests and connections made to it
+class StubGHOSTSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, data=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self):
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path))
+
+    def do_GET(self):
+        self._count()
+        if self.path == '/api/home':
+            self._reply(200, 'GHOSTS stub')
+        elif self.path == '/api/machines/list':
+            self._reply(200, [{'id': x} for x in self.server.machines])
+        elif self.path.startswith('/api/machines/'):
+            self._reply(200, {'status': 'Active', 'name': self.server.machines[self.path.split('/')[-1]]})
+        else:
+            self._reply(404)
+
+    def do_POST(self):
+        self._count()
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path == '/api/machines':
+            machine_id = str(uuid4())
+            with self.server.lock:
+                self.server.machines[machine_id] = data['name']
+            self._reply(201, {'id': machine_id})
+        elif self.path == '/timelines':
+            events = data['update']['TimeLineHandlers'][0]['TimeLineEvents']
+            self._reply(204 if events[0].get('Command') == 'Stop' else 200)
+        else:
+            self._reply(404)
+
+    def do_DELETE(self):
+        self._count()
+        with self.server.lock:
+            self.server.machines.pop(self.path.split('/')[-1], None)
+        self._reply(204)
+
+
+@pytest.fixture
+def stub_api(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(('localhost', 0), StubGHOSTSHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.connections = 0
+    server.machines = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    # GHOSTSConnection reads its config and writes its logs relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('Logs')
+    with open('pyproject.toml', 'w') as f:
+        f.write('[config]\n'
+                f'local-ghosts-uri = "localhost:{server.server_address[1]}"\n'
+                'unix-sim-path = "Simulations"\n'
+                'unix-ghosts-path = "Logs/GHOSTSConnection.log"\n')
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pooled_machine_creation(stub_api):
+    ghosts_connect = GHOSTSConnection(3, 2, local_session=True, test_session=True)
+    try:
+        assert len(stub_api.machines) == 5
+        # Ids are recorded in the order the machines were requested
+        names = [stub_api.machines[x] for x in ghosts_connect.attacker_Machine_Ids[-3:]]
+        assert names == ['Attacker_0', 'Attacker_1', 'Attacker_2']
+        names = [stub_api.machines[x] for x in ghosts_connect.defender_Machine_Ids[-2:]]
+        assert names == ['Defender_0', 'Defender_1']
+        # Requests share kept-alive connections rather than opening one each
+        assert stub_api.connections <= GHOSTSConnection.MAX_WORKERS
+        assert stub_api.connections < len(stub_api.requests)
+    finally:
+        ghosts_connect.end_simulation()
+    assert not stub_api.machines
+
+
+def test_cached_connection_check(stub_api):
+    ghosts_connect = GHOSTSConnection(0, 0, local_session=True, test_session=True)
+    try:
+        assert ghosts_connect.confirm_connection()
+        target_id = str(uuid4())
+        action = {'Name': 'Scan', 'Requires Admin': 'False', 'Action': {'Command': 'echo'}}
+        assert ghosts_connect.run_actions([(action, 'attacker', target_id)] * 4) == [True] * 4
+        assert stub_api.requests.count(('GET', '/api/home')) == 1
+        assert stub_api.requests.count(('POST', '/timelines')) == 4
+        # Once expired the connection is confirmed again
+        ghosts_connect.CONNECTION_TTL = 0
+        assert ghosts_connect.run_action(action, 'attacker', target_id)
+        assert stub_api.requests.count(('GET', '/api/home')) == 2
+    finally:
+        ghosts_connect.end_simulation()
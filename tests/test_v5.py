@@ -0,0 +1,50 @@
+"""
+Tests for the headless V5 (GHOSTS) game, played without OpenSpiel.
+"""
+# pylint: disable=missing-function-docstring
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from threat_hunting_games.games.v5_ghosts.internal import headless
+
+
+@pytest.mark.parametrize("attacker_policy,defender_policy", [
+    (None, None),
+    ("uniform_random", "simple_random"),
+    ("first_action", "independent_intervals"),
+    ("uniform_random", "aggregate_history"),
+])
+def test_play_games(attacker_policy, defender_policy):
+    records = list(headless.play_games(20, attacker_policy=attacker_policy,
+        defender_policy=defender_policy, num_turns=8, seed=3))
+    assert len(records) == 20
+    for record in records:
+        assert sum(record.returns) == 0
+        assert 0 < record.turns_played <= 8
+        assert len(record.history) == record.turns_played
+        if record.turns_exhausted:
+            assert record.turns_played == 8
+        else:
+            assert record.winner is not None
+    # seeded runs repeat
+    assert records == list(headless.play_games(20,
+        attacker_policy=attacker_policy, defender_policy=defender_policy,
+        num_turns=8, seed=3))
+
+def test_no_pyspiel():
+    # from the internal directory, as its scripts are run, headless
+    # games play even though pyspiel cannot be imported
+    code = "\n".join([
+        "import sys",
+        "sys.modules['pyspiel'] = None",
+        "import headless",
+        "records = headless.play_games(5, 'uniform_random', 'simple_random',",
+        "        keep_history=False)",
+        "assert all(not x.history for x in records)",
+    ])
+    subprocess.run([sys.executable, "-c", code], check=True,
+            cwd=os.path.dirname(headless.__file__))
@@ -0,0 +1,1045 @@
+"""
+Tests for V6 of the threat hunting game.
+"""
+# pylint: disable=missing-function-docstring
+
+import os, sys, json
+import random
+from collections import defaultdict
+from itertools import product
+
+import numpy as np
+import pytest
+import pyspiel  # type: ignore
+from open_spiel.python import rl_environment
+from open_spiel.python.bots.policy import PolicyBot
+
+from open_spiel.python import policy as policy_lib
+from open_spiel.python.algorithms import fictitious_play as os_fictitious_play
+from threat_hunting_games.algorithms import exploitability
+from threat_hunting_games.algorithms import fictitious_play
+from threat_hunting_games.algorithms import get_all_states
+from threat_hunting_games.algorithms import mcts
+from threat_hunting_games.algorithms import tree_index
+from threat_hunting_games.games.v6_simple_base import v6_simple_base
+from threat_hunting_games.games.v6_simple_base import arena
+from threat_hunting_games.games.v6_simple_base import batch_sim
+from threat_hunting_games.games.v6_simple_base import bot_agent
+from threat_hunting_games.games.v6_simple_base import event_sim
+from threat_hunting_games.games.v6_simple_base import markov_eval
+from threat_hunting_games.games.v6_simple_base import policies
+from threat_hunting_games.games.v6_simple_base import results_store
+from threat_hunting_games.games.v6_simple_base import util
+from threat_hunting_games.games.v6_simple_base import vec_env
+
+game_name = v6_simple_base.game_name
+
+
+def load_game(**params):
+    base_params = {
+        "advancement_rewards": "escalating",
+        "detection_costs": "increasing",
+        "use_waits": 0,
+        "use_timewaits": 0,
+        "use_chance_fail": 0,
+    }
+    base_params.update(params)
+    return pyspiel.load_game(game_name, base_params)
+
+def get_bot(game, player, policy_name, action_picker=None):
+    policy_class = policies.get_policy_class(policy_name)
+    if action_picker:
+        policy = policy_class(game, action_picker=action_picker)
+    else:
+        policy = policy_class(game)
+    return PolicyBot(player, np.random, policy)
+
+def play_game(game, bots):
+    state = game.new_initial_state()
+    history = []
+    while not state.is_terminal():
+        action = bots[state.current_player()].step(state)
+        history.append(int(action))
+        state.apply_action(action)
+    return state.turns_played(), state.returns(), state.victor(), history
+
+@pytest.fixture(scope="module")
+def bot_playoffs():
+    # a script, importing its neighbours by module name; its solvers
+    # need packages (openpyxl, nashpy, cvxpy) the game itself doesn't
+    v6_dir = os.path.dirname(v6_simple_base.__file__)
+    sys.path.insert(0, v6_dir)
+    try:
+        import bot_playoffs as module
+    except ImportError as exc:
+        pytest.skip(f"bot_playoffs unavailable: {exc}")
+    finally:
+        sys.path.remove(v6_dir)
+    return module
+
+def summarize(results):
+    returns = np.array([x[1] for x in results], dtype=float)
+    victories = np.array([x[2] == 0 for x in results], dtype=float)
+    return returns.mean(axis=0), victories.mean()
+
+
+def test_action_history():
+    game_arena = arena.Arena(use_timewaits=True)
+    history = v6_simple_base.ActionHistory(game_arena, capacity=2)
+    actions = [arena.Actions.S0_ADVANCE, arena.Actions.IN_PROGRESS,
+            arena.Actions.S0_DETECT, arena.Actions.WAIT]
+    for i, action in enumerate(actions):
+        idx = history.append(action, from_turn=2*i + 1,
+                faulty=False if action == arena.Actions.WAIT else None)
+        assert idx == i
+    assert len(history) == len(actions)
+    assert [x.action for x in history] == actions
+    action_state = history[0]
+    assert action_state.from_turn == 1
+    assert action_state.faulty is None and action_state.expended is None
+    action_state.set_turns(game_arena.get_timewait(action_state.action).max)
+    assert history[0].in_progress
+    while action_state.in_progress:
+        action_state.take_turn()
+    action_state.expend()
+    assert history[0].completed and history[0].expended
+    assert history[-1].faulty is False
+    assert history[-1] == history[3] and history[-1] != history[0]
+
+def test_clone_and_serialize():
+    game = load_game(use_timewaits=1, use_chance_fail=1)
+    random.seed(6)
+    state = game.new_initial_state()
+    for _ in range(5):
+        state.apply_action(random.choice(state.legal_actions()))
+    copies = [state, state.clone(),
+            game.deserialize_state(state.serialize())]
+    assert copies[1].arena is state.arena
+    assert copies[2].arena is state.arena
+    finished = []
+    for copied_state in copies:
+        # same draws from here on out should play out the same game
+        random.seed(7)
+        while not copied_state.is_terminal():
+            copied_state.apply_action(
+                    random.choice(copied_state.legal_actions()))
+        finished.append((copied_state.history(), copied_state.returns(),
+            copied_state.victor()))
+    assert finished[0] == finished[1] == finished[2]
+
+def test_explicit_chance():
+    params = {"num_turns": 6, "use_timewaits": 1, "use_chance_fail": 1}
+    game = load_game(explicit_chance=1, **params)
+    assert game.get_type().chance_mode == \
+            pyspiel.GameType.ChanceMode.EXPLICIT_STOCHASTIC
+    chance_nodes = 0
+
+    def expected_returns(state):
+        # under uniform random play
+        nonlocal chance_nodes
+        if state.is_terminal():
+            return np.array(state.returns(), dtype=float)
+        if state.is_chance_node():
+            chance_nodes += 1
+            outcomes = state.chance_outcomes()
+            assert sum(x[1] for x in outcomes) == pytest.approx(1)
+            return sum(prob * expected_returns(state.child(outcome))
+                    for outcome, prob in outcomes)
+        actions = state.legal_actions()
+        return sum(expected_returns(state.child(x))
+                for x in actions) / len(actions)
+
+    exact = expected_returns(game.new_initial_state())
+    assert chance_nodes
+    # the sampled game has the same distribution
+    game = load_game(**params)
+    random.seed(6)
+    np.random.seed(6)
+    bots = [get_bot(game, player, "uniform_random") for player in range(2)]
+    sampled = summarize([play_game(game, bots) for _ in range(5000)])[0]
+    assert np.allclose(exact, sampled, atol=0.1)
+
+def test_canonical_key_transpositions():
+    game = load_game(num_turns=6)
+    tree = get_all_states.get_state_dag(game,
+            key=lambda state: state.history_str())
+    dag = get_all_states.get_state_dag(game)
+    assert len(dag.states) < len(tree.states)
+    assert sum(len(x) for x in tree.edges.values()) == len(tree.states) - 1
+    # histories sharing a key have to play out identically
+    outcomes = defaultdict(set)
+    for state in tree.states.values():
+        if state.is_terminal():
+            outcome = (tuple(state.returns()), state.victor())
+        else:
+            outcome = tuple((action, state.child(action).canonical_key())
+                    for action in state.legal_actions())
+        outcomes[state.canonical_key()].add(outcome)
+    assert len(outcomes) == len(dag.states)
+    assert all(len(x) == 1 for x in outcomes.values())
+
+def test_tree_index_cache(monkeypatch):
+    monkeypatch.setattr(tree_index, "_tree_indexes", {})
+    monkeypatch.setattr(tree_index, "TREE_INDEXES_CACHE_SIZE", 2)
+    games = [load_game(num_turns=x, explicit_chance=1) for x in (2, 4, 6)]
+    indexes = [tree_index.get_tree_index(x) for x in games[:2]]
+    # the least recently used is the one dropped
+    assert tree_index.get_tree_index(games[0]) is indexes[0]
+    tree_index.get_tree_index(games[2])
+    assert len(tree_index._tree_indexes) == 2
+    assert tree_index.get_tree_index(games[0]) is indexes[0]
+    assert tree_index.get_tree_index(games[1]) is not indexes[1]
+
+def test_tree_index(tmp_path):
+    game = load_game(num_turns=4, use_timewaits=1, use_chance_fail=1,
+            explicit_chance=1)
+    index = tree_index.get_tree_index(game, cache_dir=str(tmp_path))
+    assert tree_index.get_tree_index(game) is index
+    policy = policy_lib.UniformRandomPolicy(game).to_tabular(
+            states=index.all_states())
+    for player in range(2):
+        # same best response as walking the tree
+        walked = exploitability.best_response(game, policy, player)
+        indexed = exploitability.best_response(game, policy, player,
+                tree_index=index)
+        assert indexed["best_response_action"] == \
+                walked["best_response_action"]
+        assert indexed["best_response_value"] == \
+                pytest.approx(walked["best_response_value"])
+        assert np.allclose(indexed["on_policy_values"],
+                walked["on_policy_values"])
+    loaded = tree_index.TreeIndex.load(
+            tree_index.tree_index_path(game, str(tmp_path)), game)
+    assert loaded.info_states == index.info_states
+    assert np.allclose(loaded.values(policy), index.values(policy))
+    assert loaded.state(len(loaded) - 1).history() == \
+            index.state(len(index) - 1).history()
+    with pytest.raises(ValueError):
+        tree_index.TreeIndex.load(
+                tree_index.tree_index_path(game, str(tmp_path)), load_game())
+
+def test_on_policy_values():
+    game = load_game(num_turns=4, use_timewaits=1, use_chance_fail=1,
+            explicit_chance=1)
+    policy = policy_lib.UniformRandomPolicy(game)
+    index = tree_index.TreeIndex(game)
+    expected = index.values(policy)[0]
+    # memoized by history, by canonical state, and across processes
+    assert np.allclose(exploitability._on_policy_values(game, policy),
+            expected)
+    assert np.allclose(exploitability._on_policy_values(game, policy,
+        state_key=get_all_states.canonical_key), expected)
+    assert np.allclose(exploitability._on_policy_values(game, policy,
+        workers=2), expected)
+    # every transition cut
+    assert np.allclose(exploitability._on_policy_values(game, policy,
+        cut_threshold=1.0), 0)
+
+@pytest.mark.parametrize("explicit_chance", [0, 1])
+def test_mcts_tree_reuse(explicit_chance):
+    game = load_game(num_turns=12, use_timewaits=1, use_chance_fail=1,
+            explicit_chance=explicit_chance)
+    np.random.seed(0)
+    bot = util.get_player_bot(game, arena.Players.DEFENDER, util.MCTS_POLICY)
+    # with sampled chance the same moves can lead to other legal actions
+    assert bot.reuse_tree == bool(explicit_chance)
+    # keep searching solved subtrees so every search runs its simulations
+    bot.solve = False
+    bot.max_memory_nodes = 40
+    opponent = PolicyBot(arena.Players.ATTACKER, np.random,
+            policy_lib.UniformRandomPolicy(game))
+    root_sims = []
+    for _ in range(3):
+        bot.restart()
+        state = game.new_initial_state()
+        while not state.is_terminal():
+            if state.is_chance_node():
+                outcomes, probs = zip(*state.chance_outcomes())
+                action = np.random.choice(outcomes, p=probs)
+            elif state.current_player() == arena.Players.DEFENDER:
+                root = bot.mcts_search(state)
+                root_sims.append(root.explore_count)
+                assert bot.num_nodes <= bot.max_memory_nodes
+                # searched for the player to move, even from a chance
+                # outcome's node
+                assert root.player == arena.Players.DEFENDER
+                action = root.best_child().action
+                assert action in state.legal_actions()
+            else:
+                action = opponent.step(state)
+            state.apply_action(action)
+    if explicit_chance:
+        # later searches pick up the simulations of earlier ones
+        assert max(root_sims) > bot.max_simulations
+        # a fresh tree for a new game
+        bot.restart()
+        assert bot.num_nodes == 0
+    root = bot.mcts_search(game.new_initial_state())
+    assert root.explore_count <= bot.max_simulations
+
+def test_mcts_transpositions():
+    # v6 search trees this small hardly transpose; tic-tac-toe boards
+    # reached by different move orders do all the time
+    game = pyspiel.load_game("tic_tac_toe")
+    random_state = np.random.RandomState(1)
+    bot = mcts.MCTSBot(game, 2, 2000,
+            mcts.RandomRolloutEvaluator(random_state=random_state),
+            solve=False, random_state=random_state,
+            transposition_key=str)
+    root = bot.mcts_search(game.new_initial_state())
+    sharers = defaultdict(list)
+    for node in bot._reachable(root).values():
+        if node.children:
+            sharers[id(node.children)].append(node)
+    shared = [x for x in sharers.values() if len(x) > 1]
+    assert shared
+    for nodes in shared:
+        # one set of edges for the position, visited through every node of
+        # it (each node's first visit being a leaf evaluation) ...
+        children = nodes[0].children
+        pooled = sum(c.explore_count for c in children)
+        assert pooled == sum(x.explore_count - 1 for x in nodes)
+        # ... and weighed against those pooled visits
+        for node in nodes:
+            assert bot._parent_count(node) == pooled
+
+@pytest.mark.parametrize("batch_size,workers", [(8, 1), (1, 2), (4, 2)])
+def test_mcts_batched(batch_size, workers):
+    game = load_game(num_turns=8, use_timewaits=1, use_chance_fail=1)
+    state = game.new_initial_state()
+    random_state = np.random.RandomState(0)
+    evaluator = mcts.RandomRolloutEvaluator(n_rollouts=2,
+            random_state=random_state)
+    values = evaluator.evaluate_batch(
+            [state, state.child(state.legal_actions()[0])])
+    assert len(values) == 2 and all(len(x) == 2 for x in values)
+    bot = mcts.MCTSBot(game, 2, 40, evaluator, solve=False,
+            random_state=random_state, batch_size=batch_size,
+            workers=workers)
+    policy, action = bot.step_with_policy(state)
+    assert action in state.legal_actions()
+    assert dict(policy)[action] == 1.0
+    assert bot._num_simulations == 40
+
+def test_parallel_without_fork(monkeypatch):
+    game = load_game(num_turns=4, use_timewaits=1, use_chance_fail=1,
+            explicit_chance=1)
+    state = game.new_initial_state()
+
+    def root_stats():
+        random_state = np.random.RandomState(0)
+        bot = mcts.MCTSBot(game, 2, 40,
+                mcts.RandomRolloutEvaluator(random_state=random_state),
+                solve=False, random_state=random_state, workers=2)
+        root = bot.parallel_search(state)
+        assert bot.max_simulations == 40 and bot._root is None
+        return bot._num_simulations, sorted((c.action, c.explore_count,
+            c.total_reward) for c in root.children)
+
+    policy = policy_lib.UniformRandomPolicy(game)
+    forked = root_stats()
+    expected = exploitability._on_policy_values(game, policy, workers=2)
+    # the same searches and subtrees, one after the other
+    monkeypatch.setattr(mcts.multiprocessing, "get_all_start_methods",
+            lambda: ["spawn"])
+    assert root_stats() == forked
+    assert np.allclose(exploitability._on_policy_values(game, policy,
+        workers=2), expected)
+
+def test_xfp_matches_tree_walk():
+    game = load_game(num_turns=4, use_timewaits=1, use_chance_fail=1,
+            explicit_chance=1)
+    solvers = [fictitious_play.XFPSolver(game),
+            os_fictitious_play.XFPSolver(game)]
+    for solver in solvers:
+        for _ in range(3):
+            solver.iteration()
+    tables, expected = [x.average_policy_tables() for x in solvers]
+    for player_tables, player_expected in zip(tables, expected):
+        assert set(player_tables) == set(player_expected)
+        for key, probs in player_expected.items():
+            assert list(player_tables[key]) == list(probs)
+            assert np.allclose(list(player_tables[key].values()),
+                    list(probs.values()))
+
+@pytest.mark.parametrize("live", [False, True])
+def test_bot_agent_state(live):
+    # live environment state or serialized state, same games
+    game = load_game(use_timewaits=1)
+    env = rl_environment.Environment(game, include_full_state=not live)
+    agents = [bot_agent.BotAgent(len(arena.Actions),
+        get_bot(game, player, "uniform_random"), env=env if live else None)
+        for player in range(2)]
+    random.seed(6)
+    np.random.seed(6)
+    histories = []
+    for _ in range(20):
+        time_step = env.reset()
+        while not time_step.last():
+            player = time_step.observations["current_player"]
+            time_step = env.step([agents[player].step(time_step).action])
+        histories.append(env.get_state.history())
+    random.seed(6)
+    np.random.seed(6)
+    bots = [get_bot(game, player, "uniform_random") for player in range(2)]
+    assert histories == [play_game(game, bots)[3] for _ in range(20)]
+
+def play_vector_environment(game, num_envs, workers):
+    played = []
+    picker = random.Random(7)
+    with vec_env.VectorEnvironment(game, 1, "uniform_random", num_envs,
+            workers=workers, seed=6) as env:
+        time_steps = env.reset()
+        for _ in range(50):
+            assert len(time_steps) == num_envs
+            actions = []
+            for time_step in time_steps:
+                if time_step.last():
+                    actions.append(None)
+                    continue
+                # the opponent has always moved already
+                assert time_step.observations["current_player"] == 1
+                actions.append(picker.choice(
+                    time_step.observations["legal_actions"][1]))
+            played.append([x.observations["info_state"][1]
+                for x in time_steps])
+            time_steps = env.step(actions)
+        assert env.episodes >= num_envs
+    return played
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_vector_environment(workers):
+    game = load_game()
+    random.seed(5)
+    np.random.seed(5)
+    played = play_vector_environment(game, 5, workers)
+    # the caller's streams are left alone, in this process too
+    drawn = (random.random(), np.random.random())
+    random.seed(5)
+    np.random.seed(5)
+    assert drawn == (random.random(), np.random.random())
+    assert play_vector_environment(game, 5, workers) == played
+
+
+def dqn_agent(tf, dqn, game, seed):
+    env = rl_environment.Environment(game)
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(seed)
+        session = tf.Session(graph=graph)
+        agent = dqn.DQN(session, 1,
+                env.observation_spec()["info_state"][0],
+                env.action_spec()["num_actions"], hidden_layers_sizes=[8],
+                replay_buffer_capacity=100, batch_size=4, learn_every=3,
+                update_target_network_every=5, min_buffer_size_to_learn=4,
+                epsilon_decay_duration=100)
+        session.run(tf.global_variables_initializer())
+    return agent
+
+def test_batched_dqn():
+    # BatchedDQN drives the internals of the TF1 DQN of open_spiel < 2
+    tf = pytest.importorskip("tensorflow.compat.v1")
+    dqn = pytest.importorskip("open_spiel.python.algorithms.dqn")
+    game = load_game()
+    # over a single game it is DQN.step(), draw for draw
+    agent = dqn_agent(tf, dqn, game, 0)
+    batched = vec_env.BatchedDQN(agent, 1)
+    played = []
+    with vec_env.VectorEnvironment(game, 1, "uniform_random", 1,
+            seed=6) as env:
+        time_steps = env.reset()
+        random.seed(7)
+        np.random.seed(7)
+        for _ in range(60):
+            actions = batched.step(time_steps)
+            played.append((time_steps[0], actions[0]))
+            time_steps = env.step(actions)
+    reference = dqn_agent(tf, dqn, game, 0)
+    random.seed(7)
+    np.random.seed(7)
+    for time_step, action in played:
+        step = reference.step(time_step)
+        assert (step and step.action) == action
+    assert reference.step_counter == agent.step_counter == len(played)
+    assert len(reference.replay_buffer) == len(agent.replay_buffer)
+    assert reference.loss is not None and np.isclose(reference.loss,
+            agent.loss)
+    # over several, the greedy actions are those of each game on its own
+    agent = dqn_agent(tf, dqn, game, 1)
+    num_envs = 3
+    batched = vec_env.BatchedDQN(agent, num_envs)
+    # a transition per step but the first of each game
+    fresh = [True] * num_envs
+    transitions = 0
+    with vec_env.VectorEnvironment(game, 1, "uniform_random", num_envs,
+            seed=6) as env:
+        time_steps = env.reset()
+        for _ in range(20):
+            for i, time_step in enumerate(time_steps):
+                transitions += not fresh[i]
+                fresh[i] = time_step.last()
+            greedy = batched.step(time_steps, is_evaluation=True)
+            for time_step, action in zip(time_steps, greedy):
+                step = agent.step(time_step, is_evaluation=True)
+                assert (step and step.action) == action
+            time_steps = env.step(batched.step(time_steps))
+    assert agent.step_counter == 20 * num_envs
+    assert env.episodes > num_envs
+    assert len(agent.replay_buffer) == transitions
+
+def test_arena_skirmish_tables():
+    # without chance failures skirmishes are all or nothing
+    game_arena = arena.Arena(use_chance_fail=False)
+    for action1, action2 in product(arena.Actions, repeat=2):
+        pct = game_arena.action_success_pct(action1, action2)
+        assert pct in (0.0, 1.0)
+        succeeds = game_arena.action_succeeds(action1, action2)
+        if action1 in arena.NoOp_Actions or action2 in arena.NoOp_Actions:
+            assert succeeds is None
+        else:
+            assert succeeds == bool(pct)
+
+def test_arena_action_succeeds_many():
+    game_arena = arena.Arena(use_chance_fail=True)
+    rng = np.random.default_rng(4)
+    attack_actions = [a for a in arena.Actions
+            if a not in arena.NoOp_Actions]
+    for defend_action in game_arena.defend_actions:
+        succeeds = game_arena.action_succeeds_many(defend_action,
+                attack_actions * 1000, rng=rng).reshape(1000, -1)
+        for i, attack_action in enumerate(attack_actions):
+            pct = game_arena.action_success_pct(defend_action, attack_action)
+            assert abs(succeeds[:, i].mean() - pct) < 0.05
+    noops = game_arena.action_succeeds_many(arena.Actions.WAIT,
+            attack_actions, rng=rng)
+    assert not noops.any()
+
+def test_results_store(tmp_path):
+    path = str(tmp_path / results_store.ResultsStore.filename)
+    perm = dict.fromkeys(results_store.Perm_Fields, "x")
+    games = [{"returns": [3, -3], "victor": 0, "turns_played": 4,
+            "history": [1, 0, 7, 2]}]
+    with results_store.ResultsStore(path) as store:
+        store.set_meta(iterations=1, seed=None)
+        store.add_permutation(1, perm, {"episodes": 1}, games=games)
+    with results_store.ResultsStore(path) as store:
+        assert store.get_meta() == {"iterations": 1, "seed": None}
+        assert store.finished() == {1: {"episodes": 1}}
+        assert list(store.games(1)) == games
+        assert [x["perm_idx"] for x in store.permutations()] == [1]
+
+def test_results_store_catalog(tmp_path):
+    path = str(tmp_path / results_store.ResultsStore.filename)
+    with results_store.ResultsStore(path) as store:
+        for perm_idx, (atk_policy, def_ap, atk_mean) in enumerate([
+                ("first_action", "n/a", 2.0),
+                ("first_action", "cost_scale", 4.0),
+                ("last_action", "n/a", -1.0)]):
+            store.add_summary(perm_idx, {
+                "advancement_rewards": "flat",
+                "detection_costs": "flat",
+                "defender_policy": "simple_random",
+                "defender_action_picker": def_ap,
+                "attacker_policy": atk_policy,
+                "attacker_action_picker": "n/a",
+                "episodes": 10,
+                "history_tallies": [[6, [1, 2]], [4, [1, 3]]],
+                "r_means": [atk_mean, -atk_mean],
+                "r_means_normalized": [atk_mean, -atk_mean],
+                "sum_victories": [5, 4],
+                "sum_inconclusive": 1,
+            })
+        assert store.distinct("defender") == \
+                ["simple_random", "simple_random-cost_scale"]
+        rows = store.query(filters={"defender": ["simple_random"]})
+        assert [x["perm_idx"] for x in rows] == [0, 2]
+        assert rows[0]["defender_action_picker"] is None
+        assert rows[0]["attacker_win_rate"] == 0.5
+        rows = store.query(group_by=["attacker"],
+                metrics=["attacker_mean", "distinct_games"])
+        assert rows == [
+            {"attacker": "first_action", "permutations": 2,
+                "attacker_mean": 3.0, "distinct_games": 2.0},
+            {"attacker": "last_action", "permutations": 1,
+                "attacker_mean": -1.0, "distinct_games": 2.0},
+        ]
+        with pytest.raises(ValueError):
+            store.query(group_by=["episodes; DROP TABLE games"])
+
+
+def test_batch_unsupported_policy():
+    game = load_game()
+    sim = batch_sim.BatchSimulator.from_game(game,
+            "uniform_random", None, "independent_intervals", None)
+    assert sim is None
+
+
+@pytest.mark.parametrize("atk_policy,def_policy",
+        list(product(["first_action", "last_action"], repeat=2)))
+def test_batch_matches_deterministic(atk_policy, def_policy):
+    game = load_game()
+    bots = [get_bot(game, 0, atk_policy), get_bot(game, 1, def_policy)]
+    expected = play_game(game, bots)
+    sim = batch_sim.BatchSimulator.from_game(game,
+            atk_policy, None, def_policy, None)
+    results = sim.play(10, batch_size=4)
+    assert len(results) == 10
+    for game_result in results.games():
+        assert game_result == expected
+
+
+@pytest.mark.parametrize("atk_policy,def_policy,def_ap", [
+    ("uniform_random", "uniform_random", None),
+    ("last_action", "simple_random", "cost_scale"),
+    ("uniform_random", "simple_random", "inverse_cost_scale"),
+])
+def test_batch_matches_distribution(atk_policy, def_policy, def_ap):
+    game = load_game(use_timewaits=1, use_chance_fail=1)
+    random.seed(6)
+    np.random.seed(6)
+    bots = [get_bot(game, 0, atk_policy),
+            get_bot(game, 1, def_policy, def_ap)]
+    scalar_means, scalar_wins = \
+            summarize([play_game(game, bots) for _ in range(2000)])
+    sim = batch_sim.BatchSimulator.from_game(game,
+            atk_policy, None, def_policy, def_ap,
+            rng=np.random.default_rng(6))
+    batch_means, batch_wins = summarize(list(sim.play(20000).games()))
+    # generous bounds, these are well beyond sampling noise
+    assert np.allclose(scalar_means, batch_means, atol=1.5)
+    assert abs(scalar_wins - batch_wins) < 0.05
+
+
+class DecisionBot:
+    # draws from random only when there is a choice, so games played
+    # turn by turn and with event_sim line up game for game
+    def step(self, state):
+        actions = state.legal_actions()
+        return actions[0] if len(actions) == 1 else random.choice(actions)
+
+def player_columns(player_state):
+    history = player_state.history
+    return (player_state.utility, player_state.curr_turn,
+            list(player_state.costs), list(player_state.utilities),
+            [list(x[:len(history)]) for x in history._columns()],
+            [(x.action, x.from_turn) for x in player_state.completed_history])
+
+@pytest.mark.parametrize("params", [
+    {"use_timewaits": 1},
+    {"use_timewaits": 1, "use_chance_fail": 1, "num_turns": 12},
+])
+def test_skip_in_progress(params):
+    game = load_game(**params)
+    bots = [DecisionBot(), DecisionBot()]
+    in_progress = int(arena.Actions.IN_PROGRESS)
+    for seed in range(40):
+        random.seed(seed)
+        expected = play_game(game, bots)
+        random.seed(seed)
+        assert event_sim.play_game(game, bots) == expected
+        # move by move, the skipped state matches the state stepped
+        # through each of the IN_PROGRESS moves
+        state = game.new_initial_state()
+        stepped = game.new_initial_state()
+        while True:
+            turn = seed * game.max_game_length() + len(stepped.history())
+            random.seed(turn)
+            skipped = state.skip_in_progress()
+            random.seed(turn)
+            for _ in range(skipped):
+                stepped.apply_action(in_progress)
+            assert state.canonical_key() == stepped.canonical_key()
+            for player_state, stepped_state in zip(
+                    (state.attacker_state, state.defender_state),
+                    (stepped.attacker_state, stepped.defender_state)):
+                assert player_columns(player_state) \
+                        == player_columns(stepped_state)
+            if state.is_terminal():
+                break
+            action = random.choice(state.legal_actions())
+            random.seed(turn)
+            state.apply_action(action)
+            random.seed(turn)
+            stepped.apply_action(action)
+        assert stepped.is_terminal()
+        assert state.returns() == stepped.returns()
+
+def test_event_sim_distribution():
+    game = load_game(use_timewaits=1, use_chance_fail=1)
+    random.seed(6)
+    np.random.seed(6)
+    bots = [get_bot(game, 0, "uniform_random"),
+            get_bot(game, 1, "aggregate_history")]
+    turn_means, turn_wins = \
+            summarize([play_game(game, bots) for _ in range(1500)])
+    event_means, event_wins = \
+            summarize([event_sim.play_game(game, bots) for _ in range(1500)])
+    assert np.allclose(turn_means, event_means, atol=1.5)
+    assert abs(turn_wins - event_wins) < 0.05
+    assert not event_sim.supported(util.MCTS_POLICY)
+
+def test_collapse_forced_moves():
+    params = dict(num_turns=6, use_timewaits=1, use_chance_fail=1,
+            explicit_chance=1)
+    game = load_game(**params)
+    collapsed = load_game(collapse_forced_moves=1, **params)
+    tree = get_all_states.get_all_states(game, include_chance_states=True)
+    collapsed_tree = get_all_states.get_all_states(collapsed,
+            include_chance_states=True)
+    assert len(collapsed_tree) < len(tree)
+    in_progress = [int(arena.Actions.IN_PROGRESS)]
+    for state in collapsed_tree.values():
+        if not state.is_terminal() and not state.is_chance_node():
+            assert state.legal_actions() != in_progress
+        # the history of the same game without collapsing
+        full_history = state.full_history()
+        replayed = game.new_initial_state()
+        for action in full_history:
+            replayed.apply_action(action)
+        assert replayed.canonical_key() == state.canonical_key()
+    for player_game in (game, collapsed):
+        policy = policy_lib.UniformRandomPolicy(player_game)
+        assert exploitability.nash_conv(player_game, policy) \
+                == pytest.approx(3.5)
+
+def play_seeded(game, seed, perm_idx, player_policies, num_games,
+        first_game=0, crn=False):
+    # as bot_playoffs.play_games() does with a seed
+    rngs = [np.random.default_rng() for _ in player_policies]
+    bots = [util.get_player_bot(game, player, policy_name,
+            action_picker=action_picker, rng=rngs[player])
+        for player, (policy_name, action_picker)
+            in enumerate(player_policies)]
+    results = []
+    for game_idx in range(first_game, first_game + num_games):
+        seeds = util.game_seeds(seed, perm_idx, game_idx, crn=crn)
+        util.reseed(rngs[arena.Players.ATTACKER], seeds.attacker)
+        util.reseed(rngs[arena.Players.DEFENDER], seeds.defender)
+        results.append(event_sim.play_game(game, bots,
+            seed_seq=seeds.chance))
+    return results
+
+def test_seeded_streams():
+    game = load_game(use_timewaits=1, use_chance_fail=1)
+    player_policies = [("uniform_random", None),
+            ("simple_random", "fixed_prob")]
+    random.seed(3)
+    np.random.seed(3)
+    results = play_seeded(game, 11, 0, player_policies, 30)
+    # nothing is drawn from the module level streams
+    drawn = (random.random(), np.random.random())
+    random.seed(3)
+    np.random.seed(3)
+    assert drawn == (random.random(), np.random.random())
+    assert results == play_seeded(game, 11, 0, player_policies, 30)
+    assert results != play_seeded(game, 11, 1, player_policies, 30)
+    # games start from their own seeds, whatever was played before
+    # (given bots without running state)
+    player_policies = [("uniform_random", None)] * 2
+    results = play_seeded(game, 11, 0, player_policies, 30)
+    assert results[10:] == play_seeded(game, 11, 0, player_policies, 20,
+            first_game=10)
+    seeds, other = util.game_seeds(5, 0, 3), util.game_seeds(5, 1, 3)
+    assert seeds.chance.generate_state(4).tolist() \
+            != other.chance.generate_state(4).tolist()
+    seeds, other = util.game_seeds(5, 0, 3, crn=True), \
+            util.game_seeds(5, 1, 3, crn=True)
+    for stream, other_stream in zip(seeds, other):
+        assert stream.generate_state(4).tolist() \
+                == other_stream.generate_state(4).tolist()
+    assert seeds.chance.generate_state(4).tolist() \
+            != seeds.attacker.generate_state(4).tolist()
+    # clones carry on with copies of the streams of the original state
+    state = game.new_initial_state(seed_seq=np.random.SeedSequence(2))
+    clone = state.clone()
+    for player in arena.Players:
+        assert clone.turns_rng(player) is not state.turns_rng(player)
+        assert clone.turns_rng(player).integers(1 << 30) \
+                == state.turns_rng(player).integers(1 << 30)
+
+def test_seeded_state_streams():
+    # the streams of a state are derived from its SeedSequence without
+    # Generator.spawn() (numpy >= 1.25), and the same SeedSequence
+    # always gives the same streams
+    game = load_game(use_timewaits=1)
+    seed_seq = np.random.SeedSequence(4)
+    draws = []
+    for _ in range(2):
+        state = game.new_initial_state(seed_seq=seed_seq)
+        draws.append([state.turns_rng(x).integers(1 << 30)
+            for x in arena.Players])
+    assert draws[0] == draws[1]
+    assert draws[0][0] != draws[0][1]
+    assert seed_seq.n_children_spawned == 0
+
+def test_cloned_state_streams():
+    # searching from clones of a state leaves its own draws as they were
+    game = load_game(use_timewaits=1, use_chance_fail=1)
+    seed_seq = np.random.SeedSequence(4)
+    histories = []
+    for searched in (False, True):
+        random_state = np.random.RandomState(2)
+        state = game.new_initial_state(seed_seq=seed_seq)
+        while not state.is_terminal():
+            if searched:
+                clone = state.clone()
+                while not clone.is_terminal():
+                    clone.apply_action(
+                            random_state.choice(clone.legal_actions()))
+            state.apply_action(state.legal_actions()[0])
+        histories.append((state.history(), state.returns()))
+    assert histories[0] == histories[1]
+
+def test_common_random_numbers():
+    game = load_game(use_timewaits=1, use_chance_fail=1)
+    variances = []
+    for crn in (False, True):
+        returns = []
+        for perm_idx, action_picker in enumerate(("decrement", "increment")):
+            player_policies = [("uniform_random", None),
+                    ("aggregate_history", action_picker)]
+            returns.append(np.array([x[1][arena.Players.DEFENDER]
+                for x in play_seeded(game, 8, perm_idx, player_policies,
+                    300, crn=crn)]))
+        variances.append(np.var(returns[0] - returns[1]))
+    assert variances[1] < variances[0] / 2
+
+@pytest.mark.parametrize("atk_policy,def_policy",
+        list(product(["first_action", "last_action"], repeat=2)))
+def test_markov_eval_deterministic(atk_policy, def_policy):
+    game = load_game()
+    bots = [get_bot(game, 0, atk_policy), get_bot(game, 1, def_policy)]
+    turns_played, returns, victor, history = play_game(game, bots)
+    results = markov_eval.MarkovEvaluator.from_game(game,
+            atk_policy, None, def_policy, None).evaluate()
+    assert results.mean_returns == pytest.approx(returns)
+    assert results.var_returns == pytest.approx([0, 0])
+    assert results.turns_played_probs == pytest.approx({turns_played: 1})
+    assert results.history_probs == pytest.approx({tuple(history): 1})
+    victory_probs = [0, 0]
+    if victor is not None:
+        victory_probs[victor] = 1
+    assert results.victory_probs == pytest.approx(victory_probs)
+
+@pytest.mark.parametrize("atk_policy,def_policy,def_ap", [
+    ("uniform_random", "uniform_random", None),
+    ("last_action", "simple_random", "cost_scale"),
+    ("uniform_random", "simple_random", "inverse_cost_scale"),
+])
+def test_markov_eval_distribution(atk_policy, def_policy, def_ap):
+    game = load_game(use_timewaits=1, use_chance_fail=1)
+    results = markov_eval.MarkovEvaluator.from_game(game,
+            atk_policy, None, def_policy, def_ap, max_paths=0).evaluate()
+    assert results.history_probs is None
+    assert sum(results.victory_probs) + results.inconclusive_prob \
+            == pytest.approx(1)
+    assert sum(results.turns_played_probs.values()) == pytest.approx(1)
+    sim = batch_sim.BatchSimulator.from_game(game,
+            atk_policy, None, def_policy, def_ap,
+            rng=np.random.default_rng(6))
+    played = sim.play(20000)
+    returns = played.returns.astype(float)
+    # a few standard errors
+    assert np.allclose(results.mean_returns, returns.mean(axis=0),
+            atol=4 * returns.std(axis=0).max() / np.sqrt(len(played)) + 1e-9)
+    assert np.allclose(results.var_returns, returns.var(axis=0),
+            rtol=0.1, atol=0.5)
+    assert results.victory_probs[0] \
+            == pytest.approx((played.victors == 0).mean(), abs=0.02)
+    num_turns = game.get_parameters()["num_turns"]
+    assert results.turns_played_probs.get(num_turns, 0) == pytest.approx(
+            (played.turns_played == num_turns).mean(), abs=0.02)
+    assert markov_eval.MarkovEvaluator.from_game(game,
+            "uniform_random", None, "aggregate_history", None) is None
+
+def test_markov_eval_shared_chain():
+    # evaluators of the same rules and policies share a chain, growing
+    # it for longer games, whatever their utilities
+    chains = set()
+    for num_turns, det_costs in ((6, "flat"), (12, "increasing"),
+            (8, "decreasing")):
+        game = load_game(num_turns=num_turns, detection_costs=det_costs,
+                use_timewaits=1, use_chance_fail=1)
+        shared = markov_eval.MarkovEvaluator.from_game(game,
+                "uniform_random", None, "uniform_random", None,
+                max_paths=10)
+        chains.add(id(shared._chain))
+        policies = [batch_sim.stationary_policy(name, ap, shared.arena,
+            player) for name, ap, player in (
+                ("uniform_random", None, arena.Players.ATTACKER),
+                ("uniform_random", None, arena.Players.DEFENDER))]
+        results = shared.evaluate()
+        expected = markov_eval.MarkovEvaluator(shared.arena, num_turns,
+                *policies, max_paths=10).evaluate()
+        assert results.history_probs is None
+        assert results.mean_returns == pytest.approx(expected.mean_returns)
+        assert results.var_returns == pytest.approx(expected.var_returns)
+        assert results.victory_probs == pytest.approx(expected.victory_probs)
+        assert results.turns_played_probs \
+                == pytest.approx(expected.turns_played_probs)
+    assert len(chains) == 1
+
+def test_play_games_restores_globals(bot_playoffs):
+    params = bot_playoffs.game_params("escalating", "increasing",
+            use_timewaits=1, use_chance_fail=1)
+    for backend in ("scalar", "batch"):
+        random.seed(5)
+        np.random.seed(5)
+        bot_playoffs.play_games(game_name, params,
+                "simple_random", "fixed_prob", "uniform_random", None,
+                20, seed=9, backend=backend)
+        drawn = (random.random(), np.random.random())
+        random.seed(5)
+        np.random.seed(5)
+        assert drawn == (random.random(), np.random.random())
+
+def playoff_tallies(bot_playoffs, dump_dir, **kwargs):
+    bot_playoffs.main(iterations=6, attacker_policies=("uniform_random",),
+            solvers=(), dump_dir=str(dump_dir), seed=3, **kwargs)
+    run_dir, = dump_dir.iterdir()
+    store = results_store.ResultsStore(
+            str(run_dir / results_store.ResultsStore.filename))
+    with store:
+        return {x["perm_idx"]: x for x in store.permutations()}
+
+def test_playoffs_same_minute(bot_playoffs, tmp_path, monkeypatch):
+    # run directories are named by the minute a run starts
+    from datetime import datetime
+
+    class Minute(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2024, 5, 1, 12, 30)
+
+    monkeypatch.setattr(bot_playoffs.util, "datetime", Minute)
+    tallies = playoff_tallies(bot_playoffs, tmp_path)
+    with pytest.raises(ValueError, match="--resume"):
+        playoff_tallies(bot_playoffs, tmp_path)
+    # the first run's results are left as they were
+    run_dir, = tmp_path.iterdir()
+    with results_store.ResultsStore(
+            str(run_dir / results_store.ResultsStore.filename)) as store:
+        assert store.get_meta()["seed"] == 3
+        assert {x["perm_idx"]: x for x in store.permutations()} == tallies
+
+def test_playoffs_reindex(bot_playoffs, tmp_path):
+    tallies = playoff_tallies(bot_playoffs, tmp_path)
+    run_dir, = tmp_path.iterdir()
+    with results_store.ResultsStore(
+            str(run_dir / results_store.ResultsStore.filename)) as store:
+        catalog = store.query()
+        assert [x["perm_idx"] for x in catalog] == sorted(tallies)
+        assert store.index_summaries(str(run_dir / "json")) == len(catalog)
+        assert store.query() == catalog
+        # summaries that don't record their index, as with older runs,
+        # are indexed by their file names
+        for row in catalog:
+            summary_file = run_dir / row["summary_file"]
+            summary = json.loads(summary_file.read_text())
+            assert summary.pop("perm_idx") == row["perm_idx"]
+            summary_file.write_text(json.dumps(summary))
+        store.index_summaries(str(run_dir / "json"))
+        assert store.query() == catalog
+        # and those with neither are numbered on, without renumbering
+        # the others
+        (run_dir / catalog[0]["summary_file"]).rename(
+                run_dir / "json" / "legacy.json")
+        store.index_summaries(str(run_dir / "json"))
+        rows = store.query()
+        assert rows[:-1] == catalog
+        assert rows[-1]["perm_idx"] == catalog[-1]["perm_idx"] + 1
+        assert rows[-1]["summary_file"] == os.path.join("json", "legacy.json")
+
+def assert_same_tally(tally, other):
+    tally, other = dict(tally), dict(other)
+    for name in ("mean_returns", "m2_returns"):
+        assert tally.pop(name) == pytest.approx(other.pop(name))
+    assert tally == other
+
+def test_playoffs_workers(bot_playoffs, tmp_path):
+    expected = playoff_tallies(bot_playoffs, tmp_path / "serial")
+    pooled = playoff_tallies(bot_playoffs, tmp_path / "pooled", workers=2)
+    assert pooled.keys() == expected.keys()
+    for perm_idx, perm in expected.items():
+        assert_same_tally(pooled[perm_idx]["tally"], perm["tally"])
+        assert {x: pooled[perm_idx][x] for x in results_store.Perm_Fields} \
+                == {x: perm[x] for x in results_store.Perm_Fields}
+    # chunks of 4 and 2 games, each with fresh bots: the same games for
+    # policies without running state, the same episodes for all
+    chunked = playoff_tallies(bot_playoffs, tmp_path / "chunked",
+            workers=2, chunk_size=4)
+    stateless = {"uniform_random", "first_action", "last_action"}
+    for perm_idx, perm in expected.items():
+        tally = chunked[perm_idx]["tally"]
+        assert tally["episodes"] == perm["tally"]["episodes"] == 6
+        assert sum(tally["histories"].values()) == 6
+        if perm["defender_policy"] in stateless:
+            assert_same_tally(tally, perm["tally"])
+
+def test_tally_moments(bot_playoffs):
+    rng = np.random.default_rng(1)
+    returns = rng.integers(-20, 30, size=(50, 2))
+    tallies = [bot_playoffs.Tally() for _ in range(3)]
+    for i, game_returns in enumerate(returns):
+        # uneven chunks
+        tallies[(i > 10) + (i > 35)].add_game(2, game_returns.tolist(),
+                None, [0, 1])
+    tally = bot_playoffs.Tally()
+    for chunk in tallies:
+        tally.merge(chunk)
+    assert tally.episodes == len(returns)
+    assert tally.mean_returns == pytest.approx(returns.mean(axis=0))
+    assert [x / tally.episodes for x in tally.m2_returns] \
+            == pytest.approx(returns.var(axis=0))
+    assert tally.turns_played == {2: len(returns)}
+    half_widths = tally.ci_half_widths(0.95)
+    assert half_widths == pytest.approx(1.959964 * returns.std(axis=0, ddof=1)
+            / np.sqrt(len(returns)), rel=1e-5)
+
+def test_tally_converged(bot_playoffs):
+    tally = bot_playoffs.Tally()
+    assert tally.ci_half_widths() == [None, None]
+    for i in range(10):
+        tally.add_game(2, [i % 2, 0], None, [0, 1])
+        # never before min_iterations, however narrow the intervals
+        assert tally.converged(10.0, min_iterations=10) == (i == 9)
+    half_width = max(tally.ci_half_widths())
+    assert tally.converged(half_width, min_iterations=10)
+    assert not tally.converged(half_width * 0.99, min_iterations=10)
+    assert not tally.converged(10.0, min_iterations=11)
+
+def test_tally_from_checkpoint(bot_playoffs, tmp_path):
+    # a tally checkpointed before the running moments were kept
+    store = results_store.ResultsStore(str(tmp_path / "results.db"))
+    with store:
+        store.add_permutation(0, {x: "x" for x in results_store.Perm_Fields},
+                {"episodes": 4, "sum_returns": [8, -12],
+                    "sum_victories": [1, 2], "sum_inconclusive": 1,
+                    "histories": {"0 1": 4}})
+        tally = bot_playoffs.Tally.from_dict(store.finished()[0])
+    assert tally.mean_returns == [2, -3]
+    assert tally.ci_half_widths() == [None, None]
+    assert not tally.converged(1e9, min_iterations=0)
+    assert not tally.exact and not tally.turns_played
+    restored = bot_playoffs.Tally.from_dict(
+            json.loads(json.dumps(tally.to_dict())))
+    assert restored == tally
+
+def test_play_games_ci_target(bot_playoffs):
+    params = bot_playoffs.game_params("escalating", "increasing",
+            use_timewaits=1, use_chance_fail=1)
+    for backend in ("scalar", "batch"):
+        tally = bot_playoffs.play_games(game_name, params,
+                "uniform_random", None, "uniform_random", None, 5000,
+                seed=2, backend=backend, ci_target=1.0, min_iterations=40)
+        assert 40 <= tally.episodes < 5000
+        assert tally.converged(1.0, min_iterations=40)
+        assert max(tally.ci_half_widths()) <= 1.0
+        if backend == "batch":
+            # checked in rounds of min_iterations games
+            continue
+        # and not a game later than it had to
+        unstopped = bot_playoffs.play_games(game_name, params,
+                "uniform_random", None, "uniform_random", None,
+                tally.episodes - 1, seed=2, backend=backend)
+        assert not unstopped.converged(1.0, min_iterations=40)
@@ -54,12 +54,14 @@ def _memoize_method(key_fn=lambda x: x):
 
 def compute_states_and_info_states_if_none(game,
                                            all_states=None,
-                                           state_to_information_state=None):
+                                           state_to_information_state=None,
+                                           tree_index=None):
   """Returns all_states and/or state_to_information_state for the game.
 
   To recompute everything, pass in None for both all_states and
   state_to_information_state. Otherwise, this function will use the passed in
-  values to reconstruct either of them.
+  values to reconstruct either of them. Given a `tree_index.TreeIndex`, the
+  missing ones are taken from the index rather than walking the tree.
 
   Args:
     game: The open_spiel game.
@@ -68,7 +70,14 @@ def compute_states_and_info_states_if_none(game,
     state_to_information_state: A dict mapping state.history_str() to
       state.information_state for every state in the game. Cached for improved
       performance.
+    tree_index: Optional `tree_index.TreeIndex` of the game.
   """
+  if tree_index is not None:
+    if all_states is None:
+      all_states = tree_index.all_states()
+    if state_to_information_state is None:
+      state_to_information_state = tree_index.state_to_information_state()
+
   if all_states is None:
     print("compute_states_and_info_states_if_none get_all_states()")
     all_states = get_all_states.get_all_states(
@@ -94,7 +103,8 @@ class BestResponsePolicy(openspiel_policy.Policy):
                player_id,
                policy,
                root_state=None,
-               cut_threshold=0.0):
+               cut_threshold=0.0,
+               tree_index=None):
     """Initializes the best-response calculation.
 
     Args:
@@ -105,6 +115,10 @@ class BestResponsePolicy(openspiel_policy.Policy):
         the game root state is used.
       cut_threshold: The probability to cut when calculating the value.
         Increasing this value will trade off accuracy for speed.
+      tree_index: Optional `tree_index.TreeIndex` of the game, shared across
+        best responses, from which the infosets and child states are taken
+        rather than walking (and cloning) the tree. Only used when analyzing
+        from the root.
     """
     self._num_players = game.num_players()
     self._player_id = player_id
@@ -112,7 +126,13 @@ class BestResponsePolicy(openspiel_policy.Policy):
     if root_state is None:
       root_state = game.new_initial_state()
     self._root_state = root_state
-    self.infosets = self.info_sets(root_state)
+    if root_state.history():
+      tree_index = None
+    self._tree_index = tree_index
+    if tree_index is not None:
+      self.infosets = tree_index.info_sets(player_id, policy)
+    else:
+      self.infosets = self.info_sets(root_state)
 
     self._cut_threshold = cut_threshold
 
@@ -202,6 +222,8 @@ class BestResponsePolicy(openspiel_policy.Policy):
     else:
       #LOUD and print(f"child({action}) player {state.current_player()} {state.information_state_string()}")
       #print(f"child({action}) player {state.current_player()} {state.history()}")
+      if self._tree_index is not None:
+        return self.value(self._tree_index.child_state(state, action))
       return self.value(state.child(action))
 
   @_memoize_method()
@@ -249,7 +271,8 @@ class CPPBestResponsePolicy(openspiel_policy.Policy):
                all_states=None,
                state_to_information_state=None,
                best_response_processor=None,
-               cut_threshold=0.0):
+               cut_threshold=0.0,
+               tree_index=None):
     """Constructor.
 
     Args:
@@ -267,11 +290,14 @@ class CPPBestResponsePolicy(openspiel_policy.Policy):
         the best response actions.
       cut_threshold: The probability to cut when calculating the value.
         Increasing this value will trade off accuracy for speed.
+      tree_index: Optional `tree_index.TreeIndex` of the game, from which
+        all_states and state_to_information_state are taken if not given.
     """
     print("calling csais")
     (self.all_states, self.state_to_information_state) = (
         compute_states_and_info_states_if_none(game, all_states,
-                                               state_to_information_state))
+                                               state_to_information_state,
+                                               tree_index=tree_index))
 
     policy_to_dict = policy_utils.policy_to_dict(
         policy, game, self.all_states, self.state_to_information_state)
@@ -35,6 +35,8 @@ unknown to the best-responding player.
 """
 
 import collections
+import concurrent.futures
+import multiprocessing
 
 import numpy as np
 
@@ -43,19 +45,136 @@ from threat_hunting_games.algorithms import best_response as pyspiel_best_respon
 import pyspiel
 
 
-def _state_values(state, num_players, policy):
-  """Value of a state for every player given a policy."""
+def _history_key(state):
+  return state.history_str()
+
+
+def _state_values(state, num_players, policy, key=_history_key,
+                  cut_threshold=0.0, cache=None):
+  """Value of a state for every player given a policy.
+
+  The tree is walked iteratively, so deep games do not run into the Python
+  recursion limit, and values are memoized by `key(state)`: states sharing a
+  key are only evaluated once. The default key (the history) makes this the
+  plain tree walk. A canonical key (`get_all_states.canonical_key`) collapses
+  transpositions, but is only valid for policies whose action probabilities
+  depend on nothing more than the canonical state (not e.g. a
+  `TabularPolicy`, which is keyed on information states).
+
+  Args:
+    state: The state to evaluate.
+    num_players: The number of players in the game.
+    policy: A `policy.Policy` object.
+    key: Function from a state to a hashable memoization key.
+    cut_threshold: Transitions with a probability at or below this are
+      skipped, as in `BestResponsePolicy`.
+    cache: Optional dict of key -> values, shared across calls with the
+      same policy and key.
+
+  Returns:
+    A `[num_players]` numpy array of values.
+  """
+  if cache is None:
+    cache = {}
+  root_key = key(state)
+  # entries are [state, key, transitions], the transitions being a list of
+  # (prob, child key) once the children have been pushed
+  stack = [[state, root_key, None]]
+  while stack:
+    entry = stack[-1]
+    state, state_key, transitions = entry
+    if state_key in cache:
+      stack.pop()
+    elif transitions is not None:
+      stack.pop()
+      value = np.zeros(num_players)
+      for prob, child_key in transitions:
+        value = value + prob * cache[child_key]
+      cache[state_key] = value
+    elif state.is_terminal():
+      stack.pop()
+      cache[state_key] = np.array(state.returns())
+    else:
+      p_action = (
+          state.chance_outcomes() if state.is_chance_node() else
+          policy.action_probabilities(state).items())
+      entry[0] = None
+      entry[2] = transitions = []
+      for action, prob in p_action:
+        if prob <= cut_threshold:
+          continue
+        child = state.child(action)
+        child_key = key(child)
+        transitions.append((prob, child_key))
+        if child_key not in cache:
+          stack.append([child, child_key, None])
+  return cache[root_key]
+
+
+# Root subtrees and their evaluation settings, inherited by forked workers
+_subtree_args = None
+
+
+def _subtree_values(idx):
+  subtrees, num_players, policy, key, cut_threshold = _subtree_args
+  return _state_values(subtrees[idx], num_players, policy, key=key,
+                       cut_threshold=cut_threshold)
+
+
+def _parallel_state_values(state, num_players, policy, key, cut_threshold,
+                           workers):
+  """`_state_values` with the root's subtrees split across processes.
+
+  The processes are forked; where that is unavailable (e.g. Windows) the
+  subtrees are evaluated one after the other in this process.
+  """
+  global _subtree_args
   if state.is_terminal():
     return np.array(state.returns())
-  else:
-    p_action = (
-        state.chance_outcomes() if state.is_chance_node() else
-        policy.action_probabilities(state).items())
-    return sum(prob * _state_values(state.child(action), num_players, policy)
-               for action, prob in p_action)
+  p_action = [(action, prob) for action, prob in (
+      state.chance_outcomes() if state.is_chance_node() else
+      policy.action_probabilities(state).items()) if prob > cut_threshold]
+  subtrees = [state.child(action) for action, _ in p_action]
+  _subtree_args = (subtrees, num_players, policy, key, cut_threshold)
+  if "fork" not in multiprocessing.get_all_start_methods():
+    workers = 1
+  try:
+    if workers > 1:
+      # workers are forked so that the policy and states need not be pickled
+      with concurrent.futures.ProcessPoolExecutor(
+          max_workers=workers,
+          mp_context=multiprocessing.get_context("fork")) as executor:
+        values = list(executor.map(_subtree_values, range(len(subtrees))))
+    else:
+      values = [_subtree_values(idx) for idx in range(len(subtrees))]
+  finally:
+    _subtree_args = None
+  value = np.zeros(num_players)
+  for (_, prob), child_value in zip(p_action, values):
+    value = value + prob * child_value
+  return value
+
+
+def _on_policy_values(game, policy, tree_index=None, state_key=None,
+                      cut_threshold=0.0, workers=1):
+  """Value of the root for every player given a policy.
+
+  See `_state_values` for `state_key` and `cut_threshold`; with `workers`
+  the subtrees of the root are evaluated in that many processes.
+  """
+  if tree_index is not None and not cut_threshold:
+    return tree_index.values(policy)[0]
+  key = state_key or _history_key
+  root_state = game.new_initial_state()
+  if workers and workers > 1:
+    return _parallel_state_values(root_state, game.num_players(), policy,
+                                  key, cut_threshold, workers)
+  return _state_values(root_state, game.num_players(), policy, key=key,
+                       cut_threshold=cut_threshold)
 
 
-def best_response(game, policy, player_id):
+def best_response(game, policy, player_id, tree_index=None, state_key=None,
+                  cut_threshold=0.0, workers=1):
   """Returns information about the specified player's best response.
 
   Given a game and a policy for every player, computes for a single player their
@@ -70,6 +189,16 @@ def best_response(game, policy, player_id):
       enforced.
     player_id: The integer id of a player in the game for whom the best response
       will be computed.
+    tree_index: Optional `tree_index.TreeIndex` of the game, shared across
+      calls (e.g. every player and iteration of XFP) so that the tree is only
+      walked once.
+    state_key: Optional memoization key for the on-policy values, see
+      `_state_values`.
+    cut_threshold: Probability at or below which transitions are skipped,
+      both by the best responder and the on-policy values.
+    workers: Number of processes across which to split the root subtrees
+      for the on-policy values. The processes are forked; without the "fork"
+      start method (e.g. on Windows) the subtrees are evaluated sequentially.
 
   Returns:
     A dictionary of values, with keys:
@@ -91,9 +220,14 @@ def best_response(game, policy, player_id):
   root_state = game.new_initial_state()
   print("exp BRP()")
   br = pyspiel_best_response.BestResponsePolicy(game, player_id, policy,
-                                                root_state)
+                                                root_state,
+                                                cut_threshold=cut_threshold,
+                                                tree_index=tree_index)
   print("exp BRP() done")
-  on_policy_values = _state_values(root_state, game.num_players(), policy)
+  on_policy_values = _on_policy_values(game, policy, tree_index=tree_index,
+                                       state_key=state_key,
+                                       cut_threshold=cut_threshold,
+                                       workers=workers)
   print("exp br.value()")
   best_response_value = br.value(root_state)
 
@@ -112,7 +246,7 @@ def best_response(game, policy, player_id):
   }
 
 
-def exploitability(game, policy):
+def exploitability(game, policy, tree_index=None):
   """Returns the exploitability of the policy in the game.
 
   This is implemented only for 2 players constant-sum games, and is equivalent
@@ -123,6 +257,8 @@ def exploitability(game, policy):
     policy: A `policy.Policy` object. This policy should depend only on the
       information state available to the current player, but this is not
       enforced.
+    tree_index: Optional `tree_index.TreeIndex` of the game, the states of
+      which are shared by the best responders.
 
   Returns:
     The value that this policy achieves when playing against the worst-case
@@ -148,7 +284,8 @@ def exploitability(game, policy):
   nash_conv_value = (
       sum(
           pyspiel_best_response.CPPBestResponsePolicy(
-              game, best_responder, policy).value(root_state)
+              game, best_responder, policy,
+              tree_index=tree_index).value(root_state)
           for best_responder in range(game.num_players())) - game.utility_sum())
   print("exploitability got nash_conf_value")
   return nash_conv_value / game.num_players()
@@ -158,7 +295,8 @@ _NashConvReturn = collections.namedtuple("_NashConvReturn",
                                          ["nash_conv", "player_improvements"])
 
 
-def nash_conv(game, policy, return_only_nash_conv=True, use_cpp_br=False):
+def nash_conv(game, policy, return_only_nash_conv=True, use_cpp_br=False,
+              tree_index=None, state_key=None, workers=1):
   r"""Returns a measure of closeness to Nash for a policy in the game.
 
   See https://arxiv.org/pdf/1711.00832.pdf for the NashConv definition.
@@ -172,6 +310,13 @@ def nash_conv(game, policy, return_only_nash_conv=True, use_cpp_br=False):
       namedtuple containing additional statistics. Prefer using `False`, as we
       hope to change the default to that value.
     use_cpp_br: if True, compute the best response in c++
+    tree_index: Optional `tree_index.TreeIndex` of the game, shared by the
+      best responders (and across calls).
+    state_key: Optional memoization key for the on-policy values, see
+      `_state_values`.
+    workers: Number of processes across which to split the root subtrees
+      for the on-policy values. The processes are forked; without the "fork"
+      start method (e.g. on Windows) the subtrees are evaluated sequentially.
 
   Returns:
     Returns a object with the following attributes:
@@ -185,16 +330,19 @@ def nash_conv(game, policy, return_only_nash_conv=True, use_cpp_br=False):
   if use_cpp_br:
     best_response_values = np.array([
         pyspiel_best_response.CPPBestResponsePolicy(
-            game, best_responder, policy).value(root_state)
+            game, best_responder, policy,
+            tree_index=tree_index).value(root_state)
         for best_responder in range(game.num_players())
     ])
   else:
     best_response_values = np.array([
         pyspiel_best_response.BestResponsePolicy(
-            game, best_responder, policy).value(root_state)
+            game, best_responder, policy,
+            tree_index=tree_index).value(root_state)
         for best_responder in range(game.num_players())
     ])
-  on_policy_values = _state_values(root_state, game.num_players(), policy)
+  on_policy_values = _on_policy_values(game, policy, tree_index=tree_index,
+                                       state_key=state_key, workers=workers)
   player_improvements = best_response_values - on_policy_values
   nash_conv_ = sum(player_improvements)
   if return_only_nash_conv:
@@ -22,10 +22,10 @@ import itertools
 
 import numpy as np
 
-#from open_spiel.python import policy
-from threat_hunting_games import policy
+from open_spiel.python import policy
 #from open_spiel.python.algorithms import exploitability
 from threat_hunting_games.algorithms import exploitability
+from threat_hunting_games.algorithms import tree_index as tree_index_lib
 
 
 def _uniform_policy(state):
@@ -33,47 +33,6 @@ def _uniform_policy(state):
   return [(action, 1.0 / len(legal_actions)) for action in legal_actions]
 
 
-def _callable_tabular_policy(tabular_policy):
-  """Turns a tabular policy into a callable.
-
-  Args:
-    tabular_policy: A dictionary mapping information state key to a dictionary
-      of action probabilities (action -> prob).
-
-  Returns:
-    A function `state` -> list of (action, prob)
-  """
-
-  def wrap(state):
-    infostate_key = state.information_state_string(state.current_player())
-    assert infostate_key in tabular_policy
-    ap_list = []
-    for action in state.legal_actions():
-      assert action in tabular_policy[infostate_key]
-      ap_list.append((action, tabular_policy[infostate_key][action]))
-    return ap_list
-
-  return wrap
-
-
-class JointPolicy(policy.Policy):
-  """A policy for all players in the game."""
-
-  def __init__(self, game, policies):
-    """Initializes a joint policy from a table of callables.
-
-    Args:
-       game: The game being played.
-       policies: A dictionary mapping player number to a function `state` ->
-         list of (action, prob).
-    """
-    super().__init__(game, list(range(game.num_players())))
-    self.policies = policies
-
-  def action_probabilities(self, state, player_id=None):
-    return dict(self.policies[player_id or state.current_player()](state))
-
-
 def _full_best_response_policy(br_infoset_dict):
   """Turns a dictionary of best response action selections into a full policy.
 
@@ -122,7 +81,8 @@ class XFPSolver(object):
   http://mlanctot.info/files/papers/icml15-fsp.pdf.
   """
 
-  def __init__(self, game, save_oracles=False):
+  def __init__(self, game, save_oracles=False, tree_index=None,
+               cache_dir=None):
     """Initialize the XFP solver.
 
     Arguments:
@@ -131,38 +91,69 @@ class XFPSolver(object):
         policies along the way (including the initial uniform policy). This
         could take up some space, and is only used when generating the meta-game
         for analysis.
+      tree_index: the `tree_index.TreeIndex` of the game shared by the best
+        responses of every player and iteration. Built (or loaded from
+        `cache_dir`) via `tree_index.get_tree_index()` if not given.
+      cache_dir: directory in which tree indexes are saved, see
+        `tree_index.get_tree_index()`.
     """
 
     self._game = game
     self._num_players = self._game.num_players()
+    if tree_index is None:
+      tree_index = tree_index_lib.get_tree_index(game, cache_dir=cache_dir)
+    self._tree_index = tree_index
 
     # A set of callables that take in a state and return a list of
     # (action, probability) tuples.
     self._oracles = [] if save_oracles else None
-
-    # A set of callables that take in a state and return a list of
-    # (action, probability) tuples.
-    self._policies = []
-    for _ in range(self._num_players):
-      self._policies.append(_uniform_policy)
-      if save_oracles:
+    if save_oracles:
+      for _ in range(self._num_players):
         self._oracles.append([_uniform_policy])
 
+    # The average policies of all players, starting out uniform, in a
+    # single table. Rather than walking the tree, the average policy update
+    # is a sweep over the tree index with the policies as dense
+    # `[num_infosets, num_actions]` arrays indexed by infoset id (see
+    # tree_index.TreeIndex); _rows maps those to the rows of the table.
+    self._average_policy = policy.TabularPolicy(
+        game, states=tree_index.all_states())
+    self._rows = np.array([
+        self._average_policy.state_lookup[key]
+        for key in tree_index.infoset_keys
+    ], dtype=np.int64)
+    self._br_array = np.zeros(
+        (len(self._rows), game.num_distinct_actions()))
+
     self._best_responses = [None] * self._num_players
     self._iterations = 0
     self._delta_tolerance = 1e-10
-    self._average_policy_tables = []
+    self._average_policy_tables = None
 
   def average_policy_tables(self):
     """Returns a dictionary of information state -> dict of action -> prob.
 
     This is a joint policy (policy for all players).
     """
+    if self._average_policy_tables is None:
+      index = self._tree_index
+      probs = self._average_policy.action_probability_array[self._rows]
+      self._average_policy_tables = [{} for _ in range(self._num_players)]
+      for infoset_id, key in enumerate(index.infoset_keys):
+        player = index.infoset_players[infoset_id]
+        node = index.infoset_nodes[infoset_id]
+        self._average_policy_tables[player][key] = {
+            action: probs[infoset_id, action]
+            for action in index.children[node]
+        }
     return self._average_policy_tables
 
   def average_policy(self):
-    """Returns the current average joint policy (policy for all players)."""
-    return JointPolicy(self._game, self._policies)
+    """Returns the current average joint policy (policy for all players).
+
+    A `TabularPolicy` snapshot, later iterations don't modify it.
+    """
+    return self._average_policy.__copy__()
 
   def iteration(self):
     self._iterations += 1
@@ -173,78 +164,46 @@ class XFPSolver(object):
 
   def compute_best_responses(self):
     """Updates self._oracles to hold best responses for each player."""
+    index = self._tree_index
     for i in range(self._num_players):
-      # Compute a best response policy to pi_{-i}.
-      # First, construct pi_{-i}.
-      print("compute_best_responses ap")
-      joint_policy = self.average_policy()
+      # Compute a best response policy to pi_{-i}, which is simply the
+      # average policy table since the responder's own entries are ignored.
       print("compute_best_responses exp.best_response")
-      br_info = exploitability.best_response(self._game,
-                                             joint_policy.to_tabular(), i)
+      br_info = exploitability.best_response(
+          self._game, self._average_policy, i, tree_index=index)
       print("compute_best_responses _full_best_response_policy()")
-      full_br_policy = _full_best_response_policy(
-          br_info["best_response_action"])
+      br_actions = br_info["best_response_action"]
+      for key, infoset_id in zip(index.infosets[i],
+                                 np.flatnonzero(index.infoset_players == i)):
+        self._br_array[infoset_id] = 0.0
+        self._br_array[infoset_id, br_actions[key]] = 1.0
+      full_br_policy = _full_best_response_policy(br_actions)
       self._best_responses[i] = full_br_policy
       if self._oracles is not None:
         self._oracles[i].append(full_br_policy)
 
   def update_average_policies(self):
-    """Update the average policies given the newly computed best response."""
-
-    br_reach_probs = np.ones(self._num_players)
-    avg_reach_probs = np.ones(self._num_players)
-    self._average_policy_tables = [{} for _ in range(self._num_players)]
-    self._recursively_update_average_policies(self._game.new_initial_state(),
-                                              avg_reach_probs, br_reach_probs)
-    for i in range(self._num_players):
-      self._policies[i] = _callable_tabular_policy(
-          self._average_policy_tables[i])
+    """Update the average policies given the newly computed best response.
 
-  def _recursively_update_average_policies(self, state, avg_reach_probs,
-                                           br_reach_probs):
-    """Recursive implementation of the average strategy update."""
-
-    if state.is_terminal():
-      return
-    elif state.is_chance_node():
-      for action, _ in state.chance_outcomes():
-        new_state = state.clone()
-        new_state.apply_action(action)
-        self._recursively_update_average_policies(new_state, avg_reach_probs,
-                                                  br_reach_probs)
-    else:
-      player = state.current_player()
-      avg_policy = _policy_dict_at_state(self._policies[player], state)
-      br_policy = _policy_dict_at_state(self._best_responses[player], state)
-      legal_actions = state.legal_actions()
-      infostate_key = state.information_state_string(player)
-      # First traverse the subtrees.
-      for action in legal_actions:
-        assert action in br_policy
-        assert action in avg_policy
-        new_state = state.clone()
-        new_state.apply_action(action)
-        new_avg_reach = np.copy(avg_reach_probs)
-        new_avg_reach[player] *= avg_policy[action]
-        new_br_reach = np.copy(br_reach_probs)
-        new_br_reach[player] *= br_policy[action]
-        self._recursively_update_average_policies(new_state, new_avg_reach,
-                                                  new_br_reach)
-      # Now, do the updates.
-      if infostate_key not in self._average_policy_tables[player]:
-        alpha = 1 / (self._iterations + 1)
-        self._average_policy_tables[player][infostate_key] = {}
-        pr_sum = 0.0
-        for action in legal_actions:
-          pr = (
-              avg_policy[action] + (alpha * br_reach_probs[player] *
-                                    (br_policy[action] - avg_policy[action])) /
-              ((1.0 - alpha) * avg_reach_probs[player] +
-               alpha * br_reach_probs[player]))
-          self._average_policy_tables[player][infostate_key][action] = pr
-          pr_sum += pr
-        assert (1.0 - self._delta_tolerance <= pr_sum <=
-                1.0 + self._delta_tolerance)
+    For each infoset the player's own reach probability under the average and
+    the best response policies weigh the mix of the two, as in the
+    recursive tree walk of the original implementation. With perfect recall
+    these are the same for every state in an infoset.
+    """
+    index = self._tree_index
+    alpha = 1 / (self._iterations + 1)
+    avg_array = self._average_policy.action_probability_array[self._rows]
+    br_array = self._br_array
+    players = index.infoset_players
+    nodes = index.infoset_nodes
+    avg_reach = index.own_reach(avg_array)[nodes, players][:, np.newaxis]
+    br_reach = index.own_reach(br_array)[nodes, players][:, np.newaxis]
+    avg_array += (alpha * br_reach * (br_array - avg_array) /
+                  ((1.0 - alpha) * avg_reach + alpha * br_reach))
+    pr_sums = avg_array.sum(axis=1)
+    assert np.all(np.abs(pr_sums - 1.0) <= self._delta_tolerance)
+    self._average_policy.action_probability_array[self._rows] = avg_array
+    self._average_policy_tables = None
 
   def sample_episode(self, state, policies):
     """Samples an episode according to the policies, starting from state.
@@ -16,8 +16,12 @@
 
 The algorithm does not support mean field games where the game evolution depends
 on the mean field distribution.
+
+Also includes get_state_dag(), a transposition table variant that collapses
+states with the same canonical key (see the v6 GameState.canonical_key()).
 """
 
+import collections
 import itertools
 
 from open_spiel.python import games  # pylint:disable=unused-import
@@ -100,6 +104,7 @@ def _gas(game,
        include_terminals,
        include_chance_states,
        include_mean_field_states,
+       to_string,
        stop_if_encountered)
   print("  _gas():", k)
   if k not in _gasmap:
@@ -175,3 +180,81 @@ def _get_all_states(game,
     raise ValueError("GetSubgameStates returned 0 states!")
 
   return all_states
+
+
+StateDag = collections.namedtuple("StateDag", ["states", "edges", "depths"])
+StateDag.__doc__ = """Result of get_state_dag().
+
+Attributes:
+  states: `dict` of key -> representative `pyspiel.State` (the first one
+    encountered with that key).
+  edges: `dict` of key -> list of `(action, child_key)` for each legal
+    action, empty for terminal states (and states at the depth limit).
+  depths: `dict` of key -> shallowest depth at which the key was reached.
+"""
+
+
+def canonical_key(state):
+  """The game's canonical state key if it has one, else `history_str()`."""
+  key = getattr(state, "canonical_key", None)
+  if key is not None:
+    return key()
+  return state.history_str()
+
+
+def get_state_dag(game, depth_limit=-1, key=canonical_key):
+  """Gets all states in the game, collapsing transpositions into a DAG.
+
+  States reaching the same `key(state)` are expanded only once, so for games
+  with a canonical key (the v6 chain game) the cost is proportional to the
+  number of distinct situations rather than the number of histories, which
+  grows exponentially with the number of turns. With `key=lambda s:
+  s.history_str()` this is the same tree as get_all_states().
+
+  Only sequential games with deterministic (or internally sampled) transitions
+  are supported; explicit chance nodes are expanded like player nodes.
+
+  Arguments:
+    game: The game to analyze, as returned by `load_game`.
+    depth_limit: How deeply to analyze the game tree. Negative means no limit, 0
+      means root-only, etc. A state first reached beyond the limit is recorded
+      without being expanded.
+    key: Function from a state to a hashable key identifying equivalent
+      states.
+
+  Returns:
+    A `StateDag`; `len(dag.states)` and `sum(len(x) for x in
+    dag.edges.values())` are the node and edge counts.
+  """
+  states = {}
+  edges = {}
+  depths = {}
+  stack = []
+  for root in game.new_initial_states():
+    root_key = key(root)
+    if root_key not in states:
+      states[root_key] = root
+      depths[root_key] = 0
+      stack.append(root_key)
+  while stack:
+    state_key = stack.pop()
+    state = states[state_key]
+    depth = depths[state_key]
+    children = edges[state_key] = []
+    if state.is_terminal() or depth >= depth_limit >= 0:
+      continue
+    if state.is_simultaneous_node():
+      raise ValueError("get_state_dag() only supports sequential games")
+    if state.is_chance_node():
+      actions = [action for action, _ in state.chance_outcomes()]
+    else:
+      actions = state.legal_actions()
+    for action in actions:
+      child = state.child(action)
+      child_key = key(child)
+      children.append((action, child_key))
+      if child_key not in states:
+        states[child_key] = child
+        depths[child_key] = depth + 1
+        stack.append(child_key)
+  return StateDag(states, edges, depths)
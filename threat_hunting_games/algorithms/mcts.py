@@ -14,7 +14,9 @@
 
 """Monte-Carlo Tree Search algorithm for game play."""
 
+import concurrent.futures
 import math
+import multiprocessing
 import time
 
 import numpy as np
@@ -38,6 +40,14 @@ class Evaluator(object):
     """Returns a probability for each legal action in the given state."""
     raise NotImplementedError
 
+  def evaluate_batch(self, states):
+    """Returns evaluations of several states, e.g. in one network pass.
+
+    Used by MCTSBot when searching with a `batch_size`. Evaluators that can
+    do better than one state at a time should override this.
+    """
+    return [self.evaluate(state) for state in states]
+
 
 class RandomRolloutEvaluator(Evaluator):
   """A simple evaluator doing random rollouts.
@@ -69,6 +79,31 @@ class RandomRolloutEvaluator(Evaluator):
 
     return result / self.n_rollouts
 
+  def evaluate_batch(self, states):
+    """Returns evaluations of several states.
+
+    The rollouts of all of the states are played in lockstep, drawing the
+    random numbers for a whole round of moves at once.
+    """
+    working_states = [state.clone() for state in states
+                      for _ in range(self.n_rollouts)]
+    live = [x for x in working_states if not x.is_terminal()]
+    while live:
+      draws = self._random_state.random_sample(len(live))
+      for working_state, draw in zip(live, draws):
+        if working_state.is_chance_node():
+          action_list, prob_list = zip(*working_state.chance_outcomes())
+          idx = np.searchsorted(np.cumsum(prob_list), draw, side="right")
+          action = action_list[min(idx, len(action_list) - 1)]
+        else:
+          legal_actions = working_state.legal_actions()
+          action = legal_actions[int(draw * len(legal_actions))]
+        working_state.apply_action(action)
+      live = [x for x in live if not x.is_terminal()]
+    returns = np.array([x.returns() for x in working_states])
+    returns = returns.reshape(len(states), self.n_rollouts, -1)
+    return list(returns.mean(axis=1))
+
   def prior(self, state):
     """Returns equal probability for all actions."""
     if state.is_chance_node():
@@ -205,7 +240,12 @@ class MCTSBot(pyspiel.Bot):
                child_selection_fn=SearchNode.uct_value,
                dirichlet_noise=None,
                verbose=False,
-               dont_return_chance_node=False):
+               dont_return_chance_node=False,
+               reuse_tree=False,
+               transposition_key=None,
+               max_memory_nodes=None,
+               batch_size=1,
+               workers=1):
     """Initializes a MCTS Search algorithm in the form of a bot.
 
     In multiplayer games, or non-zero-sum games, the players will play the
@@ -231,6 +271,31 @@ class MCTSBot(pyspiel.Bot):
         sensibly.
       dont_return_chance_node: If true, do not stop expanding at chance nodes.
         Enabled for AlphaZero.
+      reuse_tree: Whether to keep the search tree from one step to the next.
+        When the state passed to `step` follows on from the root of the
+        previous search (e.g. our chosen action plus the opponent's reply),
+        the search continues from the matching subtree, keeping its
+        statistics, rather than starting from scratch. Dirichlet noise is
+        only added to the root when it is first expanded.
+      transposition_key: Optional function from a state to a hashable key,
+        e.g. `get_all_states.canonical_key` for the v6 game. Nodes of states
+        with the same key share their children, edge statistics and all, so
+        the visits and rewards of a move from a position are pooled over
+        every move order that reaches it. UCT then weighs the children
+        against the pooled visits of the position (the sum of their visits)
+        rather than against the visits of the particular parent node.
+      max_memory_nodes: If set, the least visited subtrees are dropped
+        whenever the search tree grows beyond this many nodes.
+      batch_size: How many leaves to collect per round of simulations, to be
+        evaluated together by `evaluator.evaluate_batch`. Paths already taken
+        in a round count as visits (a virtual loss) so that the following
+        descents spread out to other leaves.
+      workers: If more than 1, `step` runs that many independent searches in
+        forked processes, splitting `max_simulations` between them, and
+        plays the most visited action over all of them (root parallelism).
+        The searches start from scratch and do not touch the bot's tree.
+        Where processes cannot be forked (e.g. Windows) the same searches
+        run one after the other in this process.
 
     Raises:
       ValueError: if the game type isn't supported.
@@ -254,21 +319,48 @@ class MCTSBot(pyspiel.Bot):
     self._random_state = random_state or np.random.RandomState()
     self._child_selection_fn = child_selection_fn
     self.dont_return_chance_node = dont_return_chance_node
+    self.reuse_tree = reuse_tree
+    self._transposition_key = transposition_key
+    self.max_memory_nodes = max_memory_nodes
+    self._root = None
+    self._root_history = None
+    self._transpositions = {}
+    self._num_nodes = 0
+    self.batch_size = max(1, batch_size)
+    self.workers = workers
+    self._num_simulations = 0
+
+  @property
+  def num_nodes(self):
+    """Number of nodes in the current search tree."""
+    return self._num_nodes
+
+  def restart(self):
+    self._root = None
+    self._root_history = None
+    self._transpositions = {}
+    self._num_nodes = 0
 
   def restart_at(self, state):
-    pass
+    self.restart()
 
   def step_with_policy(self, state):
     """Returns bot's policy and action at given state."""
     t1 = time.time()
-    root = self.mcts_search(state)
+    if self.workers and self.workers > 1:
+      root = self.parallel_search(state)
+    else:
+      root = self.mcts_search(state)
 
     best = root.best_child()
 
     if self.verbose:
       seconds = time.time() - t1
-      print("Finished {} sims in {:.3f} secs, {:.1f} sims/s".format(
-          root.explore_count, seconds, root.explore_count / seconds))
+      print("Finished {} sims in {:.3f} secs, {:.1f} sims/s "
+            "(batch size {}, {} workers)".format(
+                self._num_simulations, seconds,
+                self._num_simulations / seconds, self.batch_size,
+                max(1, self.workers or 1)))
       print("Root:")
       print(root.to_str(state))
       print("Children:")
@@ -321,9 +413,10 @@ class MCTSBot(pyspiel.Bot):
         # Reduce bias from move generation order.
         self._random_state.shuffle(legal_actions)
         player = working_state.current_player()
-        current_node.children = [
-            SearchNode(action, player, prior) for action, prior in legal_actions
-        ]
+        # extended in place, the list may be shared with transpositions
+        current_node.children.extend(
+            SearchNode(action, player, prior) for action, prior in legal_actions)
+        self._num_nodes += len(legal_actions)
 
       if working_state.is_chance_node():
         # For chance nodes, rollout according to chance node's probability
@@ -335,17 +428,109 @@ class MCTSBot(pyspiel.Bot):
             c for c in current_node.children if c.action == action)
       else:
         # Otherwise choose node with largest UCT value
+        parent_count = self._parent_count(current_node)
         chosen_child = max(
             current_node.children,
             key=lambda c: self._child_selection_fn(  # pylint: disable=g-long-lambda
-                c, current_node.explore_count, self.uct_c))
+                c, parent_count, self.uct_c))
 
       working_state.apply_action(chosen_child.action)
       current_node = chosen_child
       visit_path.append(current_node)
+      if self._transposition_key and not current_node.explore_count:
+        self._transpose(current_node, working_state)
 
     return visit_path, working_state
 
+  def _parent_count(self, node):
+    """Returns the visit count the children of a node are weighed against."""
+    if self._transposition_key:
+      # the children may be shared with other nodes of the same position,
+      # their counts including visits through those
+      return sum(c.explore_count for c in node.children)
+    return node.explore_count
+
+  def _transpose(self, node, state):
+    """Shares the children, and so the edge statistics, of a node first
+    reached with those of an earlier node of the same position."""
+    if state.is_terminal():
+      return
+    key = self._transposition_key(state)
+    other = self._transpositions.get(key)
+    if other is None:
+      self._transpositions[key] = node
+    elif other is not node and not node.children:
+      node.children = other.children
+
+  def _reachable(self, root):
+    """Returns a dict of id -> node for the nodes under the root."""
+    nodes = {id(root): root}
+    lists = set()
+    stack = [root]
+    while stack:
+      node = stack.pop()
+      if id(node.children) in lists:
+        continue
+      lists.add(id(node.children))
+      for child in node.children:
+        if id(child) not in nodes:
+          nodes[id(child)] = child
+          stack.append(child)
+    return nodes
+
+  def _retain(self, root):
+    """Forgets nodes (and transpositions) no longer under the root."""
+    nodes = self._reachable(root)
+    self._num_nodes = len(nodes)
+    self._transpositions = {
+        k: v for k, v in self._transpositions.items() if id(v) in nodes}
+
+  def _evict(self, root):
+    """Drops the least visited subtrees until under max_memory_nodes."""
+    # prune down to 3/4 of the cap so that eviction is not needed after
+    # every simulation once the cap is reached
+    target = self.max_memory_nodes * 3 // 4
+    nodes = self._reachable(root)
+    candidates = sorted((x for x in nodes.values()
+                         if x.children and x is not root),
+                        key=lambda x: x.explore_count)
+    num_nodes = len(nodes)
+    for node in candidates:
+      if num_nodes <= target:
+        break
+      # an estimate, subtrees may be shared or already dropped
+      num_nodes -= len(node.children)
+      # re-expanded if visited again, a proven outcome still holds
+      node.children = []
+    self._retain(root)
+
+  def _search_root(self, state):
+    """Returns the root for a search from the state, reusing the tree."""
+    history = state.history()
+    root = None
+    if self.reuse_tree and self._root is not None:
+      prior = self._root_history
+      if len(history) >= len(prior) and history[:len(prior)] == prior:
+        root = self._root
+        for action in history[len(prior):]:
+          root = next((c for c in root.children if c.action == action), None)
+          if root is None:
+            break
+    if root is None:
+      self.restart()
+      root = SearchNode(None, state.current_player(), 1)
+      self._num_nodes = 1
+    else:
+      if root is not self._root:
+        self._retain(root)
+      # the node of a move (or chance outcome) into the state is now the
+      # root, searched from for the player to move
+      root.player = state.current_player()
+    if self.reuse_tree:
+      self._root = root
+      self._root_history = history
+    return root
+
   def mcts_search(self, state):
     """A vanilla Monte-Carlo Tree Search algorithm.
 
@@ -389,62 +574,191 @@ class MCTSBot(pyspiel.Bot):
     - Winands, Bjornsson, and Saito, "Monte-Carlo Tree Search Solver", 2008.
       https://dke.maastrichtuniversity.nl/m.winands/documents/uctloa.pdf
 
+    With `reuse_tree`, the search picks up from the subtree of the previous
+    search matching the state, and `max_simulations` more simulations are
+    run on top of those already made.
+
     Arguments:
       state: pyspiel.State object, state to search from
 
     Returns:
       The most visited move from the root node.
     """
-    root = SearchNode(None, state.current_player(), 1)
-    for _ in range(self.max_simulations):
-      visit_path, working_state = self._apply_tree_policy(root, state)
-      if working_state.is_terminal():
-        returns = working_state.returns()
-        visit_path[-1].outcome = returns
-        solved = self.solve
-      else:
-        returns = self.evaluator.evaluate(working_state)
-        solved = False
-
-      while visit_path:
-        # For chance nodes, walk up the tree to find the decision-maker.
-        decision_node_idx = -1
-        while visit_path[decision_node_idx].player == pyspiel.PlayerId.CHANCE:
-          decision_node_idx -= 1
-        # Chance node targets are for the respective decision-maker.
-        target_return = returns[visit_path[decision_node_idx].player]
-        node = visit_path.pop()
-        node.total_reward += target_return
+    root = self._search_root(state)
+    self._num_simulations = 0
+    while self._num_simulations < self.max_simulations:
+      # a round of simulations, the leaves of which are evaluated together
+      round_size = min(self.batch_size,
+                       self.max_simulations - self._num_simulations)
+      pending = []
+      for _ in range(round_size):
+        visit_path, working_state = self._apply_tree_policy(root, state)
+        self._num_simulations += 1
+        if working_state.is_terminal():
+          returns = working_state.returns()
+          visit_path[-1].outcome = returns
+          self._backpropagate(visit_path, returns, self.solve)
+          if root.outcome is not None:
+            break
+        elif round_size == 1:
+          self._backpropagate(visit_path,
+                              self.evaluator.evaluate(working_state), False)
+        else:
+          # virtual loss: count the visits now, the rewards once evaluated
+          for node in visit_path:
+            node.explore_count += 1
+          pending.append((visit_path, working_state))
+      if pending:
+        values = self.evaluator.evaluate_batch([x[1] for x in pending])
+        for (visit_path, _), returns in zip(pending, values):
+          self._backpropagate(visit_path, returns, False, counted=True)
+      if (self.max_memory_nodes and
+          self._num_nodes > self.max_memory_nodes):
+        self._evict(root)
+      if root.outcome is not None:
+        break
+
+    return root
+
+  def _backpropagate(self, visit_path, returns, solved, counted=False):
+    """Backs up the returns of a simulation along its path.
+
+    Args:
+      visit_path: The nodes from the root to the leaf.
+      returns: The returns (or evaluation) for every player at the leaf.
+      solved: Whether the leaf is terminal and solved states should be backed
+        up (MCTS-Solver).
+      counted: Whether the visits were already counted (a virtual loss).
+    """
+    visit_path = list(visit_path)
+    while visit_path:
+      # For chance nodes, walk up the tree to find the decision-maker.
+      decision_node_idx = -1
+      while (decision_node_idx > -len(visit_path) and
+             visit_path[decision_node_idx].player == pyspiel.PlayerId.CHANCE):
+        decision_node_idx -= 1
+      # Chance node targets are for the respective decision-maker.
+      target_return = returns[visit_path[decision_node_idx].player]
+      node = visit_path.pop()
+      node.total_reward += target_return
+      if not counted:
         node.explore_count += 1
 
-        if solved and node.children:
-          player = node.children[0].player
-          if player == pyspiel.PlayerId.CHANCE:
-            # Only back up chance nodes if all have the same outcome.
-            # An alternative would be to back up the weighted average of
-            # outcomes if all children are solved, but that is less clear.
-            outcome = node.children[0].outcome
-            if (outcome is not None and
-                all(np.array_equal(c.outcome, outcome) for c in node.children)):
-              node.outcome = outcome
-            else:
-              solved = False
+      if solved and node.children:
+        player = node.children[0].player
+        if player == pyspiel.PlayerId.CHANCE:
+          # Only back up chance nodes if all have the same outcome.
+          # An alternative would be to back up the weighted average of
+          # outcomes if all children are solved, but that is less clear.
+          outcome = node.children[0].outcome
+          if (outcome is not None and
+              all(np.array_equal(c.outcome, outcome) for c in node.children)):
+            node.outcome = outcome
           else:
-            # If any have max utility (won?), or all children are solved,
-            # choose the one best for the player choosing.
-            best = None
-            all_solved = True
-            for child in node.children:
-              if child.outcome is None:
-                all_solved = False
-              elif best is None or child.outcome[player] > best.outcome[player]:
-                best = child
-            if (best is not None and
-                (all_solved or best.outcome[player] == self.max_utility)):
-              node.outcome = best.outcome
-            else:
-              solved = False
-      if root.outcome is not None:
-        break
+            solved = False
+        else:
+          # If any have max utility (won?), or all children are solved,
+          # choose the one best for the player choosing.
+          best = None
+          all_solved = True
+          for child in node.children:
+            if child.outcome is None:
+              all_solved = False
+            elif best is None or child.outcome[player] > best.outcome[player]:
+              best = child
+          if (best is not None and
+              (all_solved or best.outcome[player] == self.max_utility)):
+            node.outcome = best.outcome
+          else:
+            solved = False
 
+  def parallel_search(self, state):
+    """Root-parallel search: independent searches in a pool of processes.
+
+    Each of `workers` forked processes searches from scratch with its own
+    random seed and a share of `max_simulations`. The statistics of the
+    root's children are summed by action over all of the searches. Without
+    the "fork" start method the searches run sequentially in this process,
+    with the same seeds and results, and the bot's own tree and settings are
+    put back afterwards.
+
+    Arguments:
+      state: pyspiel.State object, state to search from
+
+    Returns:
+      A root node whose children carry the merged statistics.
+    """
+    global _parallel_search_args
+    seeds = self._random_state.randint(2**31 - 1, size=self.workers)
+    simulations = -(-self.max_simulations // self.workers)
+    if "fork" in multiprocessing.get_all_start_methods():
+      _parallel_search_args = (self, state, simulations)
+      try:
+        # workers are forked so that neither the bot nor the state need to be
+        # pickled
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork")) as executor:
+          results = list(executor.map(_root_statistics, seeds))
+      finally:
+        _parallel_search_args = None
+    else:
+      saved = {name: getattr(self, name) for name in _SEARCH_ATTRIBUTES}
+      evaluator_random_state = getattr(self.evaluator, "_random_state", None)
+      try:
+        results = [_search_statistics(self, state, simulations, seed)
+                   for seed in seeds]
+      finally:
+        for name, value in saved.items():
+          setattr(self, name, value)
+        if evaluator_random_state is not None:
+          self.evaluator._random_state = evaluator_random_state  # pylint: disable=protected-access
+    root = SearchNode(None, state.current_player(), 1)
+    children = {}
+    self._num_simulations = 0
+    for num_simulations, stats in results:
+      self._num_simulations += num_simulations
+      for action, player, prior, explore_count, total_reward, outcome in stats:
+        child = children.get(action)
+        if child is None:
+          child = children[action] = SearchNode(action, player, prior)
+          child.outcome = outcome
+        elif child.outcome is not None and (
+            outcome is None or not np.array_equal(child.outcome, outcome)):
+          child.outcome = None
+        child.explore_count += explore_count
+        child.total_reward += total_reward
+        root.explore_count += explore_count
+    root.children = list(children.values())
     return root
+
+
+# The bot, state and simulations per search, inherited by forked workers
+_parallel_search_args = None
+
+# What a search of a root-parallel search changes on the bot
+_SEARCH_ATTRIBUTES = ("_random_state", "max_simulations", "reuse_tree",
+                      "_root", "_root_history", "_transpositions",
+                      "_num_nodes")
+
+
+def _root_statistics(seed):
+  """Runs one search of a root-parallel search, see MCTSBot.parallel_search."""
+  bot, state, simulations = _parallel_search_args
+  return _search_statistics(bot, state, simulations, seed)
+
+
+def _search_statistics(bot, state, simulations, seed):
+  """Searches from scratch, returning the statistics of the root's children."""
+  bot._random_state = np.random.RandomState(seed)  # pylint: disable=protected-access
+  if hasattr(bot.evaluator, "_random_state"):
+    bot.evaluator._random_state = np.random.RandomState(seed + 1)  # pylint: disable=protected-access
+  bot.max_simulations = simulations
+  bot.reuse_tree = False
+  bot.restart()
+  root = bot.mcts_search(state)
+  return bot._num_simulations, [  # pylint: disable=protected-access
+      (c.action, c.player, c.prior, c.explore_count, c.total_reward,
+       None if c.outcome is None else list(c.outcome))
+      for c in root.children]
+
@@ -0,0 +1,376 @@
+"""Index of a game tree, shared across best response computations.
+
+Building a best response (best_response.BestResponsePolicy) starts with a
+walk of the whole tree to gather the information sets of the best responder
+along with their counterfactual reach probabilities, and computing the values
+of a policy walks it again. XFP (fictitious_play.XFPSolver) does this for each
+player every iteration, for the same game. A TreeIndex is the result of a
+single walk: every node of the tree is numbered in depth first preorder
+(parents precede their children) with its parent, the action leading to it,
+the player to move, chance probabilities, returns and information state. The
+structure of the tree never changes, so the index can be reused for every
+player, policy and iteration; only the reach probability slots are refilled.
+
+Nodes are keyed by their history. The pyspiel states themselves are kept
+for the nodes visited by the walk and rebuilt on demand (from the closest
+ancestor) for an index loaded from disk, which is what lets get_tree_index()
+start repeated exploitability runs on the same game configuration warm.
+
+Only sequential games are supported.
+"""
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+import pyspiel
+
+from open_spiel.python import policy as openspiel_policy
+
+# bump when the pickled layout changes
+_VERSION = 1
+
+
+class TreeIndex(object):
+  """Nodes of a game tree in depth first preorder.
+
+  Attributes:
+    parents: `[num_nodes]` array of parent node ids, -1 for the root.
+    actions: `[num_nodes]` array of the action leading to each node from its
+      parent, -1 for the root.
+    players: `[num_nodes]` array of the player to move (or
+      `pyspiel.PlayerId.CHANCE` / `TERMINAL`).
+    chance_probs: `[num_nodes]` array of the probability of the chance
+      outcome leading to each node, 1.0 for nodes with a non-chance parent.
+    returns: `[num_nodes, num_players]` array of returns, for terminal nodes.
+    info_states: list of the information state string of the player to move,
+      None for chance and terminal nodes.
+    children: list of `{action: child node id}` dicts.
+    infosets: list (one per player) of `{info_state: [node ids]}` dicts.
+    infoset_ids: `[num_nodes]` array of the infoset id of each decision
+      node, -1 for chance and terminal nodes. Infosets are numbered player
+      by player in the order of `infosets`.
+    infoset_keys: list of the information state string of each infoset id.
+    infoset_players: `[num_infosets]` array of the player of each infoset.
+    infoset_nodes: `[num_infosets]` array of the first node of each infoset.
+    levels: list of the node id arrays at each depth, for sweeps that go
+      level by level rather than node by node.
+  """
+
+  def __init__(self, game, _arrays=None):
+    self._game = game
+    self._num_players = game.num_players()
+    if _arrays is None:
+      _arrays = self._walk(game)
+    else:
+      self._states = None
+    (self.parents, self.actions, self.players, self.chance_probs,
+     self.returns, self.info_states) = _arrays
+    num_nodes = len(self.parents)
+    if self._states is None:
+      self._states = [None] * num_nodes
+      self._states[0] = game.new_initial_state()
+    self.children = [{} for _ in range(num_nodes)]
+    self._histories = [()] * num_nodes
+    for node in range(1, num_nodes):
+      parent = self.parents[node]
+      action = int(self.actions[node])
+      self.children[parent][action] = node
+      self._histories[node] = self._histories[parent] + (action,)
+    self._nodes = {x: i for i, x in enumerate(self._histories)}
+    self.infosets = [{} for _ in range(self._num_players)]
+    for node, info_state in enumerate(self.info_states):
+      if info_state is not None:
+        player = self.players[node]
+        self.infosets[player].setdefault(info_state, []).append(node)
+    self.infoset_ids = np.full(num_nodes, -1, dtype=np.int32)
+    self.infoset_keys = []
+    infoset_players, infoset_nodes = [], []
+    for player, infosets in enumerate(self.infosets):
+      for info_state, nodes in infosets.items():
+        self.infoset_ids[nodes] = len(self.infoset_keys)
+        self.infoset_keys.append(info_state)
+        infoset_players.append(player)
+        infoset_nodes.append(nodes[0])
+    self.infoset_players = np.array(infoset_players, dtype=np.int32)
+    self.infoset_nodes = np.array(infoset_nodes, dtype=np.int32)
+    depths = np.zeros(num_nodes, dtype=np.int32)
+    for node in range(1, num_nodes):
+      depths[node] = depths[self.parents[node]] + 1
+    order = np.argsort(depths, kind="stable")
+    self.levels = np.split(order, np.flatnonzero(np.diff(depths[order])) + 1)
+    # children of decision nodes, with the infoset and player of their parent
+    self._decision_children = np.flatnonzero(
+        self.infoset_ids[np.maximum(self.parents, 0)] >= 0)
+    self._decision_children = \
+        self._decision_children[self._decision_children > 0]
+    # reach probability slots, refilled by counterfactual_reach()
+    self._reach = np.ones(num_nodes)
+    self._all_states = None
+
+  def _walk(self, game):
+    if game.get_type().dynamics != pyspiel.GameType.Dynamics.SEQUENTIAL:
+      raise ValueError("TreeIndex only supports sequential games")
+    parents, actions, players, chance_probs = [], [], [], []
+    returns, info_states, states = [], [], []
+    stack = [(-1, -1, 1.0, game.new_initial_state())]
+    while stack:
+      parent, action, prob, state = stack.pop()
+      node = len(parents)
+      parents.append(parent)
+      actions.append(action)
+      chance_probs.append(prob)
+      states.append(state)
+      player = state.current_player()
+      players.append(player)
+      if state.is_terminal():
+        returns.append(state.returns())
+        info_states.append(None)
+        continue
+      returns.append([0.0] * self._num_players)
+      if state.is_chance_node():
+        info_states.append(None)
+        outcomes = state.chance_outcomes()
+      else:
+        info_states.append(state.information_state_string(player))
+        outcomes = [(x, 1.0) for x in state.legal_actions()]
+      # reversed so that children are numbered in action order
+      for child_action, child_prob in reversed(outcomes):
+        stack.append((node, child_action, child_prob,
+                      state.child(child_action)))
+    self._states = states
+    return (np.array(parents, dtype=np.int32),
+            np.array(actions, dtype=np.int64),
+            np.array(players, dtype=np.int32),
+            np.array(chance_probs, dtype=np.float64),
+            np.array(returns, dtype=np.float64).reshape(len(parents),
+                                                        self._num_players),
+            info_states)
+
+  def __len__(self):
+    return len(self.parents)
+
+  @property
+  def game(self):
+    return self._game
+
+  def node(self, state):
+    """Returns the node id of a state of this game."""
+    return self._nodes[tuple(state.history())]
+
+  def state(self, node):
+    """Returns the `pyspiel.State` of a node (shared, do not modify)."""
+    state = self._states[node]
+    if state is None:
+      path = []
+      while self._states[node] is None:
+        path.append(node)
+        node = self.parents[node]
+      state = self._states[node]
+      for node in reversed(path):
+        state = state.child(int(self.actions[node]))
+        self._states[node] = state
+    return state
+
+  def child_state(self, state, action):
+    """Returns the (shared) child of a state, without cloning it."""
+    return self.state(self.children[self.node(state)][action])
+
+  def is_decision_node(self, node):
+    return self.info_states[node] is not None
+
+  def all_states(self):
+    """Returns the decision nodes as get_all_states.get_all_states() would.
+
+    That is with `include_terminals=False` and `include_chance_states=False`,
+    keyed by `history_str()`. The dict is shared, do not modify.
+    """
+    if self._all_states is None:
+      self._all_states = {
+          ", ".join(str(x) for x in self._histories[node]): self.state(node)
+          for node in range(len(self))
+          if self.is_decision_node(node)
+      }
+    return self._all_states
+
+  def state_to_information_state(self):
+    """Returns `{history_str: information_state_string}` for decision nodes."""
+    return {
+        ", ".join(str(x) for x in self._histories[node]):
+        self.info_states[node]
+        for node in range(len(self))
+        if self.is_decision_node(node)
+    }
+
+  def own_reach(self, policy_array):
+    """Returns each player's own reach probability of every node.
+
+    `policy_array` is `[num_infosets, num_actions]` action probabilities
+    indexed by infoset id. The reach of a node for a player is the product of
+    that player's action probabilities along the path to it; chance and the
+    other players don't factor in. Returns a `[num_nodes, num_players]` array,
+    computed level by level.
+    """
+    children = self._decision_children
+    parents = self.parents[children]
+    edge_probs = np.ones(len(self))
+    edge_probs[children] = policy_array[self.infoset_ids[parents],
+                                        self.actions[children]]
+    owners = np.full(len(self), -1, dtype=np.int32)
+    owners[children] = self.players[parents]
+    reach = np.ones((len(self), self._num_players))
+    for level in self.levels[1:]:
+      reach[level] = reach[self.parents[level]]
+      owned = level[owners[level] >= 0]
+      reach[owned, owners[owned]] *= edge_probs[owned]
+    return reach
+
+  def action_probabilities(self, policy, node):
+    """Returns `{action: prob}` of `policy` at a decision node."""
+    if isinstance(policy, openspiel_policy.TabularPolicy):
+      # straight from the table, without building the state
+      row = policy.state_lookup.get(self.info_states[node])
+      if row is not None:
+        probs = policy.action_probability_array[row]
+        return {action: probs[action] for action in self.children[node]}
+    return policy.action_probabilities(self.state(node))
+
+  def edge_probs(self, policy, player_id=None):
+    """Returns the probability of the edge leading to every node.
+
+    That is the chance probability for children of chance nodes and the
+    `policy` probability for children of decision nodes, except 1.0 for the
+    children of `player_id` nodes if given. Row 0 (the root) is 1.0.
+    """
+    children = self._decision_children
+    parents = self.parents[children]
+    probs = self.chance_probs.copy()
+    rows = None
+    if isinstance(policy, openspiel_policy.TabularPolicy):
+      lookup = policy.state_lookup
+      rows = np.array([lookup.get(key, -1) for key in self.infoset_keys],
+                      dtype=np.int64)
+      if len(rows) and rows.min() < 0:
+        rows = None
+    if rows is not None:
+      # straight from the table, without building the states
+      probs[children] = policy.action_probability_array[
+          rows[self.infoset_ids[parents]], self.actions[children]]
+    else:
+      for node in np.unique(parents):
+        node_probs = self.action_probabilities(policy, node)
+        for action, child in self.children[node].items():
+          probs[child] = node_probs.get(action, 0.0)
+    if player_id is not None:
+      probs[children[self.players[parents] == player_id]] = 1.0
+    return probs
+
+  def counterfactual_reach(self, player_id, policy):
+    """Fills and returns the reach probability slots for a best responder.
+
+    The counterfactual reach probability of a node is the product of the
+    chance and opponent (`policy`) probabilities along its path, excluding
+    those of `player_id`. The returned array is reused by the next call.
+    """
+    probs = self.edge_probs(policy, player_id=player_id)
+    reach = self._reach
+    reach[0] = 1.0
+    for level in self.levels[1:]:
+      reach[level] = reach[self.parents[level]] * probs[level]
+    return reach
+
+  def info_sets(self, player_id, policy):
+    """Returns BestResponsePolicy.info_sets() of the root for `player_id`.
+
+    A dict of infostatekey to list of (state, cf_probability).
+    """
+    reach = self.counterfactual_reach(player_id, policy)
+    return {
+        info_state: [(self.state(node), reach[node]) for node in nodes]
+        for info_state, nodes in self.infosets[player_id].items()
+    }
+
+  def values(self, policy):
+    """Returns the `[num_nodes, num_players]` values of every node.
+
+    Values are for all players following `policy`; the root is row 0.
+    """
+    probs = self.edge_probs(policy)
+    values = self.returns.copy()
+    # deepest first, so children are done before their parent
+    for level in reversed(self.levels[1:]):
+      np.add.at(values, self.parents[level],
+                probs[level][:, np.newaxis] * values[level])
+    return values
+
+  def save(self, path):
+    """Saves the index, sans states, to `path`."""
+    data = {
+        "version": _VERSION,
+        "game": str(self._game),
+        "arrays": (self.parents, self.actions, self.players,
+                   self.chance_probs, self.returns, self.info_states),
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fh:
+      pickle.dump(data, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+  @classmethod
+  def load(cls, path, game):
+    """Loads an index saved for `game`, raising ValueError on a mismatch."""
+    with open(path, "rb") as fh:
+      data = pickle.load(fh)
+    if data.get("version") != _VERSION:
+      raise ValueError(f"stale tree index: {path}")
+    if data["game"] != str(game):
+      raise ValueError(
+          f"tree index is for {data['game']}, not {game}: {path}")
+    return cls(game, _arrays=data["arrays"])
+
+
+# the indexes of the most recently used game configurations, oldest first;
+# each holds the arrays of a whole game tree
+_tree_indexes = {}
+TREE_INDEXES_CACHE_SIZE = 8
+
+
+def tree_index_path(game, cache_dir):
+  """Returns the file a game's index is saved to within `cache_dir`."""
+  digest = hashlib.sha1(str(game).encode()).hexdigest()[:16]
+  return os.path.join(cache_dir, f"tree_index-{digest}.pickle")
+
+
+def get_tree_index(game, cache_dir=None):
+  """Returns the TreeIndex of a game, building it only the first time around.
+
+  Indexes are kept per game configuration (`str(game)`, which includes the
+  game parameters), for the TREE_INDEXES_CACHE_SIZE configurations used most
+  recently. With `cache_dir`, they are also loaded from and saved to that
+  directory so that later processes start warm.
+  """
+  key = str(game)
+  tree_index = _tree_indexes.pop(key, None)
+  if tree_index is not None:
+    _tree_indexes[key] = tree_index
+    return tree_index
+  path = None
+  if cache_dir:
+    path = tree_index_path(game, cache_dir)
+    if os.path.exists(path):
+      try:
+        tree_index = TreeIndex.load(path, game)
+      except ValueError:
+        # stale, rebuild it
+        tree_index = None
+  if tree_index is None:
+    tree_index = TreeIndex(game)
+    if path:
+      os.makedirs(cache_dir, exist_ok=True)
+      tree_index.save(path)
+  _tree_indexes[key] = tree_index
+  while len(_tree_indexes) > TREE_INDEXES_CACHE_SIZE:
+    del _tree_indexes[next(iter(_tree_indexes))]
+  return tree_index
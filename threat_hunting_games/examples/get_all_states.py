@@ -35,6 +35,10 @@ flags.DEFINE_integer("players", None, "Number of players")
 flags.DEFINE_integer("depth_limit", -1, "Depth limit to stop at")
 flags.DEFINE_bool("include_terminals", True, "Include terminal states?")
 flags.DEFINE_bool("include_chance_states", True, "Include chance states?")
+flags.DEFINE_bool("transpositions", False,
+                  "Collapse transpositions (states with the same canonical "
+                  "key) into a DAG and report node and edge counts?")
+flags.DEFINE_integer("num_turns", None, "Number of turns (v6 chain game)")
 
 
 def main(_):
@@ -48,8 +52,19 @@ def main(_):
   params = {}
   if FLAGS.players is not None:
     params["players"] = FLAGS.players
+  if FLAGS.num_turns is not None:
+    params["num_turns"] = FLAGS.num_turns
   game = pyspiel.load_game(FLAGS.game, params)
 
+  if FLAGS.transpositions:
+    print("Getting state DAG; depth_limit = {}".format(FLAGS.depth_limit))
+    dag = get_all_states.get_state_dag(game, FLAGS.depth_limit)
+    num_edges = sum(len(x) for x in dag.edges.values())
+    num_terminals = sum(1 for x in dag.states.values() if x.is_terminal())
+    print("Total: {} nodes ({} terminal), {} edges.".format(
+        len(dag.states), num_terminals, num_edges))
+    return
+
   print("Getting all states; depth_limit = {}".format(FLAGS.depth_limit))
   all_states = get_all_states.get_all_states(game, FLAGS.depth_limit,
                                              FLAGS.include_terminals,
@@ -21,7 +21,7 @@ except (ModuleNotFoundError, ImportError):
     from games.v3 import v3_lockbit_seq
     from games.v3 import v3_lb_seq_zsum
     from games.v4_policy import v4_lb_seq_zsum
-    from .games.v5_ghosts import v5_policy_game
+    from games.v5_ghosts import v5_policy_game
 
 #current_game = v2
 #current_game = v2_seq
@@ -8,7 +8,9 @@ from dataclasses import dataclass
 from enum import IntEnum, auto
 import random
 
-import pyspiel
+# same value as pyspiel.INVALID_ACTION, these internal modules do not
+# depend on pyspiel
+INVALID_ACTION = -1
 
 DEBUG = True
 
@@ -137,7 +139,7 @@ def action_to_str(action: Actions) -> str:
     Call the enum in case given action is an int
     '''
     if action is not None:
-        if action == pyspiel.INVALID_ACTION:
+        if action == INVALID_ACTION:
             return "Invalid_Action"
         else:
             return Actions(action).name.title()
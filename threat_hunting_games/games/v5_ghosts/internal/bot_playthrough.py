@@ -1,21 +1,20 @@
 #!/bin/env python3
 #
-# This playthrough wrapper uses bots, one for the defender and one for
-# the attacker. These bots are responsible for using policies to select
-# each player's next action. Since the bots are controlling the policies
-# there is no need to pass policies as parameters to the Game
-# initialization.
+# This playthrough plays the attacker and defender policies against one
+# another headless (see headless.py): the policies are embedded in the
+# game states, which pick each player's next action, and the games are
+# played on internal.game.GameState directly, so neither OpenSpiel nor
+# pyspiel are needed.
 
 import os, sys, json
 import argparse
 import collections
-import numpy as np
 from datetime import datetime
 
 import policies
 import arena_zsum as arena
-from game import FakeGame, game_max_turns
-from pyspiel_policy_bot import PolicyBot
+import headless
+from game import game_max_turns
 
 
 default_game = "chain_game_v5_lb_seq_zsum"
@@ -32,51 +31,16 @@ default_defender_policy = "simple_random"
 # choose one of the three; uniform random comes stock with OpenSpiel
 default_attacker_policy = "uniform_random"
 
-def get_player_policy(game, player, policy_name):
-    policy_class = policies.get_policy_class(policy_name)
-    policy_args = policies.get_player_policy_args(player, policy_name)
-    return policy_class(game, *policy_args)
-
-def get_player_bot(game, player, policy_name):
-    policy = get_player_policy(game, player, policy_name)
-    bot = PolicyBot(player, np.random, policy)
-    return bot
-
-def play_game(game, bots):
-    # play one game
-    state = game.new_initial_state()
-    history = []
-    sc = 0
-    while not state.is_terminal():
-        sc += 1
-        player = state.current_player()
-        bot = bots[player]
-        action = bot.step(state)
-        player_str = arena.player_to_str(player)
-        action_str = arena.a2s(action)
-        print(f"Player {player_str} sampled action: {action_str}")
-        # convert to int; json.dump() can't dump int64
-        history.append(int(action))
-        state.apply_action(action)
-    returns = state.returns()
-    print("Returns:", " ".join(map(str, returns)))
-    return returns, history, state.turns_played(), \
-            state.turns_exhausted(), state.winner()
-
 def main(iterations=default_iterations,
         defender_policy=default_defender_policy,
         attacker_policy=default_attacker_policy,
-        dump_dir=None):
+        dump_dir=None, seed=None):
     if not iterations:
         iterations = default_iterations
-    game = FakeGame()
-    print("GAME:", game)
-    def_bot = get_player_bot(game, arena.Players.DEFENDER, defender_policy)
-    atk_bot = get_player_bot(game, arena.Players.ATTACKER, attacker_policy)
-    bots = {
-        arena.Players.DEFENDER: def_bot,
-        arena.Players.ATTACKER: atk_bot,
-    }
+    records = headless.play_games(iterations,
+            attacker_policy=attacker_policy,
+            defender_policy=defender_policy, seed=seed,
+            verbose=arena.DEBUG)
     histories = collections.defaultdict(int)
     overall_returns = {
         arena.Players.DEFENDER: 0,
@@ -95,9 +59,10 @@ def main(iterations=default_iterations,
     num_games_maxed = 0
     game_num = 0
     try:
-        for game_num in range(iterations):
-            returns, history, turns_played, turns_exhausted, winner \
-                    = play_game(game, bots)
+        for game_num, record in enumerate(records):
+            returns, winner, turns_played, turns_exhausted, history \
+                    = record
+            print("Returns:", " ".join(map(str, returns)))
             histories[" ".join(str(int(x)) for x in history)] += 1
             for i, v in enumerate(returns):
                 overall_returns[i] += v
@@ -116,12 +81,12 @@ def main(iterations=default_iterations,
                     "returns": returns,
                     "history": history,
                     "history_str": history_strings,
-                    "max_turns": game.get_parameters().get(
-                        "num_turns", game_max_turns),
+                    "max_turns": game_max_turns,
                     "turns_played": turns_played,
                     "turns_exhausted": turns_exhausted,
-                    "winner": int(winner) if winner else None,
-                    "winner_str": arena.p2s(winner) if winner else None,
+                    "winner": winner,
+                    "winner_str": arena.p2s(winner) \
+                            if winner is not None else None,
                 }
                 df = os.path.join(dump_dir, f"%0{iter_fmt}d.json" % game_num)
                 with open(df, 'w') as dfh:
@@ -163,6 +128,8 @@ if __name__ == "__main__":
             help=f"Directory in which to dump game states over iterations of the game. ({default_dump_dir})")
     parser.add_argument("-n", "--no_dump", action="store_true",
             help="Disable logging of game playthroughs")
+    parser.add_argument("--seed", type=int,
+            help="Seed for the random number generators")
     args = parser.parse_args()
     if args.list_policies:
         for policy_name in policies.available_policies():
@@ -175,4 +142,5 @@ if __name__ == "__main__":
         defender_policy=args.defender_policy,
         attacker_policy=args.attacker_policy,
         dump_dir = args.dump_dir,
+        seed=args.seed,
     )
@@ -228,20 +228,20 @@ class BasePlayerState:
         assert self.policy, "no policy present"
         action_probs = self.policy.action_probabilities(
                 game_state, int(self.player_id))
-        print("AP ACTIONS:", self.player_id, action_probs)
+        debug("AP ACTIONS:", self.player_id, action_probs)
         action_list = list(action_probs.keys())
         if not action_list:
-            print("no action probabilities returned from policy")
+            debug("no action probabilities returned from policy")
             #return pyspiel.INVALID_ACTION
             return None
         psum = sum(action_probs.values())
         if psum:
             if psum != 1.0:
-                print(f"scaling probability sums ({psum})")
+                debug(f"scaling probability sums ({psum})")
                 for action in action_probs:
                     action_probs[action] *= 1 / psum
         else:
-            print("no probability sum")
+            debug("no probability sum")
             scale = 1 / len(action_list)
             action_probs = { x: scale for x in action_list }
         action = np.random.choice(action_list, p=list(action_probs.values()))
@@ -0,0 +1,117 @@
+"""
+Headless simulation of the v5 game: policy versus policy games played
+directly on internal.game.GameState, without OpenSpiel.
+
+The policies are embedded in the game (the attacker_policy and
+defender_policy game parameters) so each player's state picks its own
+next action as its previous one resolves; the driver here only has to
+take the single action that is then legal, or consult the player's
+policy when more than one is (e.g. on a player's first move). Players
+without a policy choose uniformly among their legal actions.
+
+    from internal import headless
+
+    for record in headless.play_games(1000, attacker_policy="uniform_random",
+            defender_policy="simple_random", seed=7):
+        ...
+
+Each game is returned as a compact GameRecord rather than a GameState.
+"""
+
+import random
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    # as part of the package
+    from . import arena_zsum as arena
+    from . import game as game_mod
+except (ModuleNotFoundError, ImportError):
+    # as a sibling of the scripts in this directory
+    import arena_zsum as arena
+    import game as game_mod
+
+
+class GameRecord(NamedTuple):
+    """
+    The outcome of one game. The history is every action taken in
+    order, attacker first, or empty if not kept.
+    """
+    returns: tuple[int, int]
+    winner: int|None
+    turns_played: int
+    turns_exhausted: bool
+    history: tuple[int, ...] = ()
+
+
+def new_game(attacker_policy=None, defender_policy=None,
+        num_turns=game_mod.game_max_turns):
+    """
+    A game whose states carry the named policies (see
+    policies.available_policies()).
+    """
+    params = {"num_turns": num_turns}
+    if attacker_policy:
+        params["attacker_policy"] = attacker_policy
+    if defender_policy:
+        params["defender_policy"] = defender_policy
+    return game_mod.FakeGame(params)
+
+def _next_action(state, player):
+    actions = state.legal_actions(player)
+    if len(actions) == 1:
+        # IN_PROGRESS, or the action picked by an embedded policy
+        return actions[0]
+    if player == arena.Players.ATTACKER:
+        player_state = state.attacker_state
+    else:
+        player_state = state.defender_state
+    if player_state.policy:
+        action = player_state.select_policy_action(state)
+        if action is not None:
+            return action
+    return np.random.choice(actions)
+
+def play_game(game, keep_history=True):
+    """
+    Play one game to the end and return its GameRecord.
+    """
+    state = game.new_initial_state()
+    history = []
+    while not state.is_terminal():
+        player = state.current_player()
+        action = int(_next_action(state, player))
+        if keep_history:
+            history.append(action)
+        state.apply_action(action)
+    winner = state.winner()
+    return GameRecord(tuple(state.returns()),
+            int(winner) if winner is not None else None,
+            state.turns_played(), state.turns_exhausted(), tuple(history))
+
+def play_games(num_games, attacker_policy=None, defender_policy=None,
+        num_turns=game_mod.game_max_turns, seed=None, keep_history=True,
+        verbose=False):
+    """
+    Generate a GameRecord for each of `num_games` games. The game and
+    action pickers draw from both the stdlib and the numpy global
+    random generators, both of which are seeded with `seed` if given.
+    The per move debug output of the game is silenced unless `verbose`.
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    game = new_game(attacker_policy=attacker_policy,
+            defender_policy=defender_policy, num_turns=num_turns)
+    # the policies package loads its own copy of arena_zsum
+    arenas = {arena, game_mod.policies.arena}
+    debug = {x: x.DEBUG for x in arenas}
+    for x in arenas:
+        x.DEBUG = verbose
+    try:
+        for _ in range(num_games):
+            yield play_game(game, keep_history=keep_history)
+    finally:
+        for x in arenas:
+            x.DEBUG = debug[x]
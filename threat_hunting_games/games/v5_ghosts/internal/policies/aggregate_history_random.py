@@ -1,7 +1,7 @@
 import numpy as np
 
-import pyspiel
 from .pyspiel_policy import Policy
+from .arena_zsum import INVALID_ACTION
 
 from .util import normalize_action_probs
 
@@ -42,7 +42,7 @@ class ActionPicker:
         else:
             probs = self._running_probs
         if not probs:
-            return pyspiel.ILLEGAL_ACTION
+            return INVALID_ACTION
         probs = normalize_action_probs(probs)
         selected_action = \
                 np.random.choice(list(probs.keys()), p=list(probs.values()))
@@ -114,7 +114,7 @@ class AggregateHistoryPolicy(Policy):
             state.legal_actions()
             if player_id is None else state.legal_actions(player_id))
         if not legal_actions:
-            return { pyspiel.ILLEGAL_ACTION, 1.0 }
+            return { INVALID_ACTION: 1.0 }
         if len(legal_actions) == 1:
             return { legal_actions[0]: 1.0 }
         if player_id not in self._action_pickers:
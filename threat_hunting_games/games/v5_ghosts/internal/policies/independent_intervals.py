@@ -1,7 +1,7 @@
 import random
 
-import pyspiel
 from .pyspiel_policy import Policy
+from .arena_zsum import INVALID_ACTION, debug
 
 class IntervalActions:
 
@@ -122,14 +122,14 @@ class IndependentIntervalsPolicy(Policy):
         legal_actions = state.legal_actions() if player_id is None \
                 else state.legal_actions(player_id)
         if not legal_actions:
-            return { pyspiel.ILLEGAL_ACTION: 1.0 }
+            return { INVALID_ACTION: 1.0 }
         intervals = self._intervals.get(player_id)
         if intervals:
             action = intervals.take_action(legal_actions)
         else:
-            print("intervals using random choice legal actions")
+            debug("intervals using random choice legal actions")
             action = random.choice(legal_actions)
         if not action:
-            return { pyspiel.ILLEGAL_ACTION: 1.0 }
+            return { INVALID_ACTION: 1.0 }
         else:
             return { action: 1.0 }
@@ -1,7 +1,7 @@
 import math
 
-import pyspiel
 from .pyspiel_policy import Policy
+from .arena_zsum import INVALID_ACTION, debug
 
 from .util import normalize_action_probs
 
@@ -47,12 +47,12 @@ class SimpleRandomPolicy(Policy):
         for player_id in self._player_action_probs:
             psum = sum(self._player_action_probs[player_id].values())
             if not math.isclose(psum, 1.0):
-                print("scaling probs")
+                debug("scaling probs")
                 self._player_action_probs[player_id] = \
                     normalize_action_probs(
                             self._player_action_probs[player_id])
             else:
-                print("probs set to uniform random")
+                debug("probs set to uniform random")
                 pprobs = {}
                 for action in self._player_action_probs[player_id]:
                     pprobs[action] = 1 / psum
@@ -66,20 +66,20 @@ class SimpleRandomPolicy(Policy):
         legal_actions = set(state.legal_actions() if player_id is None \
                 else state.legal_actions(player_id))
         if not legal_actions:
-            return { pyspiel.ILLEGAL_ACTION: 1.0 }
+            return { INVALID_ACTION: 1.0 }
         if len(legal_actions) == 1:
             return { legal_actions.pop(): 1.0 }
         probs = dict(self._player_action_probs.get(player_id, {}))
         if probs:
             # total sum already == 1.0
             if legal_actions.difference(probs.keys()):
-                print("calculating subset of action probs for", player_id)
+                debug("calculating subset of action probs for", player_id)
                 new_probs = {}
                 for action in legal_actions:
                     new_probs[action] = probs[action]
                 probs = normalize_action_probs(probs)
         else:
-            print("probs set to uniform random")
+            debug("probs set to uniform random")
             scale = 1 / len(legal_actions)
             probs = { x: scale for x in legal_actions }
         return probs
@@ -6,7 +6,9 @@
 from typing import NamedTuple, Mapping, Any, List
 from enum import IntEnum, auto
 from frozendict import frozendict
+from functools import lru_cache
 import random
+import numpy as np
 
 import pyspiel
 
@@ -571,8 +573,12 @@ class TimeWait(NamedTuple):
     min: int
     max: int
 
-    def rand_turns(self) -> int:
-        return random.randint(self.min, self.max)
+    def rand_turns(self, rng=None) -> int:
+        # draws from the module level random unless given a
+        # numpy.random.Generator
+        if rng is None:
+            return random.randint(self.min, self.max)
+        return int(rng.integers(self.min, self.max + 1))
 
 # min/max wait actions preceeding the given action
 Time_Waits = {
@@ -794,6 +800,10 @@ class Arena:
     be passed along to any other module that relies on the arena
     functionality but might be a separate instance. Or the arena
     instance itself can be passed around.
+
+    An Arena is not modified after it is constructed, so copies of game
+    states share their arena and pickles refer to it by its parameters
+    (see get_arena() below).
     """
 
     def __init__(self,
@@ -874,6 +884,50 @@ class Arena:
             self._skirmish_wins[action] = frozendict(opposing_actions)
         self._skirmish_wins = frozendict(self._skirmish_wins)
 
+        # Dense tables indexed by action id, compiled from the above
+        # (and use_chance_fail) so that the lookups made for every
+        # detection attempt are a single index. The nested tuples are
+        # for scalar lookups, which are faster than indexing ndarrays.
+        num_actions = len(Actions)
+        self._noop_mask = np.zeros(num_actions, dtype=bool)
+        self._noop_mask[list(NoOp_Actions)] = True
+        self._general_fail_pcts = np.array(
+                [self.get_general_pct_fail(x) for x in Actions], dtype=float)
+        self._skirmish_fail_pcts = np.ones((num_actions, num_actions))
+        for action1 in Actions:
+            for action2 in Actions:
+                if action1 in NoOp_Actions or action2 in NoOp_Actions:
+                    # never succeeds
+                    continue
+                if action1 in self._skirmish_fails:
+                    pct_fail = self.get_skirmish_pct_fail(action1, action2)
+                else:
+                    pct_fail = 1 - self.get_skirmish_pct_win(action1, action2)
+                self._skirmish_fail_pcts[action1, action2] = pct_fail
+        for table in (self._noop_mask, self._general_fail_pcts,
+                self._skirmish_fail_pcts):
+            table.flags.writeable = False
+        self._noop_table = tuple(self._noop_mask.tolist())
+        self._general_fail_table = tuple(self._general_fail_pcts.tolist())
+        self._skirmish_fail_table = tuple(
+                tuple(x) for x in self._skirmish_fail_pcts.tolist())
+
+    @property
+    def params(self):
+        # constructor arguments, in order
+        return (self._advancement_rewards_name, self._detection_costs_name,
+                self._use_waits, self._use_timewaits,
+                self._use_chance_fail, self._use_defender_clawback)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (get_arena, self.params)
+
     @property
     def use_waits(self):
         return self._use_waits
@@ -922,6 +976,17 @@ class Arena:
     def noop_actions(self):
         return self._noop_actions
 
+    @property
+    def general_fail_pcts(self):
+        # read-only array of general failure percentages by action
+        return self._general_fail_pcts
+
+    @property
+    def skirmish_fail_pcts(self):
+        # read-only array of failure percentages of action (row) vs
+        # action (col), 1.0 if either is a no-op action
+        return self._skirmish_fail_pcts
+
     @property
     def def_actions_by_pos(self):
         return self._def_actions_by_pos
@@ -981,17 +1046,17 @@ class Arena:
         else:
             return round(pct_win)
     
-    def action_faulty(self, action):
+    def action_faulty(self, action, rng=None):
         # I suspect that using chance nodes in open_spiel might be a viable
         # way for dealing with an action failing to execute...
     
-        if action in NoOp_Actions:
+        if self._noop_table[action]:
             # don't want to advance on a no-op action
             return None
         completed = True
-        pct_fail = self.get_general_pct_fail(action)
+        pct_fail = self._general_fail_table[action]
         if pct_fail:
-            chance = random.random()
+            chance = random.random() if rng is None else rng.random()
             completed = chance > pct_fail
             if not completed:
                 action = self.action_to_str(action)
@@ -999,21 +1064,54 @@ class Arena:
         #print("action_completed() end\n")
         return not completed
 
-    def action_succeeds(self, action1, action2):
+    def action_success_pct(self, action1, action2):
+        # probability that action_succeeds() returns True
+        return 1.0 - self._skirmish_fail_table[action1][action2]
+
+    def action_succeeds(self, action1, action2, rng=None):
         # should only be called if the action was not faulty (see above)
-        if action1 in NoOp_Actions or action2 in NoOp_Actions:
+        if self._noop_table[action1] or self._noop_table[action2]:
             # don't want to advance on a no-op action
             return None
         # skirmish fail chance
         successful = True
-        if action1 in self._skirmish_fails:
-            pct_fail = self.get_skirmish_pct_fail(action1, action2)
-        else:
-            pct_fail = 1 - self.get_skirmish_pct_win(action1, action2)
+        pct_fail = self._skirmish_fail_table[action1][action2]
         if pct_fail:
-            chance = random.random()
+            chance = random.random() if rng is None else rng.random()
             successful = chance > pct_fail
             if not successful and pct_fail < 1:
                 # don't report skirmishes that are 100% doomed
                 debug(f"action SKIRMISH fail! {action_to_str(action1)} vs {action_to_str(action2)}: {chance:.2f} > {pct_fail:.2f} : {successful}")
         return successful
+
+    def action_succeeds_many(self, action1, actions2, rng=None):
+        """
+        Vectorized action_succeeds() of `action1` against each of
+        `actions2`, e.g. a defend action against an attack history,
+        with one draw per action from `rng` (np.random if not given).
+        No-op actions never succeed. Returns an array of bools.
+        """
+        if rng is None:
+            rng = np.random
+        actions2 = np.asarray(actions2, dtype=int)
+        pct_fails = self._skirmish_fail_pcts[int(action1), actions2]
+        return rng.random(len(actions2)) > pct_fails
+
+
+def get_arena(advancement_rewards=Default_Advancement_Rewards,
+        detection_costs=Default_Detection_Costs,
+        use_waits=USE_WAITS,
+        use_timewaits=USE_TIMEWAITS,
+        use_chance_fail=USE_CHANCE_FAIL,
+        use_defender_clawback=USE_DEFENDER_CLAWBACK):
+    """
+    Return the shared Arena for the given parameters, constructing it
+    the first time around.
+    """
+    return _get_arena(advancement_rewards, detection_costs,
+            bool(use_waits), bool(use_timewaits), bool(use_chance_fail),
+            bool(use_defender_clawback))
+
+@lru_cache(maxsize=None)
+def _get_arena(*params):
+    return Arena(*params)
@@ -0,0 +1,374 @@
+"""
+Batch simulation of chain_game_v6_seq using NumPy arrays.
+
+Rather than stepping a single GameState through pyspiel one move at a
+time, BatchSimulator advances many games in lockstep: every game moves
+on the same turn (attacker on even turns, defender on odd turns) so the
+whole batch can be updated with array operations. Finished games are
+masked out until every game in the batch has terminated.
+
+The rules mirror GameState._apply_action() in v6_simple_base.py,
+including some of its less obvious behavior:
+
+  * an attack action that has just been selected (but is still in
+    progress) is part of the attacker's "completed" history for the
+    defender's immediately following detection sweep;
+
+  * if the defender's very first action is delayed by a timewait, it
+    is expended before it completes and so never detects anything;
+
+  * WAIT (with use_waits) is only offered to the defender on its first
+    move, after which the module level Defend_Actions are used.
+
+A completed attacker WAIT is treated as a noop worth no reward;
+GameState currently trips an assertion in Utilities.attack_reward()
+in that case.
+
+Only policies that do not carry state from one move to the next can be
+batched; see stationary_policy() for the list. Outcomes are identical
+in distribution to play_game() with the same bots but, since the random
+draws happen in a different order, not game for game unless the
+policies and the game parameters are deterministic.
+"""
+
+from typing import NamedTuple
+from dataclasses import dataclass
+import numpy as np
+
+try:
+    # for use within the package, e.g. from tests
+    from . import arena as arena_mod
+    from . import policies
+except ImportError:
+    # for scripts living in this directory
+    import arena as arena_mod
+    import policies
+
+# policies/action pickers that select actions from a fixed distribution
+# over the legal actions; anything else tracks history and cannot be
+# batched
+Stationary_Policies = {
+    "uniform_random": (None,),
+    "first_action": (None,),
+    "last_action": (None,),
+    "simple_random": ("fixed_prob", "cost_scale", "inverse_cost_scale"),
+}
+
+
+class StationaryPolicy(NamedTuple):
+    """
+    Action weights indexed by action id. If `greedy` is set the legal
+    action with the highest weight is always taken, otherwise actions
+    are sampled in proportion to their weights among the legal actions
+    (uniformly if all legal actions have zero weight).
+    """
+    weights: np.ndarray
+    greedy: bool = False
+
+
+def supported(policy_name, action_picker=None):
+    if policy_name not in Stationary_Policies:
+        return False
+    pickers = Stationary_Policies[policy_name]
+    if None in pickers:
+        return True
+    if not action_picker:
+        policy_class = policies.get_policy_class(policy_name)
+        action_picker = policy_class.default_action_picker()
+    return action_picker in pickers
+
+def stationary_policy(policy_name, action_picker, arena, player):
+    """
+    Return the StationaryPolicy equivalent of the given policy and
+    action picker for `player`, or None if it can't be batched.
+    """
+    if not supported(policy_name, action_picker):
+        return None
+    action_ids = np.arange(len(arena.actions), dtype=float)
+    match policy_name:
+        case "uniform_random":
+            return StationaryPolicy(np.ones(len(arena.actions)))
+        case "first_action":
+            return StationaryPolicy(-action_ids, greedy=True)
+        case "last_action":
+            return StationaryPolicy(action_ids, greedy=True)
+    policy_class = policies.get_policy_class(policy_name)
+    if not action_picker:
+        action_picker = policy_class.default_action_picker()
+    ap_class = policy_class.get_action_picker_class(action_picker)
+    # constructed the same way SimpleRandomPolicy does it, so
+    # fixed_prob picks up its random weights here just as a bot would
+    all_actions = arena.player_actions[player]
+    picker = ap_class(all_actions, arena=arena,
+            action_chain=arena.player_actions_by_pos[player])
+    weights = np.zeros(len(arena.actions))
+    for action, prob in picker._probs.items():
+        weights[int(action)] = prob
+    return StationaryPolicy(weights)
+
+
+@dataclass
+class BatchResults:
+    """
+    Per-game results, one row per game. A victor of -1 means the game
+    was inconclusive. Histories are padded with -1 beyond turns_played.
+    """
+    returns: np.ndarray
+    victors: np.ndarray
+    turns_played: np.ndarray
+    histories: np.ndarray
+
+    def __len__(self):
+        return len(self.victors)
+
+    def games(self):
+        """
+        Yield (turns_played, returns, victor, history) for each game,
+        the same as bot_playoffs.play_game() returns them.
+        """
+        for i in range(len(self)):
+            turns_played = int(self.turns_played[i])
+            victor = int(self.victors[i])
+            yield (turns_played,
+                    [int(x) for x in self.returns[i]],
+                    victor if victor >= 0 else None,
+                    [int(x) for x in self.histories[i, :turns_played]])
+
+    @classmethod
+    def concatenate(cls, results):
+        results = list(results)
+        width = max(x.histories.shape[1] for x in results)
+        histories = []
+        for res in results:
+            pad = width - res.histories.shape[1]
+            histories.append(np.pad(res.histories, ((0, 0), (0, pad)),
+                constant_values=-1))
+        return cls(
+            returns=np.concatenate([x.returns for x in results]),
+            victors=np.concatenate([x.victors for x in results]),
+            turns_played=np.concatenate([x.turns_played for x in results]),
+            histories=np.concatenate(histories))
+
+
+class BatchSimulator:
+    """
+    Plays batches of v6 games between two stationary policies.
+    """
+
+    def __init__(self, arena, num_turns, attacker_policy, defender_policy,
+            rng=None):
+        assert not num_turns % 2, "game length must have even number of turns"
+        self._arena = arena
+        self._num_turns = num_turns
+        self._policies = (attacker_policy, defender_policy)
+        self._rng = rng if rng is not None else np.random.default_rng()
+
+        actions = arena.actions
+        num_actions = len(actions)
+        self._ip = int(actions.IN_PROGRESS)
+        self._num_stages = len(arena.atk_actions_by_pos)
+        utilities = arena.utilities
+
+        self._costs = np.zeros(num_actions, dtype=np.int32)
+        self._atk_damage = np.zeros(num_actions, dtype=np.int32)
+        self._def_damage = np.zeros(num_actions, dtype=np.int32)
+        self._tw_min = np.zeros(num_actions, dtype=np.int32)
+        self._tw_max = np.zeros(num_actions, dtype=np.int32)
+        self._noop = np.zeros(num_actions, dtype=bool)
+        for action in actions:
+            self._costs[action] = abs(utilities.action_cost(action))
+            if action in arena_mod.Attack_Actions:
+                self._atk_damage[action] = \
+                        abs(utilities.attack_damage(action))
+            if action in arena_mod.Defend_Actions \
+                    and arena.use_defender_clawback:
+                self._def_damage[action] = \
+                        abs(utilities.defend_damage(action))
+            timewait = arena.get_timewait(action)
+            self._tw_min[action] = timewait.min
+            self._tw_max[action] = timewait.max
+            self._noop[action] = action in arena.noop_actions
+
+        # log of the probability that a defend action (row) fails to
+        # detect a completed attack action (col); clipped so that
+        # certain detection still comes out as exactly 1.0 after
+        # exponentiating
+        self._log_fails = np.log(
+                np.clip(arena.skirmish_fail_pcts, 1e-300, None))
+
+        def _mask(legal):
+            mask = np.zeros(num_actions, dtype=bool)
+            mask[[int(x) for x in legal]] = True
+            return mask
+        self._ip_mask = _mask([actions.IN_PROGRESS])
+        self._atk_masks = np.stack(
+                [_mask(x) for x in arena.atk_actions_by_pos])
+        self._def_first_mask = _mask(arena.defend_actions)
+        self._def_mask = _mask(arena.player_actions[arena.players.DEFENDER])
+
+    @classmethod
+    def from_game(cls, game, attacker_policy, attacker_action_picker,
+            defender_policy, defender_action_picker, rng=None):
+        """
+        Construct a simulator for a loaded game, or return None if
+        either of the policies can't be batched.
+        """
+        params = game.get_parameters()
+        arena = arena_mod.Arena(
+                advancement_rewards=params["advancement_rewards"],
+                detection_costs=params["detection_costs"],
+                use_waits=bool(params["use_waits"]),
+                use_timewaits=bool(params["use_timewaits"]),
+                use_chance_fail=bool(params["use_chance_fail"]))
+        atk_policy = stationary_policy(attacker_policy,
+                attacker_action_picker, arena, arena.players.ATTACKER)
+        def_policy = stationary_policy(defender_policy,
+                defender_action_picker, arena, arena.players.DEFENDER)
+        if atk_policy is None or def_policy is None:
+            return None
+        return cls(arena, params["num_turns"], atk_policy, def_policy,
+                rng=rng)
+
+    @property
+    def arena(self):
+        return self._arena
+
+    def _choose(self, legal, policy):
+        weights = np.where(legal, policy.weights, 0.0)
+        if policy.greedy:
+            return np.where(legal, policy.weights, -np.inf).argmax(axis=1)
+        totals = weights.sum(axis=1)
+        unweighted = totals <= 0
+        if unweighted.any():
+            weights[unweighted] = legal[unweighted]
+            totals[unweighted] = legal[unweighted].sum(axis=1)
+        cumulative = np.cumsum(weights, axis=1)
+        draws = self._rng.random(len(legal)) * totals
+        return (cumulative > draws[:, None]).argmax(axis=1)
+
+    def _timewaits(self, actions):
+        return self._rng.integers(self._tw_min[actions],
+                self._tw_max[actions] + 1)
+
+    def play(self, num_games, batch_size=None):
+        """
+        Play `num_games` games, at most `batch_size` at a time, and
+        return BatchResults.
+        """
+        if not batch_size or batch_size >= num_games:
+            return self._play_batch(num_games)
+        results = []
+        remaining = num_games
+        while remaining:
+            cnt = min(batch_size, remaining)
+            results.append(self._play_batch(cnt))
+            remaining -= cnt
+        return BatchResults.concatenate(results)
+
+    def _play_batch(self, num_games):
+        num_actions = len(self._arena.actions)
+        ip = self._ip
+        active = np.ones(num_games, dtype=bool)
+        returns = np.zeros((num_games, 2), dtype=np.int32)
+        victors = np.full(num_games, -1, dtype=np.int8)
+        turns_played = np.zeros(num_games, dtype=np.int32)
+        histories = np.full((num_games, self._num_turns), -1, dtype=np.int8)
+
+        atk_pos = np.zeros(num_games, dtype=np.int32)
+        # current (most recent non IN_PROGRESS) action of each player
+        atk_cur = np.full(num_games, -1, dtype=np.int32)
+        atk_remaining = np.zeros(num_games, dtype=np.int32)
+        atk_expended = np.zeros(num_games, dtype=bool)
+        atk_just_selected = np.zeros(num_games, dtype=bool)
+        # counts of attack actions completed prior to the current one
+        atk_done = np.zeros((num_games, num_actions), dtype=np.int32)
+        def_cur = np.full(num_games, -1, dtype=np.int32)
+        def_remaining = np.zeros(num_games, dtype=np.int32)
+        def_expended = np.zeros(num_games, dtype=bool)
+        def_any_completed = np.zeros(num_games, dtype=bool)
+
+        for turn in range(self._num_turns):
+            idx = np.flatnonzero(active)
+            if not len(idx):
+                break
+            if not turn % 2:
+                # attacker
+                in_progress = atk_remaining[idx] > 0
+                legal = np.where(in_progress[:, None], self._ip_mask,
+                        self._atk_masks[np.minimum(atk_pos[idx],
+                            self._num_stages - 1)])
+                actions = self._choose(legal, self._policies[0])
+                histories[idx, turn] = actions
+                returns[idx, 0] -= self._costs[actions]
+                is_ip = actions == ip
+                atk_remaining[idx[is_ip]] -= 1
+                atk_just_selected[idx] = ~is_ip
+                sel = idx[~is_ip]
+                prev = atk_cur[sel]
+                has_prev = prev >= 0
+                atk_done[sel[has_prev], prev[has_prev]] += 1
+                atk_cur[sel] = actions[~is_ip]
+                atk_remaining[sel] = self._timewaits(actions[~is_ip])
+                atk_expended[sel] = False
+                continue
+
+            # defender
+            in_progress = def_remaining[idx] > 0
+            legal = np.where(in_progress[:, None], self._ip_mask,
+                    np.where((def_cur[idx] < 0)[:, None],
+                        self._def_first_mask, self._def_mask))
+            actions = self._choose(legal, self._policies[1])
+            histories[idx, turn] = actions
+            returns[idx, 1] -= self._costs[actions]
+            is_ip = actions == ip
+            def_remaining[idx[is_ip]] -= 1
+            sel = idx[~is_ip]
+            def_cur[sel] = actions[~is_ip]
+            def_remaining[sel] = self._timewaits(actions[~is_ip])
+            def_expended[sel] = False
+
+            completed = def_remaining[idx] == 0
+            primed = completed & ~def_expended[idx]
+            # an in-progress first action is what GameState considers
+            # the defender's current state, and it gets expended
+            premature = ~completed & ~def_any_completed[idx]
+            def_expended[idx[completed | premature]] = True
+            def_any_completed[idx[completed]] = True
+
+            # detection sweep over the attacker's completed history
+            sweep = atk_done[idx]
+            cur = atk_cur[idx]
+            sweep_cur = (cur >= 0) \
+                    & ((atk_remaining[idx] == 0) | atk_just_selected[idx])
+            rows = np.flatnonzero(sweep_cur)
+            sweep[rows, cur[rows]] += 1
+            defend = np.maximum(def_cur[idx], 0)
+            log_fail = (sweep * self._log_fails[defend]).sum(axis=1)
+            p_detect = 1 - np.exp(log_fail)
+            detected = primed & (self._rng.random(len(idx)) < p_detect)
+            if self._def_damage.any():
+                damage = np.where(detected, self._def_damage[defend], 0)
+                returns[idx, 0] -= damage
+                returns[idx, 1] += damage
+
+            # undetected completed attack action is rewarded
+            rewarded = ~detected & (cur >= 0) \
+                    & (atk_remaining[idx] == 0) & ~atk_expended[idx]
+            damage = np.where(rewarded, self._atk_damage[np.maximum(cur, 0)], 0)
+            returns[idx, 0] += damage
+            returns[idx, 1] -= damage
+            advanced = rewarded & ~self._noop[np.maximum(cur, 0)]
+            atk_pos[idx[advanced]] += 1
+            atk_expended[idx[rewarded]] = True
+
+            won = ~detected & (atk_pos[idx] == self._num_stages)
+            victors[idx[detected]] = int(self._arena.players.DEFENDER)
+            victors[idx[won]] = int(self._arena.players.ATTACKER)
+            over = detected | won
+            if turn + 1 >= self._num_turns:
+                over[:] = True
+            turns_played[idx[over]] = turn + 1
+            active[idx[over]] = False
+
+        return BatchResults(returns=returns, victors=victors,
+                turns_played=turns_played, histories=histories)
@@ -0,0 +1,190 @@
+#!/bin/env python3
+
+# Micro-benchmarks for the v6 game engine.
+
+import sys, time, random
+import argparse
+import tracemalloc
+from dataclasses import dataclass
+
+import pyspiel
+
+from threat_hunting_games.games.v6_simple_base import v6_simple_base
+from threat_hunting_games.games.v6_simple_base.v6_simple_base \
+        import arena_mod, AttackerState, DefenderState
+
+
+@dataclass
+class Defaults:
+    benchmarks: tuple = ("history", "memory", "clone")
+    turn_counts: tuple = (50, 100, 250, 500, 1000, 2000)
+    repeats: int = 20
+    num_games: int = 2000
+    seed: int = 0
+
+DEFAULTS = Defaults()
+
+
+def bench_history(num_turns, repeats=DEFAULTS.repeats):
+    """
+    Per-move cost of player state bookkeeping over a game of
+    `num_turns` turns: recording the move (including progress turns)
+    plus the history lookups GameState._apply_action() makes on every
+    defender move. Actual games end once the attacker completes the
+    attack sequence or is detected, so players are driven directly
+    here, always with the first action of the initial attack stage, in
+    order to get arbitrarily long histories. The sweep itself is left
+    out: it visits each completed attack action, which in a real game
+    is at most one per attack stage. Returns microseconds per move.
+    """
+    game_arena = arena_mod.Arena(use_timewaits=True)
+    ip = game_arena.actions.IN_PROGRESS
+    atk_action = game_arena.atk_actions_by_pos[0][0]
+    def_action = game_arena.defend_actions[0]
+    elapsed = 0
+    for _ in range(repeats):
+        attacker = AttackerState(arena=game_arena)
+        defender = DefenderState(arena=game_arena)
+        start = time.perf_counter()
+        for _ in range(num_turns // 2):
+            for player, action in ((attacker, atk_action),
+                    (defender, def_action)):
+                player.append_util_histories()
+                last = player.last_asserted_state
+                if last and last.in_progress:
+                    action = ip
+                if player is attacker:
+                    player.advance(action, None)
+                else:
+                    player.detect(action, None)
+            # lookups made around the defender detection sweep
+            defender.state.primed
+            next(attacker.completed_history, None)
+            attacker.state.primed
+        elapsed += time.perf_counter() - start
+    return 1e6 * elapsed / (repeats * num_turns)
+
+def play_random_game(game):
+    # uniform random actions for both players
+    state = game.new_initial_state()
+    while not state.is_terminal():
+        state.apply_action(random.choice(state.legal_actions()))
+    return state
+
+def bench_memory(num_turns, num_games=DEFAULTS.num_games):
+    """
+    Memory allocated per game (with timewaits and chance failures)
+    according to tracemalloc, both retained by a finished GameState and
+    at peak while playing, when holding on to `num_games` finished
+    games. Returns (retained, peak) bytes per game.
+    """
+    game = pyspiel.load_game(v6_simple_base.game_name, {
+        "num_turns": num_turns,
+        "use_timewaits": 1,
+        "use_chance_fail": 1,
+    })
+    # warm up caches, enum lookups, etc
+    play_random_game(game)
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        states = [play_random_game(game) for _ in range(num_games)]
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(states) == num_games
+    return (current - start) / num_games, (peak - start) / num_games
+
+def mid_game_states(game, num_states, max_moves=10):
+    """
+    Return `num_states` non-terminal states after between 2 and
+    `max_moves` uniform random moves.
+    """
+    states = []
+    while len(states) < num_states:
+        state = game.new_initial_state()
+        for _ in range(random.randint(2, max_moves)):
+            state.apply_action(random.choice(state.legal_actions()))
+            if state.is_terminal():
+                break
+        if not state.is_terminal():
+            states.append(state)
+    return states
+
+def bench_clone(num_turns, num_states=DEFAULTS.num_games):
+    """
+    Throughput of clone(), serialize() and deserialize_state() on mid
+    game states (with timewaits and chance failures). Returns
+    (clones/sec, serializations/sec, deserializations/sec, mean
+    serialized size in bytes).
+    """
+    game = pyspiel.load_game(v6_simple_base.game_name, {
+        "num_turns": num_turns,
+        "use_timewaits": 1,
+        "use_chance_fail": 1,
+    })
+    states = mid_game_states(game, num_states)
+    start = time.perf_counter()
+    for state in states:
+        state.clone()
+    clone_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    serialized = [state.serialize() for state in states]
+    ser_secs = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in serialized:
+        game.deserialize_state(data)
+    deser_secs = time.perf_counter() - start
+    size = sum(len(x) for x in serialized) / num_states
+    return (num_states / clone_secs, num_states / ser_secs,
+            num_states / deser_secs, size)
+
+def main(benchmarks=DEFAULTS.benchmarks, turn_counts=DEFAULTS.turn_counts,
+        repeats=DEFAULTS.repeats, num_games=DEFAULTS.num_games,
+        seed=DEFAULTS.seed):
+    random.seed(seed)
+    if "history" in benchmarks:
+        print("player state history bookkeeping:")
+        for num_turns in turn_counts:
+            usecs = bench_history(num_turns, repeats=repeats)
+            print(f"  {num_turns:>6} turns: {usecs:8.2f} usec/move")
+    if "memory" in benchmarks:
+        print(f"memory allocated per game ({num_games} games):")
+        for num_turns in turn_counts:
+            retained, peak = bench_memory(num_turns, num_games=num_games)
+            print(f"  {num_turns:>6} turns: {retained:9.0f} bytes retained, {peak:9.0f} bytes peak")
+    if "clone" in benchmarks:
+        print(f"mid game state copies ({num_games} states):")
+        for num_turns in turn_counts:
+            clones, sers, desers, size = \
+                    bench_clone(num_turns, num_states=num_games)
+            print(f"  {num_turns:>6} turns: {clones:8.0f} clones/sec, {sers:8.0f} serialize/sec, {desers:8.0f} deserialize/sec, {size:6.0f} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="v6 benchmarks",
+        description="Micro-benchmarks for the "
+                   f"{v6_simple_base.game_name} game engine.")
+    parser.add_argument("benchmarks", nargs="*",
+            default=DEFAULTS.benchmarks,
+            help=f"Benchmarks to run: {', '.join(DEFAULTS.benchmarks)} (all)")
+    parser.add_argument("-t", "--turns", type=int, nargs="+",
+            default=DEFAULTS.turn_counts,
+            help=f"Game lengths (number of turns) to measure. ({' '.join(str(x) for x in DEFAULTS.turn_counts)})")
+    parser.add_argument("-r", "--repeats", type=int,
+            default=DEFAULTS.repeats,
+            help=f"Number of times to repeat each measurement. ({DEFAULTS.repeats})")
+    parser.add_argument("-g", "--games", type=int,
+            default=DEFAULTS.num_games,
+            help=f"Number of games (or states) to hold on to when measuring memory or copies. ({DEFAULTS.num_games})")
+    parser.add_argument("--seed", type=int, default=DEFAULTS.seed,
+            help=f"Seed for random actions and timewait draws. ({DEFAULTS.seed})")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in DEFAULTS.benchmarks:
+            print(f"unknown benchmark: {name}")
+            sys.exit(1)
+    main(benchmarks=args.benchmarks, turn_counts=args.turns,
+            repeats=args.repeats, num_games=args.games, seed=args.seed)
@@ -24,20 +24,36 @@ import pyspiel
 class BotAgent(rl_agent.AbstractAgent):
   """Agent class that wraps a bot.
 
-  Note, the environment must include the OpenSpiel state in its observations,
-  which means it must have been created with use_full_state=True.
+  Given the environment (`env`) the bot is handed the environment's live state
+  on every step. Bots must treat it as read-only, which holds for policies
+  that only look at the state (all of the v6 policies). This way the
+  environment does not have to serialize the game and state on every step,
+  nor does the agent have to deserialize them and replay the history.
+
+  Otherwise the environment must include the OpenSpiel state in its
+  observations, which means it must have been created with
+  include_full_state=True.
   """
 
-  def __init__(self, num_actions, bot, name="bot_agent"):
+  def __init__(self, num_actions, bot, name="bot_agent", env=None):
     assert num_actions > 0
     self._bot = bot
     self._num_actions = num_actions
     self._name = name
+    self._env = env
 
   @property
   def name(self):
       return self._name
 
+  @property
+  def env(self):
+    return self._env
+
+  @env.setter
+  def env(self, env):
+    self._env = env
+
   def restart(self):
     self._bot.restart()
 
@@ -46,8 +62,14 @@ class BotAgent(rl_agent.AbstractAgent):
     if time_step.last():
       return
 
-    _, state = pyspiel.deserialize_game_and_state(
-        time_step.observations["serialized_state"])
+    if self._env is not None:
+      state = self._env.get_state
+      assert state.current_player() == \
+          time_step.observations["current_player"], \
+          "time step is not from the current environment state"
+    else:
+      _, state = pyspiel.deserialize_game_and_state(
+          time_step.observations["serialized_state"])
 
     action = self._bot.step(state)
     probs = np.zeros(self._num_actions)
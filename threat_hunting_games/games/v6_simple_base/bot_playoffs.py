@@ -1,12 +1,14 @@
 #!/bin/env python3
 
-import os, sys, json, csv
+import os, sys, json, csv, random, math
 import argparse
-import collections
+import collections, contextlib
 import openpyxl
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from dataclasses import dataclass
+from statistics import NormalDist
+from dataclasses import dataclass, field
 
 import pyspiel
 from open_spiel.python.bots.policy import PolicyBot
@@ -16,6 +18,10 @@ from threat_hunting_games import games
 from arena import debug
 from sheets import Sheet
 from solver import Solver
+from batch_sim import BatchSimulator
+from markov_eval import MarkovEvaluator
+import event_sim, markov_eval
+from results_store import ResultsStore
 
 
 @dataclass
@@ -35,6 +41,16 @@ class Defaults:
 
     solvers: tuple = Solver.solvers
 
+    workers: int = 1
+    chunk_size: int = 0
+
+    backends: tuple = ("scalar", "batch", "event")
+    backend: str = "scalar"
+
+    # adaptive stopping, see play_games()
+    ci_level: float = 0.95
+    min_iterations: int = 30
+
     dump_dir: str = os.path.join(os.path.dirname(
         os.path.abspath(__file__)), "dump_playoffs")
 
@@ -45,9 +61,9 @@ def _relpath(path):
     base_dir = os.path.dirname(os.path.abspath(__file__))
     return os.path.relpath(path, base_dir)
 
-def play_game(game, bots):
-    # play one game
-    state = game.new_initial_state()
+def play_game(game, bots, seed_seq=None):
+    # play one game, with chance draws seeded by seed_seq if given
+    state = game.new_initial_state(seed_seq=seed_seq)
     history = []
     sc = 0
     while not state.is_terminal():
@@ -66,6 +82,336 @@ def play_game(game, bots):
     debug("Returns:", " ".join(map(str, returns)))
     return state.turns_played(), returns, state.victor(), history
 
+@dataclass
+class Tally:
+    """
+    Accumulated results for some number of games played within a single
+    permutation. Tallies from separate chunks of the same permutation
+    (e.g. from different worker processes) can be merged.
+
+    Alongside the sums, the running mean and sum of squared deviations
+    of each player's returns are kept (Welford's method) for the
+    confidence intervals that adaptive stopping goes by.
+
+    An `exact` tally holds the expected outcome of `episodes` games as
+    evaluated by MarkovEvaluator, rather than games actually played, so
+    its counts need not be whole numbers.
+    """
+    episodes: int = 0
+    sum_returns: list = field(default_factory=lambda: [0, 0])
+    mean_returns: list = field(default_factory=lambda: [0.0, 0.0])
+    m2_returns: list = field(default_factory=lambda: [0.0, 0.0])
+    sum_victories: list = field(default_factory=lambda: [0, 0])
+    sum_inconclusive: int = 0
+    histories: dict = field(
+            default_factory=lambda: collections.defaultdict(int))
+    turns_played: dict = field(
+            default_factory=lambda: collections.defaultdict(int))
+    exact: bool = False
+    games: list = field(default_factory=list)
+
+    @classmethod
+    def from_exact(cls, results, episodes):
+        """
+        The expected tally of `episodes` games given the ExactResults of
+        MarkovEvaluator. Histories are only tallied if the evaluator
+        could follow them.
+        """
+        tally = cls(episodes=episodes, exact=True)
+        tally.mean_returns = list(results.mean_returns)
+        tally.m2_returns = [x * episodes for x in results.var_returns]
+        tally.sum_returns = [x * episodes for x in results.mean_returns]
+        tally.sum_victories = [x * episodes for x in results.victory_probs]
+        tally.sum_inconclusive = results.inconclusive_prob * episodes
+        for history, prob in (results.history_probs or {}).items():
+            tally.histories[" ".join(str(x) for x in history)] += \
+                    prob * episodes
+        for turns, prob in results.turns_played_probs.items():
+            tally.turns_played[turns] += prob * episodes
+        return tally
+
+    def add_game(self, turns_played, returns, victor, history,
+            max_turns=None, keep_game=False):
+        self.episodes += 1
+        self.histories[" ".join(str(int(x)) for x in history)] += 1
+        self.turns_played[int(turns_played)] += 1
+        for i, v in enumerate(returns):
+            self.sum_returns[i] += v
+            delta = v - self.mean_returns[i]
+            self.mean_returns[i] += delta / self.episodes
+            self.m2_returns[i] += delta * (v - self.mean_returns[i])
+        victor = int(victor) if victor is not None else victor
+        if victor == int(arena.Players.ATTACKER):
+            self.sum_victories[0] += 1
+        elif victor == int(arena.Players.DEFENDER):
+            self.sum_victories[1] += 1
+        else:
+            self.sum_inconclusive += 1
+        if keep_game:
+            self.games.append({
+                "returns": returns,
+                "victor": victor,
+                "max_turns": max_turns,
+                "turns_played": turns_played,
+                "history": history,
+            })
+
+    def merge(self, other):
+        self.exact = other.exact if not self.episodes \
+                else self.exact and other.exact
+        episodes = self.episodes + other.episodes
+        if episodes:
+            # Chan et al. pairwise update of the running moments
+            for i, mean in enumerate(other.mean_returns):
+                delta = mean - self.mean_returns[i]
+                self.mean_returns[i] += delta * other.episodes / episodes
+                self.m2_returns[i] += other.m2_returns[i] + delta * delta \
+                        * self.episodes * other.episodes / episodes
+        self.episodes = episodes
+        for i, v in enumerate(other.sum_returns):
+            self.sum_returns[i] += v
+        for i, v in enumerate(other.sum_victories):
+            self.sum_victories[i] += v
+        self.sum_inconclusive += other.sum_inconclusive
+        for history, cnt in other.histories.items():
+            self.histories[history] += cnt
+        for turns, cnt in other.turns_played.items():
+            self.turns_played[turns] += cnt
+        self.games.extend(other.games)
+        return self
+
+    def ci_half_widths(self, ci_level=DEFAULTS.ci_level):
+        """
+        Half-width of the `ci_level` confidence interval of the mean
+        return of each player (normal approximation), None for a player
+        until there are two games to go by (or for tallies stored without
+        the running moments). The intervals of an exact tally are nil.
+        """
+        if self.exact:
+            return [0.0 for _ in self.m2_returns]
+        if self.episodes < 2:
+            return [None for _ in self.m2_returns]
+        z = NormalDist().inv_cdf((1 + ci_level) / 2)
+        return [z * math.sqrt(m2 / (self.episodes - 1) / self.episodes)
+                if m2 is not None else None for m2 in self.m2_returns]
+
+    def converged(self, ci_target, ci_level=DEFAULTS.ci_level,
+            min_iterations=DEFAULTS.min_iterations):
+        """
+        Whether the confidence intervals of both players' mean returns
+        are within `ci_target` of the mean, after at least
+        `min_iterations` games.
+        """
+        if self.exact:
+            return True
+        if self.episodes < max(min_iterations, 2):
+            return False
+        return all(x is not None and x <= ci_target
+                for x in self.ci_half_widths(ci_level))
+
+    def to_dict(self):
+        # everything but the individual games
+        return {
+            "episodes": self.episodes,
+            "sum_returns": self.sum_returns,
+            "mean_returns": self.mean_returns,
+            "m2_returns": self.m2_returns,
+            "sum_victories": self.sum_victories,
+            "sum_inconclusive": self.sum_inconclusive,
+            "histories": dict(self.histories),
+            "turns_played": dict(self.turns_played),
+            "exact": self.exact,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        episodes = data["episodes"]
+        if "m2_returns" in data:
+            mean_returns = list(data["mean_returns"])
+            m2_returns = list(data["m2_returns"])
+        else:
+            # stored before the running moments were kept; the means
+            # follow from the sums but the spread is lost
+            mean_returns = [x / episodes if episodes else 0.0
+                    for x in data["sum_returns"]]
+            m2_returns = [None, None]
+        return cls(episodes=episodes,
+                sum_returns=list(data["sum_returns"]),
+                mean_returns=mean_returns, m2_returns=m2_returns,
+                sum_victories=list(data["sum_victories"]),
+                sum_inconclusive=data["sum_inconclusive"],
+                histories=collections.defaultdict(int, data["histories"]),
+                # JSON keys are strings
+                turns_played=collections.defaultdict(int,
+                    ((int(x), y) for x, y
+                        in data.get("turns_played", {}).items())),
+                exact=data.get("exact", False))
+
+def game_params(adv_rewards, det_costs, use_waits=DEFAULTS.use_waits,
+        use_timewaits=DEFAULTS.use_timewaits,
+        use_chance_fail=DEFAULTS.use_chance_fail):
+    # load_game does not accept bools
+    return {
+        "advancement_rewards": adv_rewards,
+        "detection_costs": det_costs,
+        "use_waits": int(use_waits),
+        "use_timewaits": int(use_timewaits),
+        "use_chance_fail": int(use_chance_fail),
+    }
+
+def task_seed(seed, perm_idx, first_game):
+    """
+    Derive a deterministic seed for a (permutation, chunk) task, the
+    chunk starting at game `first_game`, from the seed of the overall
+    sweep, independent of which worker process ends up running the task
+    or in what order.
+    """
+    ss = np.random.SeedSequence(seed, spawn_key=(perm_idx, first_game))
+    return int(ss.generate_state(1, dtype=np.uint32)[0])
+
+@contextlib.contextmanager
+def seeded_globals(seed=None):
+    """
+    Seed the stdlib random module and np.random with `seed` for the
+    duration of the block, restoring their prior state afterwards so
+    that the caller's own sequence is not disturbed. A no-op for a
+    seed of None.
+    """
+    if seed is None:
+        yield
+        return
+    random_state = random.getstate()
+    np_state = np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(np_state)
+
+def chunk_iterations(iterations, chunk_size=None):
+    if not chunk_size or chunk_size >= iterations:
+        return [iterations]
+    chunks = [chunk_size] * (iterations // chunk_size)
+    if iterations % chunk_size:
+        chunks.append(iterations % chunk_size)
+    return chunks
+
+def play_games(game_name, params, def_policy, def_ap, atk_policy, atk_ap,
+        iterations, dump_games=False, seed=None,
+        backend=DEFAULTS.backend, perm_idx=0, first_game=0, crn=False,
+        ci_target=None, ci_level=DEFAULTS.ci_level,
+        min_iterations=DEFAULTS.min_iterations, exact=False):
+    """
+    Play `iterations` games of one permutation and return a Tally. This
+    is the unit of work handed to worker processes, so everything it
+    needs (game, bots) is constructed here from picklable arguments.
+    Bots are shared across the games played in a single call, so action
+    pickers with running state (clocks, running probabilities) carry
+    that state from one game to the next as they always have.
+
+    Given the `seed` of the sweep, the games are numbered from
+    `first_game` and each draws from Generators seeded by
+    util.game_seeds() from (seed, perm_idx, game number): one for the
+    chance draws of the game and one for each bot, restarted at the
+    start of every game. With `crn` (common random numbers) every
+    permutation gets the same streams for the same game number.
+
+    With the "batch" backend, permutations where both policies are
+    stationary are played by BatchSimulator instead; the rest fall
+    back to playing bots one game at a time. The "event" backend plays
+    bots one game at a time but only steps them on decisions, with
+    event_sim.play_game().
+
+    Given a `ci_target`, `iterations` is only the budget: play stops as
+    soon as, after at least `min_iterations` games, the `ci_level`
+    confidence intervals of both players' mean returns are within
+    `ci_target` of the mean (see Tally.converged()).
+
+    With `exact`, permutations where both policies are stationary are
+    not played at all but evaluated by MarkovEvaluator, and the Tally
+    holds the expected outcome of `iterations` games; with `dump_games`
+    there are games to dump, so they are played regardless.
+    """
+    task = None
+    rngs = {}
+    if seed is not None:
+        task = task_seed(seed, perm_idx, first_game)
+        # reseeded for each game, see below
+        rngs = {
+            arena.Players.DEFENDER: np.random.default_rng(),
+            arena.Players.ATTACKER: np.random.default_rng(),
+        }
+    # the pickers that BatchSimulator and MarkovEvaluator construct
+    # (fixed_prob's weights) still draw from the stdlib random module,
+    # and anything not handed a Generator from np.random
+    with seeded_globals(task):
+        game = pyspiel.load_game(game_name, params)
+        max_turns = game.get_parameters()["num_turns"]
+        if exact and not dump_games:
+            # after seeding, fixed_prob draws its weights from random
+            evaluator = MarkovEvaluator.from_game(game,
+                    atk_policy, atk_ap, def_policy, def_ap)
+            if evaluator:
+                return Tally.from_exact(evaluator.evaluate(), iterations)
+        if backend == "batch":
+            # the batch simulator draws for all its games at once, so
+            # there are no per-game streams (or common random numbers)
+            sim = BatchSimulator.from_game(game, atk_policy, atk_ap,
+                    def_policy, def_ap, rng=np.random.default_rng(task))
+            if sim:
+                tally = Tally()
+                # when stopping adaptively, play rounds of min_iterations
+                # games, checking in between
+                round_size = max(min_iterations, 1) if ci_target \
+                        else iterations
+                while tally.episodes < iterations:
+                    num_games = min(round_size,
+                            iterations - tally.episodes)
+                    for turns_played, returns, victor, history \
+                            in sim.play(num_games).games():
+                        tally.add_game(turns_played, returns, victor,
+                                history, max_turns=max_turns,
+                                keep_game=dump_games)
+                    if ci_target and tally.converged(ci_target,
+                            ci_level=ci_level,
+                            min_iterations=min_iterations):
+                        break
+                return tally
+        def_bot = util.get_player_bot(game,
+                arena.Players.DEFENDER,
+                def_policy, action_picker=def_ap,
+                rng=rngs.get(arena.Players.DEFENDER))
+        atk_bot = util.get_player_bot(game,
+                arena.Players.ATTACKER,
+                atk_policy, action_picker=atk_ap,
+                rng=rngs.get(arena.Players.ATTACKER))
+        bots = {
+            arena.Players.DEFENDER: def_bot,
+            arena.Players.ATTACKER: atk_bot,
+        }
+        play = play_game
+        if backend == "event" and event_sim.supported(def_policy) \
+                and event_sim.supported(atk_policy):
+            play = event_sim.play_game
+        tally = Tally()
+        for game_idx in range(first_game, first_game + iterations):
+            chance_seed = None
+            if rngs:
+                seeds = util.game_seeds(seed, perm_idx, game_idx, crn=crn)
+                util.reseed(rngs[arena.Players.DEFENDER], seeds.defender)
+                util.reseed(rngs[arena.Players.ATTACKER], seeds.attacker)
+                chance_seed = seeds.chance
+            turns_played, returns, victor, history = \
+                    play(game, bots, seed_seq=chance_seed)
+            tally.add_game(turns_played, returns, victor, history,
+                    max_turns=max_turns, keep_game=dump_games)
+            if ci_target and tally.converged(ci_target, ci_level=ci_level,
+                    min_iterations=min_iterations):
+                break
+        return tally
+
 def permutations(attacker_policies=None, attacker_all=False):
     """
     It's important to interate over advancement rewards and detection
@@ -93,23 +439,65 @@ def main(game_name=DEFAULTS.game,
         use_timewaits=DEFAULTS.use_timewaits,
         use_chance_fail=DEFAULTS.use_chance_fail,
         solvers=DEFAULTS.solvers,
-        dump_dir=None, dump_games=None):
+        dump_dir=None, dump_games=None,
+        workers=DEFAULTS.workers, chunk_size=DEFAULTS.chunk_size,
+        seed=None, backend=DEFAULTS.backend, resume=None, crn=False,
+        ci_target=None, ci_level=DEFAULTS.ci_level,
+        min_iterations=DEFAULTS.min_iterations, exact=False):
+    """
+    Play every permutation and dump the results. Per-permutation
+    results (and, with `dump_games`, every game) are checkpointed in a
+    ResultsStore in the run directory; given the run directory of an
+    interrupted sweep as `resume`, finished permutations are read back
+    from there rather than played again. With `crn` every permutation
+    faces the same random draws game for game (see play_games()).
+
+    With a `ci_target` each permutation stops early once the confidence
+    intervals of its mean returns are narrow enough, `iterations` being
+    the most games it gets (see play_games()). Permutations stopped
+    adaptively are not split into chunks.
+
+    With `exact`, permutations of stationary policies are evaluated
+    exactly instead of played (see play_games()), again in one piece.
+    """
     if not iterations:
         iterations = DEFAULTS.iterations
     if not attacker_all and not attacker_policies:
         attacker_policies = DEFAULTS.attacker_policies
-    perm_total = 0
-    perm_total = len(list(permutations(
-        attacker_policies=attacker_policies, attacker_all=attacker_all)))
+    perms = list(permutations(
+        attacker_policies=attacker_policies, attacker_all=attacker_all))
+    perm_total = len(perms)
     perm_fmt = f"permutation.%0{len(str(perm_total))}d"
     timestamp = None
     dump_pm = json_dump_dir = matrix_csv_dir = matrix_json_file = None
     matrix_xls_file = xls_workbook = None
     csv_file = None
+    store = None
+    finished = {}
+    if ((workers and workers > 1) or crn) and seed is None \
+            and not resume:
+        # still derive every task seed from a single root so the
+        # sweep can be reproduced from the seed in the summaries (and
+        # common random numbers are common)
+        seed = int(np.random.SeedSequence().generate_state(
+            1, dtype=np.uint32)[0])
+    if resume:
+        resume = os.path.abspath(resume).rstrip(os.sep)
+        dump_dir, run_stub = os.path.split(resume)
+        if not run_stub.startswith(f"{game_name}-") or not \
+                os.path.exists(os.path.join(resume, ResultsStore.filename)):
+            raise ValueError(f"not a {game_name} playoff run directory: {resume}")
+        timestamp = run_stub[len(game_name) + 1:]
     if dump_dir:
         dump_pm = util.PathManager(base_dir=dump_dir,
-                game_name=game_name)
+                game_name=game_name, timestamp=timestamp)
         timestamp = dump_pm.timestamp
+        if not resume and os.path.exists(os.path.join(dump_pm.path(),
+                ResultsStore.filename)):
+            # run directories are named by the minute, a run started
+            # in the same minute as another would mix in with its
+            # results
+            raise ValueError(f"a playoff run already exists in {_relpath(dump_pm.path())}, resume it with --resume or start again in a minute")
         json_dump_dir = os.path.join(dump_pm.path(), "json")
         if not os.path.exists(json_dump_dir):
             os.makedirs(json_dump_dir)
@@ -129,6 +517,40 @@ def main(game_name=DEFAULTS.game,
                 dump_pm.path(suffix="matrix"), matrix_xls_file)
         xls_workbook = openpyxl.Workbook()
         del xls_workbook["Sheet"]
+        run_meta = {
+            "game_name": game_name,
+            "iterations": iterations,
+            "permutations": [list(x) for x in perms],
+            "use_waits": bool(use_waits),
+            "use_timewaits": bool(use_timewaits),
+            "use_chance_fail": bool(use_chance_fail),
+            "dump_games": bool(dump_games),
+            "chunk_size": chunk_size if workers and workers > 1
+                and not ci_target else 0,
+            "backend": backend,
+            "crn": bool(crn),
+            "ci_target": ci_target,
+            "ci_level": ci_level if ci_target else None,
+            "min_iterations": min_iterations if ci_target else None,
+            "exact": bool(exact),
+        }
+        store = ResultsStore(os.path.join(dump_pm.path(),
+            ResultsStore.filename))
+        if resume:
+            prior_meta = store.get_meta()
+            for name, value in run_meta.items():
+                if prior_meta.get(name) != value:
+                    store.close()
+                    raise ValueError(f"{name} does not match the run being resumed: {value} != {prior_meta.get(name)}")
+            if seed is None:
+                seed = prior_meta["seed"]
+            elif seed != prior_meta["seed"]:
+                store.close()
+                raise ValueError(f"seed does not match the run being resumed: {seed} != {prior_meta['seed']}")
+            finished = store.finished()
+            print(f"Resuming {_relpath(resume)}: {len(finished)} of {perm_total} permutations already finished")
+        else:
+            store.set_meta(seed=seed, **run_meta)
     perm_cnt = sheet_cnt = 0
 
     def _json_preamble():
@@ -138,6 +560,8 @@ def main(game_name=DEFAULTS.game,
         data["defender_policy"] = def_policy
         data["defender_action_picker"] = def_ap
         data["episodes"] = iterations
+        data["ci_target"] = ci_target
+        data["ci_level"] = ci_level
         data["use_waits"] = use_waits
         data["use_timewaits"] = use_timewaits
         data["use_chance_fail"] = use_chance_fail
@@ -154,6 +578,8 @@ def main(game_name=DEFAULTS.game,
         a_policy = '-'.join([atk_policy, atk_ap])
         d_policy = '-'.join([def_policy, def_ap])
         rows.append(["Episodes:", iterations])
+        if ci_target:
+            rows.append(["CI Target:", ci_target, "CI Level:", ci_level])
         rows.append(["Use Waits:", "yes" if use_waits else "no"])
         rows.append(["Use Timewaits:", "yes" if use_timewaits else "no"])
         rows.append(["Use Chance Fail:",
@@ -211,238 +637,275 @@ def main(game_name=DEFAULTS.game,
         for s in Solver.solvers:
             solver_kwargs[s] = s in solvers
 
+    executor = None
+    futures = {}
+    if workers and workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        for perm_idx, (adv_rewards, det_costs, def_policy, def_ap,
+                atk_policy, atk_ap) in enumerate(perms):
+            if perm_idx in finished:
+                continue
+            params = game_params(adv_rewards, det_costs,
+                    use_waits=use_waits, use_timewaits=use_timewaits,
+                    use_chance_fail=use_chance_fail)
+            futures[perm_idx] = []
+            first_game = 0
+            # the stopping rule needs all of a permutation's games in
+            # one place, and there's no splitting up an exact evaluation
+            exact_perm = exact and not dump_games \
+                    and markov_eval.supported(def_policy, def_ap) \
+                    and markov_eval.supported(atk_policy, atk_ap)
+            for chunk_iters in chunk_iterations(iterations,
+                    None if ci_target or exact_perm else chunk_size):
+                futures[perm_idx].append(executor.submit(play_games,
+                    game_name, params, def_policy, def_ap,
+                    atk_policy, atk_ap, chunk_iters,
+                    dump_games=bool(dump_games), seed=seed,
+                    backend=backend, perm_idx=perm_idx,
+                    first_game=first_game, crn=crn,
+                    ci_target=ci_target, ci_level=ci_level,
+                    min_iterations=min_iterations, exact=exact))
+                first_game += chunk_iters
+        print(f"Dispatched {len(futures)} permutations to {workers} workers (seed {seed})")
+
     sheet_key = row_key = col_key = None
     sheet = None
     xls_sheet = None
-    for adv_rewards, det_costs, def_policy, def_ap, atk_policy, atk_ap  \
-            in permutations(attacker_policies=attacker_policies,
-                    attacker_all=attacker_all):
-        key = (adv_rewards, det_costs, def_policy,
-                def_ap, atk_policy, atk_ap,)
-        row_key = (def_policy, def_ap)
-        col_key = (atk_policy, atk_ap)
-        if not sheet_key and matrix_xls_file:
-            # first iteration, initialize
-            sheet_key = (adv_rewards, det_costs)
-            sheet = Sheet(sheet_key, json_preamble=_json_preamble(),
-                    csv_preamble=_csv_preamble())
-        if matrix_xls_file and sheet_key != (adv_rewards, det_costs):
-            # when sheet_key expires, dump csv, create new xls_sheet
-            sheet_cnt += 1
-
-            if solvers:
-                print("\ncalling Solver with:", sheet.name)
-                solver = Solver(sheet)
-                solutions, labels = solver.solve(**solver_kwargs)
-                for key in sorted(solutions):
-                    solution = solutions[key]
-                    print(f"\n{key} type: {type(solution)}")
-                    if not solution:
-                        print("no solutions:", solution)
-                        continue
-                    #if type(solution) in (list, tuple):
-                    #    for i, item in enumerate(solution):
-                    #        print(f"{i}: {type(item)}")
-                    #        if type(item) in (tuple, list):
-                    #            for j, o in enumerate(item):
-                    #                if hasattr(o, "shape"):
-                    #                    print(f"  type: {type(o)} shape: {o.shape}")
-                    #                else:
-                    #                    print(f"  type: {type(o)}")
-                    #else:
-                    #    print("  solution shape:", solutions[key].shape)
+    try:
+        for perm_idx, (adv_rewards, det_costs, def_policy, def_ap,
+                atk_policy, atk_ap) in enumerate(perms):
+            key = (adv_rewards, det_costs, def_policy,
+                    def_ap, atk_policy, atk_ap,)
+            row_key = (def_policy, def_ap)
+            col_key = (atk_policy, atk_ap)
+            if not sheet_key and matrix_xls_file:
+                # first iteration, initialize
+                sheet_key = (adv_rewards, det_costs)
+                sheet = Sheet(sheet_key, json_preamble=_json_preamble(),
+                        csv_preamble=_csv_preamble())
+            if matrix_xls_file and sheet_key != (adv_rewards, det_costs):
+                # when sheet_key expires, dump csv, create new xls_sheet
+                sheet_cnt += 1
+
+                if solvers:
+                    print("\ncalling Solver with:", sheet.name)
+                    solver = Solver(sheet)
+                    solutions, labels = solver.solve(**solver_kwargs)
+                    for key in sorted(solutions):
+                        solution = solutions[key]
+                        print(f"\n{key} type: {type(solution)}")
+                        if not solution:
+                            print("no solutions:", solution)
+                            continue
+                        #if type(solution) in (list, tuple):
+                        #    for i, item in enumerate(solution):
+                        #        print(f"{i}: {type(item)}")
+                        #        if type(item) in (tuple, list):
+                        #            for j, o in enumerate(item):
+                        #                if hasattr(o, "shape"):
+                        #                    print(f"  type: {type(o)} shape: {o.shape}")
+                        #                else:
+                        #                    print(f"  type: {type(o)}")
+                        #else:
+                        #    print("  solution shape:", solutions[key].shape)
+                        print()
+                    sdir = os.path.join(matrix_solver_dir, sheet.name)
+                    jsondir = os.path.join(sdir, "json")
+                    if not os.path.exists(jsondir):
+                        os.makedirs(jsondir)
+                    csvdir = os.path.join(sdir, "csv")
+                    if not os.path.exists(csvdir):
+                        os.makedirs(csvdir)
                     print()
-                sdir = os.path.join(matrix_solver_dir, sheet.name)
-                jsondir = os.path.join(sdir, "json")
-                if not os.path.exists(jsondir):
-                    os.makedirs(jsondir)
-                csvdir = os.path.join(sdir, "csv")
-                if not os.path.exists(csvdir):
-                    os.makedirs(csvdir)
-                print()
-                for sname, solution in solutions.items():
-                    if not solution:
-                        continue
-                    s_json_file = os.path.join(jsondir, f"{sname}.json")
-                    _npy_solution_to_json(sname, solution, s_json_file)
-                    print(f"  Saved {sname} solution in JSON:{_relpath(s_json_file)}")
-                    s_csv_file = os.path.join(csvdir, f"{sname}.csv")
-                    _npy_solution_to_csv(sname, solution, s_csv_file)
-                    print(f"  Saved {sname} solution in CSV: {_relpath(s_csv_file)}")
-                l_json_file = os.path.join(sdir, "labels.json")
-                fh = open(l_json_file, 'w')
-                json.dump(labels, fh, indent=2)
-                print(f"Saved {sheet.name} ro/col labels in {l_json_file}")
-
-            json_file = os.path.join(matrix_json_dir,
-                f"{'-'.join(sheet_key)}.json")
-            print(f"\nDumped {sheet_key} JSON to:", _relpath(json_file))
-            with open(json_file, 'w') as fh:
-                sheet.dump_json(fh)
-
-            csv_file = os.path.join(matrix_csv_dir,
-                f"{'-'.join(sheet_key)}.csv")
-            print(f"\nDumped {sheet_key} CSV to:", _relpath(csv_file))
-            with open(csv_file, 'w', newline='') as fh:
-                writer = csv.writer(fh)
-                sheet.dump_csv(writer)
-
-            xls_sheet = xls_workbook.create_sheet(sheet.name)
-            sheet.dump_xlsx(xls_sheet)
-            xls_workbook.save(matrix_xls_file)
-            print(f"Saved excel sheet {sheet_key} in:",
-                    _relpath(matrix_xls_file), "\n")
-
-            sheet_key = (adv_rewards, det_costs)
-            sheet = Sheet(sheet_key, json_preamble=_json_preamble(),
-                    csv_preamble=_csv_preamble())
-        perm_cnt += 1
-        json_summary_file = json_perm_dir = games_dir = None
-        if dump_dir:
-            json_dump_pm = util.PathManager(
-                base_dir=json_dump_dir,
-                detection_costs=f"det_costs_{det_costs}",
-                advancement_rewards=f"adv_rewards_{adv_rewards}",
-                no_timestamp=True)
-            if dump_games:
-                json_perm_dir = os.path.join(json_dump_pm.path(),
-                        perm_fmt % perm_cnt)
-                json_summary_file = \
-                        os.path.join(json_perm_dir, "summary.json")
-                games_dir = os.path.join(json_perm_dir, "games")
-                if not os.path.exists(games_dir):
-                    os.makedirs(games_dir)
-            else:
+                    for sname, solution in solutions.items():
+                        if not solution:
+                            continue
+                        s_json_file = os.path.join(jsondir, f"{sname}.json")
+                        _npy_solution_to_json(sname, solution, s_json_file)
+                        print(f"  Saved {sname} solution in JSON:{_relpath(s_json_file)}")
+                        s_csv_file = os.path.join(csvdir, f"{sname}.csv")
+                        _npy_solution_to_csv(sname, solution, s_csv_file)
+                        print(f"  Saved {sname} solution in CSV: {_relpath(s_csv_file)}")
+                    l_json_file = os.path.join(sdir, "labels.json")
+                    fh = open(l_json_file, 'w')
+                    json.dump(labels, fh, indent=2)
+                    print(f"Saved {sheet.name} ro/col labels in {l_json_file}")
+
+                json_file = os.path.join(matrix_json_dir,
+                    f"{'-'.join(sheet_key)}.json")
+                print(f"\nDumped {sheet_key} JSON to:", _relpath(json_file))
+                with open(json_file, 'w') as fh:
+                    sheet.dump_json(fh)
+
+                csv_file = os.path.join(matrix_csv_dir,
+                    f"{'-'.join(sheet_key)}.csv")
+                print(f"\nDumped {sheet_key} CSV to:", _relpath(csv_file))
+                with open(csv_file, 'w', newline='') as fh:
+                    writer = csv.writer(fh)
+                    sheet.dump_csv(writer)
+
+                xls_sheet = xls_workbook.create_sheet(sheet.name)
+                sheet.dump_xlsx(xls_sheet)
+                xls_workbook.save(matrix_xls_file)
+                print(f"Saved excel sheet {sheet_key} in:",
+                        _relpath(matrix_xls_file), "\n")
+
+                sheet_key = (adv_rewards, det_costs)
+                sheet = Sheet(sheet_key, json_preamble=_json_preamble(),
+                        csv_preamble=_csv_preamble())
+            perm_cnt += 1
+            json_summary_file = json_perm_dir = None
+            if dump_dir:
+                json_dump_pm = util.PathManager(
+                    base_dir=json_dump_dir,
+                    detection_costs=f"det_costs_{det_costs}",
+                    advancement_rewards=f"adv_rewards_{adv_rewards}",
+                    no_timestamp=True)
                 json_perm_dir = json_dump_pm.path()
                 json_summary_file = os.path.join(json_perm_dir,
                         f"{perm_fmt % perm_cnt}.json")
-            if not os.path.exists(json_perm_dir):
-                os.makedirs(json_perm_dir)
-
-        # load_game does not accept bools
-        game = pyspiel.load_game(game_name, {
-            "advancement_rewards": adv_rewards,
-            "detection_costs": det_costs,
-            "use_waits": int(use_waits),
-            "use_timewaits": int(use_timewaits),
-            "use_chance_fail": int(use_chance_fail),
-        })
-        utilities = arena.Utilities(
-                advancement_rewards=adv_rewards,
-                detection_costs=det_costs)
-        def_bot = util.get_player_bot(game,
-                arena.Players.DEFENDER,
-                def_policy, action_picker=def_ap)
-        atk_bot = util.get_player_bot(game,
-                arena.Players.ATTACKER,
-                atk_policy, action_picker=atk_ap)
-        bots = {
-            arena.Players.DEFENDER: def_bot,
-            arena.Players.ATTACKER: atk_bot,
-        }
-        histories = collections.defaultdict(int)
-        sum_returns = [0, 0]
-        sum_normalized_returns = [0, 0]
-        sum_victories = [0, 0]
-        sum_inconclusive = 0
-        iter_fmt = f"%0{len(str(iterations))}d.json"
-        game_num = 0
-        for _ in range(iterations):
-            game_num += 1
-            turns_played, returns, victor, history \
-                    = play_game(game, bots)
-            histories[" ".join(str(int(x))
-                for x in history)] += 1
-            for i, v in enumerate(returns):
-                sum_returns[i] += v
-            victor = int(victor) if victor is not None \
-                    else victor
-            if victor == int(arena.Players.ATTACKER):
-                sum_victories[0] += 1
-            elif victor == int(arena.Players.DEFENDER):
-                sum_victories[1] += 1
+                if not os.path.exists(json_perm_dir):
+                    os.makedirs(json_perm_dir)
+
+            params = game_params(adv_rewards, det_costs,
+                    use_waits=use_waits, use_timewaits=use_timewaits,
+                    use_chance_fail=use_chance_fail)
+            game = pyspiel.load_game(game_name, params)
+            utilities = arena.Utilities(
+                    advancement_rewards=adv_rewards,
+                    detection_costs=det_costs)
+            if perm_idx in finished:
+                tally = Tally.from_dict(finished[perm_idx])
+            elif executor:
+                tally = Tally()
+                for future in futures.pop(perm_idx):
+                    tally.merge(future.result())
+            else:
+                tally = play_games(game_name, params,
+                        def_policy, def_ap, atk_policy, atk_ap,
+                        iterations, dump_games=bool(dump_games),
+                        seed=seed, backend=backend, perm_idx=perm_idx,
+                        crn=crn, ci_target=ci_target, ci_level=ci_level,
+                        min_iterations=min_iterations, exact=exact)
+            if store and perm_idx not in finished:
+                # checkpoint
+                store.add_permutation(perm_idx, {
+                        "advancement_rewards": adv_rewards,
+                        "detection_costs": det_costs,
+                        "defender_policy": def_policy,
+                        "defender_action_picker": def_ap,
+                        "attacker_policy": atk_policy,
+                        "attacker_action_picker": atk_ap,
+                    }, tally.to_dict(), games=tally.games)
+            histories = tally.histories
+            sum_returns = tally.sum_returns
+            sum_normalized_returns = [0, 0]
+            sum_victories = tally.sum_victories
+            sum_inconclusive = tally.sum_inconclusive
+            game_num = tally.episodes
+            ci_half_widths = tally.ci_half_widths(ci_level)
+            if sheet:
+                # make sure row/col exist
+                sheet.atk_matrix.row(row_key)
+                sheet.atk_matrix.col(col_key)
+                sheet.def_matrix.row(row_key)
+                sheet.def_matrix.col(col_key)
+                # accumulate returns
+                sheet.atk_matrix[row_key][col_key] += sum_returns[0]/game_num
+                sheet.def_matrix[row_key][col_key] += sum_returns[1]/game_num
+                sheet.episodes_matrix.set_val(row_key, col_key, game_num)
+                for matrix, half_width in zip(
+                        (sheet.atk_ci_matrix, sheet.def_ci_matrix),
+                        ci_half_widths):
+                    if half_width is not None:
+                        matrix.set_val(row_key, col_key, half_width)
+            def_policy_str = def_policy
+            if not def_ap:
+                cls = policies.get_policy_class(def_policy)
+                if hasattr(cls, "default_action_picker"):
+                    def_ap = cls.default_action_picker()
+            if def_ap:
+                def_policy_str += f"/{def_ap}"
+            atk_policy_str = atk_policy
+            if not atk_ap:
+                cls = policies.get_policy_class(atk_policy)
+                if hasattr(cls, "default_action_picker"):
+                    atk_ap = cls.default_action_picker()
+            if atk_ap:
+                atk_policy_str += f"/{atk_ap}"
+            print(f"\nPermutation {perm_cnt}/{perm_total}:")
+            print(f"Advancement rewards: {adv_rewards}")
+            print(f"Detection costs: {det_costs}")
+            print(f"Defender policy: {def_policy_str}")
+            print(f"Attacker policy: {atk_policy_str}")
+            if tally.exact:
+                print("Evaluated exactly, as a chain, for games played:",
+                        game_num)
             else:
-                sum_inconclusive += 1
-            if dump_games and games_dir:
+                print("Number of games played:", game_num)
+            if ci_target:
+                print(f"CI half-widths ({ci_level:.0%}):", " ".join(
+                    f"{x:.3f}" if x is not None else "n/a"
+                    for x in ci_half_widths))
+            if histories or not tally.exact:
+                print("Number of distinct games played:", len(histories))
+            if json_perm_dir:
+                r_means = [x / game_num for x in sum_returns]
+                max_atk_util = utilities.max_atk_utility()
+                scale_factor = 100 / max_atk_util
+                sum_normalized_returns = [x * scale_factor for x in sum_returns]
+                r_means_normalized = \
+                        [x / game_num for x in sum_normalized_returns]
                 dump = {
-                    "returns": returns,
-                    "victor": victor,
+                    "perm_idx": perm_idx,
+                    "episodes": game_num,
+                    "sum_returns": sum_returns,
+                    "sum_victories": sum_victories,
+                    "sum_inconclusive": sum_inconclusive,
+                    "r_means": r_means,
+                    "max_atk_util": max_atk_util,
+                    "sum_normalized_returns": sum_normalized_returns,
+                    "r_means_normalized": r_means_normalized,
+                    "ci_level": ci_level,
+                    "ci_half_widths": ci_half_widths,
+                    "ci_target": ci_target,
+                    "max_iterations": iterations,
+                    "exact": tally.exact,
+                    "turns_played": dict(sorted(
+                        tally.turns_played.items())),
                     "max_turns": game.get_parameters()["num_turns"],
-                    "turns_played": turns_played,
-                    "history": history,
+                    "defender_policy": def_policy,
+                    "defender_action_picker": def_ap or "n/a",
+                    "attacker_policy": atk_policy,
+                    "attacker_action_picker": atk_ap or "n/a",
+                    "advancement_rewards": adv_rewards,
+                    "detection_costs": det_costs,
+                    "use_waits": use_waits,
+                    "use_timewaits": use_timewaits,
+                    "use_chance_fail": use_chance_fail,
+                    "seed": seed,
+                    "workers": workers,
+                    "backend": backend,
+                    "crn": bool(crn),
+                    "player_map": arena.player_map(),
+                    "action_map": arena.action_map(),
+                    "utilities": utilities.tupleize(),
                 }
-                df = os.path.join(games_dir, iter_fmt % game_num)
-                with open(df, 'w') as dfh:
+                histories = list(reversed(sorted((y, x)
+                    for x, y in histories.items())))
+                dump["history_tallies"] = histories
+                with open(json_summary_file, 'w') as dfh:
                     json.dump(dump, dfh, indent=2)
-        if sheet:
-            # make sure row/col exist
-            sheet.atk_matrix.row(row_key)
-            sheet.atk_matrix.col(col_key)
-            sheet.def_matrix.row(row_key)
-            sheet.def_matrix.col(col_key)
-            # accumulate returns
-            sheet.atk_matrix[row_key][col_key] += sum_returns[0]/iterations
-            sheet.def_matrix[row_key][col_key] += sum_returns[1]/iterations
-        def_policy_str = def_policy
-        if not def_ap:
-            cls = policies.get_policy_class(def_policy)
-            if hasattr(cls, "default_action_picker"):
-                def_ap = cls.default_action_picker()
-        if def_ap:
-            def_policy_str += f"/{def_ap}"
-        atk_policy_str = atk_policy
-        if not atk_ap:
-            cls = policies.get_policy_class(atk_policy)
-            if hasattr(cls, "default_action_picker"):
-                atk_ap = cls.default_action_picker()
-        if atk_ap:
-            atk_policy_str += f"/{atk_ap}"
-        print(f"\nPermutation {perm_cnt}/{perm_total}:")
-        print(f"Advancement rewards: {adv_rewards}")
-        print(f"Detection costs: {det_costs}")
-        print(f"Defender policy: {def_policy_str}")
-        print(f"Attacker policy: {atk_policy_str}")
-        print("Number of games played:", game_num)
-        print("Number of distinct games played:", len(histories))
-        if json_perm_dir:
-            r_means = [x / game_num for x in sum_returns]
-            max_atk_util = utilities.max_atk_utility()
-            scale_factor = 100 / max_atk_util
-            sum_normalized_returns = [x * scale_factor for x in sum_returns]
-            r_means_normalized = \
-                    [x / game_num for x in sum_normalized_returns]
-            dump = {
-                "episodes": game_num,
-                "sum_returns": sum_returns,
-                "sum_victories": sum_victories,
-                "sum_inconclusive": sum_inconclusive,
-                "r_means": r_means,
-                "max_atk_util": max_atk_util,
-                "sum_normalized_returns": sum_normalized_returns,
-                "r_means_normalized": r_means_normalized,
-                "max_turns": game.get_parameters()["num_turns"],
-                "defender_policy": def_policy,
-                "defender_action_picker": def_ap or "n/a",
-                "attacker_policy": atk_policy,
-                "attacker_action_picker": atk_ap or "n/a",
-                "advancement_rewards": adv_rewards,
-                "detection_costs": det_costs,
-                "use_waits": use_waits,
-                "use_timewaits": use_timewaits,
-                "use_chance_fail": use_chance_fail,
-                "player_map": arena.player_map(),
-                "action_map": arena.action_map(),
-                "utilities": utilities.tupleize(),
-            }
-            histories = list(reversed(sorted((y, x)
-                for x, y in histories.items())))
-            dump["history_tallies"] = histories
-            with open(json_summary_file, 'w') as dfh:
-                json.dump(dump, dfh, indent=2)
-            if dump_games:
-                print(f"Dumped {game_num} game playthroughs into: {_relpath(json_perm_dir)}")
-            else:
+                store.add_summary(perm_idx, dump, os.path.relpath(
+                    json_summary_file, dump_pm.path()))
                 print(f"Dumped summary of {game_num} game playthroughs into: {_relpath(json_summary_file)}")
+                if dump_games:
+                    print(f"Stored {game_num} game playthroughs in: {_relpath(store.path)}")
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if store:
+            store.close()
     if dump_dir:
         print()
         print(f"\nSaved {sheet_cnt} JSON matrices in "
@@ -498,6 +961,31 @@ if __name__ == "__main__":
             help="If dumping, also dump individual game runs along with the summaries for each perumutation of cost/reward models and policy variations.")
     parser.add_argument("-n", "--no-dump", action="store_true",
             help="Disable logging of game playthroughs. (primarily for debugging)")
+    parser.add_argument("-w", "--workers", default=DEFAULTS.workers,
+            type=int,
+            help=f"Number of worker processes across which permutations are played. ({DEFAULTS.workers})")
+    parser.add_argument("--chunk-size", default=DEFAULTS.chunk_size,
+            type=int,
+            help="With multiple workers, also split the iterations of each permutation into chunks of this many games. Action pickers are reset at the start of each chunk. (0, no chunking)")
+    parser.add_argument("-b", "--backend", default=DEFAULTS.backend,
+            choices=DEFAULTS.backends,
+            help=f"Game engine: 'batch' plays permutations of stationary policies (uniform_random, first_action, last_action, simple_random) with the vectorized simulator in batch_sim.py; other permutations are played by bots as usual. 'event' skips over IN_PROGRESS moves to the next decision (event_sim.py). ({DEFAULTS.backend})")
+    parser.add_argument("--seed", type=int,
+            help="Seed from which the seeds of every game of every permutation are derived. Recorded in the summaries. (random)")
+    parser.add_argument("--crn", action="store_true",
+            help="Common random numbers: the same game of every permutation faces the same chance draws (progress turns, skirmishes), so differences between policies are not swamped by luck. Needs a seed (one is picked if not given). Not applied to permutations played by the batch simulator.")
+    parser.add_argument("-r", "--resume", metavar="RUN_DIR",
+            help="Resume an interrupted playoff from its run directory (e.g. dump/chain_game_v6_seq-2023-10-05T12:00). Permutations already recorded in its results store are not played again; the remaining settings must match the original run.")
+    parser.add_argument("--ci-target", type=float,
+            help="Adaptive stopping: stop playing a permutation once the confidence intervals of both players' mean returns are within this many utility points of the mean; --iterations becomes the most games a permutation gets. The games played and intervals reached are recorded in the summaries and matrices. (off)")
+    parser.add_argument("--ci-level", default=DEFAULTS.ci_level,
+            type=float,
+            help=f"Confidence level of the intervals for --ci-target. ({DEFAULTS.ci_level})")
+    parser.add_argument("--min-iterations", default=DEFAULTS.min_iterations,
+            type=int,
+            help=f"With --ci-target, games played before a permutation may stop. ({DEFAULTS.min_iterations})")
+    parser.add_argument("--exact", action="store_true",
+            help="Evaluate permutations of stationary policies (uniform_random, first_action, last_action, simple_random) exactly, as Markov chains (markov_eval.py), rather than play them; the summaries hold the expected outcome of --iterations games. Not applied with --dump-games. With timewaits over 50 turns an evaluation takes about as long as 150-500 scalar games (the first for a pair of policies being slowest), see README.md.")
     args = parser.parse_args()
     if args.no_dump:
         args.dump_dir = None
@@ -523,4 +1011,14 @@ if __name__ == "__main__":
         use_chance_fail=use_chance_fail,
         dump_dir = args.dump_dir,
         dump_games = args.dump_games,
+        workers = args.workers,
+        chunk_size = args.chunk_size,
+        seed = args.seed,
+        backend = args.backend,
+        resume = args.resume,
+        crn = args.crn,
+        ci_target = args.ci_target,
+        ci_level = args.ci_level,
+        min_iterations = args.min_iterations,
+        exact = args.exact,
     )
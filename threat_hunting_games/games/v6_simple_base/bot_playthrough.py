@@ -13,6 +13,8 @@ from open_spiel.python.bots.policy import PolicyBot
 import arena, policies, util, std_args
 from threat_hunting_games import games
 from arena import debug
+from batch_sim import BatchSimulator
+import event_sim
 
 def_defender_policy = "simple_random"
 def_dp_class = policies.get_policy_class(def_defender_policy)
@@ -50,6 +52,9 @@ class Defaults:
     use_timewaits: bool = arena.USE_TIMEWAITS
     use_chance_fail: bool = arena.USE_CHANCE_FAIL
 
+    backends: tuple = ("scalar", "batch", "event")
+    backend: str = "scalar"
+
     dump_dir: str = os.path.join(os.path.dirname(
         os.path.abspath(__file__)), "dump_playthroughs")
 
@@ -88,7 +93,7 @@ def main(game_name=DEFAULTS.game,
         use_waits=DEFAULTS.use_waits,
         use_timewaits=DEFAULTS.use_timewaits,
         use_chance_fail=DEFAULTS.use_chance_fail,
-        dump_dir=None):
+        dump_dir=None, backend=DEFAULTS.backend):
     if not iterations:
         iterations = DEFAULTS.iterations
     if detection_costs:
@@ -138,6 +143,21 @@ def main(game_name=DEFAULTS.game,
         arena.Players.DEFENDER: def_bot,
         arena.Players.ATTACKER: atk_bot,
     }
+    sim = None
+    if backend == "batch":
+        sim = BatchSimulator.from_game(game,
+                attacker_policy, attacker_action_picker,
+                defender_policy, defender_action_picker)
+        if not sim:
+            print("Policies can not be batched, playing with bots")
+    play = play_game
+    if backend == "event" and event_sim.supported(defender_policy) \
+            and event_sim.supported(attacker_policy):
+        play = event_sim.play_game
+    if sim:
+        results = sim.play(iterations).games()
+    else:
+        results = (play(game, bots) for _ in range(iterations))
     histories = collections.defaultdict(int)
     sum_returns = [0, 0]
     sum_victories = [0, 0]
@@ -152,10 +172,8 @@ def main(game_name=DEFAULTS.game,
     game_num = 0
     try:
         iter_fmt = f"%0{len(str(iterations))}d.json"
-        for _ in range(iterations):
+        for turns_played, returns, victor, history in results:
             game_num += 1
-            turns_played, returns, victor, history \
-                    = play_game(game, bots)
             histories[" ".join(str(int(x)) for x in history)] += 1
             for i, v in enumerate(returns):
                 sum_returns[i] += v
@@ -245,6 +263,9 @@ if __name__ == "__main__":
             help=f"Directory in which to dump game states over iterations of the game. ({DEFAULTS.dump_dir})")
     parser.add_argument("-n", "--no-dump", action="store_true",
             help="Disable dumping of game playthroughs")
+    parser.add_argument("-b", "--backend", default=DEFAULTS.backend,
+            choices=DEFAULTS.backends,
+            help=f"Game engine: 'batch' uses the vectorized simulator in batch_sim.py if both policies are stationary (uniform_random, first_action, last_action, simple_random); 'event' skips over IN_PROGRESS moves to the next decision (event_sim.py). ({DEFAULTS.backend})")
     args = parser.parse_args()
     if args.list_policies:
         for policy_name in policies.list_policies_with_pickers_strs():
@@ -276,4 +297,5 @@ if __name__ == "__main__":
         use_timewaits=param_values["use_timewaits"],
         use_chance_fail=param_values["use_chance_fail"],
         dump_dir = args.dump_dir,
+        backend = args.backend,
     )
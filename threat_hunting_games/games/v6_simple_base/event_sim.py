@@ -0,0 +1,59 @@
+"""
+Discrete-event play of chain_game_v6_seq.
+
+With use_timewaits most of the moves in a game are IN_PROGRESS: the only
+legal action while the player's last action is still underway. Playing
+turn by turn, each of those still goes through apply_action(), a
+detection sweep and a bot step. play_game() here instead has the state
+apply them itself, jumping straight over the turns on which nothing can
+happen, up to the next decision of either player (see
+GameState.skip_in_progress()); the bots are only asked to decide. The
+work per game scales with the number of decisions rather than the
+number of turns.
+
+The games played are the same as with bot_playoffs.play_game(): the
+IN_PROGRESS moves make the same random draws in the game either way and
+policies return IN_PROGRESS without consulting their action pickers.
+PolicyBot does draw from np.random on every step though, even with a
+single legal action, so with the same seed the games are identical in
+distribution but not game for game.
+
+The IN_PROGRESS moves are not part of state.history(), so bots must act
+on the state rather than its history; see supported().
+"""
+
+try:
+    # for use within the package, e.g. from tests
+    from . import arena as arena_mod
+    from . import policies
+except ImportError:
+    # for scripts living in this directory
+    import arena as arena_mod
+    import policies
+
+
+def supported(policy_name):
+    """
+    Policy bots act on the state alone. MCTS bots (util.MCTS_POLICY)
+    look up their saved search tree by the state history, which misses
+    the skipped moves.
+    """
+    return policy_name in policies.list_policies()
+
+def play_game(game, bots, seed_seq=None):
+    """
+    Play one game, returning the same (turns_played, returns, victor,
+    history) as bot_playoffs.play_game(), IN_PROGRESS moves included in
+    the history. Chance draws are seeded by `seed_seq` if given.
+    """
+    state = game.new_initial_state(seed_seq=seed_seq)
+    in_progress = int(arena_mod.Actions.IN_PROGRESS)
+    history = []
+    while True:
+        history.extend([in_progress] * state.skip_in_progress())
+        if state.is_terminal():
+            break
+        action = int(bots[state.current_player()].step(state))
+        history.append(action)
+        state.apply_action(action)
+    return state.turns_played(), state.returns(), state.victor(), history
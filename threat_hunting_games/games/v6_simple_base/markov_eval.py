@@ -0,0 +1,581 @@
+"""
+Exact evaluation of chain_game_v6_seq between two stationary policies.
+
+When neither policy carries state from one move to the next (see
+batch_sim.Stationary_Policies), a game is a finite absorbing Markov
+chain: what happens next depends only on the position of the attacker,
+the current action and remaining IN_PROGRESS turns of each player, the
+attack actions completed so far and the turn. Rather than sample games,
+MarkovEvaluator pushes the probability mass of every such state forward
+one round (an attacker move and a defender move) at a time, merging
+paths that arrive at the same state, until all of it has been absorbed
+by the end of a game. This gives the expected returns (and their
+variance), the probability of each victor and the distribution of game
+lengths exactly, in one pass whose cost depends on the number of
+distinct states rather than on the number of games. Once the paths are
+merged by state, the mass moves through arrays of the chain's
+transitions, a round at a time. The chain itself doesn't depend on the
+utilities, so it is worked out once per rules and pair of policies and
+kept for the next game that differs only in those (see from_game()).
+
+The rules are those of BatchSimulator (batch_sim.py), which in turn
+mirror GameState._apply_action(); the policy choices, timewaits and
+skirmishes are the branches of the chain.
+"""
+
+import collections
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    # for use within the package, e.g. from tests
+    from . import arena as arena_mod
+    from . import batch_sim
+except ImportError:
+    # for scripts living in this directory
+    import arena as arena_mod
+    import batch_sim
+
+# distinct paths followed, action history and all, before they are
+# merged into states and the distribution of histories is given up
+MAX_PATHS = 1000
+
+
+def supported(policy_name, action_picker=None):
+    return batch_sim.supported(policy_name, action_picker)
+
+
+class ChainState(NamedTuple):
+    """
+    A state of the chain at the start of a round, i.e. before an
+    attacker move. The fields follow the per-game arrays of
+    BatchSimulator._play_batch().
+    """
+    atk_pos: int
+    atk_cur: int
+    atk_remaining: int
+    atk_expended: bool
+    # counts of attack actions completed prior to the current one
+    atk_done: tuple
+    def_cur: int
+    def_remaining: int
+    def_expended: bool
+    def_any_completed: bool
+
+
+@dataclass
+class ExactResults:
+    """
+    Exact outcome of a game between two stationary policies.
+    `victory_probs` is indexed by player (attacker, defender),
+    `turns_played_probs` maps a game length to its probability, and
+    `history_probs` maps an action history (a tuple) to its probability
+    if there were few enough of them to follow (see MAX_PATHS),
+    otherwise it is None.
+    """
+    mean_returns: list
+    var_returns: list
+    victory_probs: list
+    inconclusive_prob: float
+    turns_played_probs: dict
+    history_probs: dict = field(default=None)
+
+
+class _Branch(NamedTuple):
+    """
+    A branch of a round, the same whatever the turn and the utilities:
+    its probability, the (attacker, defender) actions taken, the defend
+    action whose detection ends the game there (or -1), the attack
+    action rewarded as completed (or -1), the state reached and, if the
+    game ends there before running out of turns, its victor.
+    """
+    prob: float
+    actions: tuple
+    detected: int
+    rewarded: int
+    state: ChainState
+    victor: int
+    ends: bool
+
+
+class _Chain:
+    """
+    The states reached so far of the chain of a game's rules and pair
+    of policies, which evaluators of games differing only in their
+    utilities or number of turns can share. `rounds` maps a state to
+    the branches of its round. Once paths are merged by state, the
+    states are numbered (`index`) and the branches of those expanded
+    are turned into transitions from one number to another, -1 where
+    the game ends, with their outcomes (the actions, detection and
+    reward that make up the change in returns) numbered as well.
+    """
+
+    def __init__(self):
+        self.rounds = {}
+        self.index = {}
+        self.states = []
+        # per numbered state, the states its branches lead to if it has
+        # been expanded, otherwise None
+        self.successors = []
+        self.outcomes = {}
+        # src, dst, prob, outcome, victor (-1 if none), ends; those
+        # listed since the arrays were last put together
+        self.transitions = ([], [], [], [], [], [])
+        self.arrays = tuple(np.zeros(0, dtype=x)
+                for x in (int, int, float, int, int, bool))
+
+    def number(self, state):
+        idx = self.index.get(state)
+        if idx is None:
+            idx = self.index[state] = len(self.states)
+            self.states.append(state)
+            self.successors.append(None)
+        return idx
+
+    def compile(self):
+        if self.transitions[0]:
+            self.arrays = tuple(
+                    np.concatenate((x, np.array(y, dtype=x.dtype)))
+                    for x, y in zip(self.arrays, self.transitions))
+            for column in self.transitions:
+                column.clear()
+        return self.arrays
+
+
+# chains by rules and pair of policies, most recently used last; enough
+# for every pair of stationary policies of a playoff, at a few MB per
+# chain of 50 turns
+_chains = {}
+CHAINS_CACHE_SIZE = 64
+
+
+class _Mass:
+    """
+    Probability mass of the paths that reach a state, along with the
+    first and second moments of their returns weighted by it, which is
+    all it takes to merge paths and still come out with exact means
+    and variances.
+    """
+    __slots__ = ("p", "r1", "r2")
+
+    def __init__(self, p=0.0, r1=(0.0, 0.0), r2=(0.0, 0.0)):
+        self.p = p
+        self.r1 = list(r1)
+        self.r2 = list(r2)
+
+    def add(self, other):
+        self.p += other.p
+        for i in range(2):
+            self.r1[i] += other.r1[i]
+            self.r2[i] += other.r2[i]
+
+    def branch(self, prob, deltas):
+        # the mass continuing on a branch taken with probability
+        # `prob`, having added `deltas` to the returns
+        p = self.p * prob
+        r1 = [(self.r1[i] + self.p * d) * prob for i, d in enumerate(deltas)]
+        r2 = [(self.r2[i] + 2 * d * self.r1[i] + d * d * self.p) * prob
+                for i, d in enumerate(deltas)]
+        return _Mass(p, r1, r2)
+
+
+class MarkovEvaluator:
+    """
+    Evaluates v6 games between two stationary policies exactly.
+
+    Evaluators of the same rules and policies can share a `chain` (see
+    from_game()), as only the returns on its branches depend on the
+    utilities.
+    """
+
+    def __init__(self, arena, num_turns, attacker_policy, defender_policy,
+            max_paths=MAX_PATHS, chain=None):
+        assert not num_turns % 2, "game length must have even number of turns"
+        self._arena = arena
+        self._num_turns = num_turns
+        self._policies = (attacker_policy, defender_policy)
+        self._max_paths = max_paths
+
+        actions = arena.actions
+        self._num_actions = len(actions)
+        self._ip = int(actions.IN_PROGRESS)
+        self._num_stages = len(arena.atk_actions_by_pos)
+        utilities = arena.utilities
+
+        self._costs = [0] * self._num_actions
+        self._atk_damage = [0] * self._num_actions
+        self._def_damage = [0] * self._num_actions
+        self._timewaits = [(0, 0)] * self._num_actions
+        self._noop = [False] * self._num_actions
+        for action in actions:
+            self._costs[action] = abs(utilities.action_cost(action))
+            if action in arena_mod.Attack_Actions:
+                self._atk_damage[action] = \
+                        abs(utilities.attack_damage(action))
+            if action in arena_mod.Defend_Actions \
+                    and arena.use_defender_clawback:
+                self._def_damage[action] = \
+                        abs(utilities.defend_damage(action))
+            timewait = arena.get_timewait(action)
+            self._timewaits[action] = (timewait.min, timewait.max)
+            self._noop[action] = action in arena.noop_actions
+        self._fail_pcts = arena.skirmish_fail_pcts
+
+        # the legal actions of a player are one of a few sets, in
+        # action order; their distributions are cached by set
+        def _legal(actions):
+            return tuple(sorted(int(x) for x in actions))
+        self._atk_legal = [_legal(x) for x in arena.atk_actions_by_pos]
+        self._def_first_legal = _legal(arena.defend_actions)
+        self._def_legal = _legal(arena.player_actions[arena.players.DEFENDER])
+        self._choices = {}
+        self._chain = _Chain() if chain is None else chain
+        self._deltas_by_outcome = {}
+
+    @classmethod
+    def from_game(cls, game, attacker_policy, attacker_action_picker,
+            defender_policy, defender_action_picker, max_paths=MAX_PATHS):
+        """
+        Construct an evaluator for a loaded game, or return None if
+        either of the policies isn't stationary. The rounds worked out
+        are kept for games with the same rules and policies (up to
+        CHAINS_CACHE_SIZE of them), so that evaluating one with other
+        utilities or another number of turns starts out with them.
+        """
+        params = game.get_parameters()
+        arena = arena_mod.Arena(
+                advancement_rewards=params["advancement_rewards"],
+                detection_costs=params["detection_costs"],
+                use_waits=bool(params["use_waits"]),
+                use_timewaits=bool(params["use_timewaits"]),
+                use_chance_fail=bool(params["use_chance_fail"]))
+        atk_policy = batch_sim.stationary_policy(attacker_policy,
+                attacker_action_picker, arena, arena.players.ATTACKER)
+        def_policy = batch_sim.stationary_policy(defender_policy,
+                defender_action_picker, arena, arena.players.DEFENDER)
+        if atk_policy is None or def_policy is None:
+            return None
+        key = (arena.use_waits, arena.use_timewaits, arena.use_chance_fail,
+                tuple(atk_policy.weights), atk_policy.greedy,
+                tuple(def_policy.weights), def_policy.greedy)
+        chain = _chains.pop(key, None) or _Chain()
+        _chains[key] = chain
+        while len(_chains) > CHAINS_CACHE_SIZE:
+            del _chains[next(iter(_chains))]
+        return cls(arena, params["num_turns"], atk_policy, def_policy,
+                max_paths=max_paths, chain=chain)
+
+    @property
+    def arena(self):
+        return self._arena
+
+    def _choose(self, player, legal):
+        # [(action, prob)], as BatchSimulator._choose() draws them
+        key = (player, legal)
+        if key not in self._choices:
+            policy = self._policies[player]
+            weights = [float(policy.weights[x]) for x in legal]
+            if policy.greedy:
+                # first of the highest, as argmax() picks them
+                choices = [(legal[weights.index(max(weights))], 1.0)]
+            else:
+                total = sum(x for x in weights if x > 0)
+                if total <= 0:
+                    choices = [(x, 1 / len(legal)) for x in legal]
+                else:
+                    choices = [(x, w / total)
+                            for x, w in zip(legal, weights) if w > 0]
+            self._choices[key] = choices
+        return self._choices[key]
+
+    def _durations(self, action):
+        # [(IN_PROGRESS turns, prob)]
+        tw_min, tw_max = self._timewaits[action]
+        span = tw_max - tw_min + 1
+        return [(x, 1 / span) for x in range(tw_min, tw_max + 1)]
+
+    def _round(self, state):
+        """
+        Return the branches (_Branch) of the round starting with
+        `state`, an attacker move and a defender move. They don't
+        depend on the turn or the utilities, so they are worked out
+        once per state and kept in the chain.
+        """
+        rounds = self._chain.rounds
+        branches = rounds.get(state)
+        if branches is None:
+            branches = rounds[state] = list(self._branches(state))
+        return branches
+
+    def _branches(self, state):
+        atk = self._arena.players.ATTACKER
+        ip = self._ip
+        if state.atk_remaining > 0:
+            atk_legal = (ip,)
+        else:
+            atk_legal = self._atk_legal[
+                    min(state.atk_pos, self._num_stages - 1)]
+        for atk_action, atk_prob in self._choose(atk, atk_legal):
+            if atk_action == ip:
+                atk_branches = [(1.0, state._replace(
+                    atk_remaining=state.atk_remaining - 1), False)]
+            else:
+                done = state.atk_done
+                if state.atk_cur >= 0:
+                    done = list(done)
+                    done[state.atk_cur] += 1
+                    done = tuple(done)
+                atk_branches = [(prob, state._replace(atk_cur=atk_action,
+                        atk_remaining=turns, atk_expended=False,
+                        atk_done=done), True)
+                    for turns, prob in self._durations(atk_action)]
+            for tw_prob, mid, just_selected in atk_branches:
+                yield from self._defend(mid, atk_prob * tw_prob,
+                        atk_action, just_selected)
+
+    def _defend(self, state, prob, atk_action, just_selected):
+        dfn = self._arena.players.DEFENDER
+        ip = self._ip
+        if state.def_remaining > 0:
+            def_legal = (ip,)
+        elif state.def_cur < 0:
+            def_legal = self._def_first_legal
+        else:
+            def_legal = self._def_legal
+        for def_action, def_prob in self._choose(dfn, def_legal):
+            if def_action == ip:
+                def_branches = [(1.0, state._replace(
+                    def_remaining=state.def_remaining - 1))]
+            else:
+                def_branches = [(p, state._replace(def_cur=def_action,
+                        def_remaining=turns, def_expended=False))
+                    for turns, p in self._durations(def_action)]
+            for tw_prob, mid in def_branches:
+                yield from self._resolve(mid, prob * def_prob * tw_prob,
+                        (atk_action, def_action), just_selected)
+
+    def _resolve(self, state, prob, actions, just_selected):
+        completed = state.def_remaining == 0
+        primed = completed and not state.def_expended
+        # an in-progress first action is what GameState considers the
+        # defender's current state, and it gets expended
+        premature = not completed and not state.def_any_completed
+        state = state._replace(
+                def_expended=state.def_expended or completed or premature,
+                def_any_completed=state.def_any_completed or completed)
+
+        # detection sweep over the attacker's completed history
+        p_detect = 0.0
+        cur = state.atk_cur
+        if primed:
+            defend = max(state.def_cur, 0)
+            sweep = list(state.atk_done)
+            if cur >= 0 and (state.atk_remaining == 0 or just_selected):
+                sweep[cur] += 1
+            p_fail = 1.0
+            for action, cnt in enumerate(sweep):
+                if cnt:
+                    p_fail *= float(self._fail_pcts[defend][action]) ** cnt
+            p_detect = 1 - p_fail
+
+        if p_detect > 0:
+            yield _Branch(prob * p_detect, actions, max(state.def_cur, 0),
+                    -1, state, int(self._arena.players.DEFENDER), True)
+        if p_detect < 1:
+            prob *= 1 - p_detect
+            rewarded = -1
+            if cur >= 0 and state.atk_remaining == 0 \
+                    and not state.atk_expended:
+                # undetected completed attack action is rewarded
+                rewarded = cur
+                state = state._replace(atk_expended=True,
+                        atk_pos=state.atk_pos + (not self._noop[cur]))
+            victor = None
+            if state.atk_pos == self._num_stages:
+                victor = int(self._arena.players.ATTACKER)
+            yield _Branch(prob, actions, -1, rewarded, state, victor,
+                    victor is not None)
+
+    def _deltas(self, outcome):
+        # (atk delta, def delta) of the returns given the outcome of a
+        # branch, (actions, detected, rewarded)
+        deltas = self._deltas_by_outcome.get(outcome)
+        if deltas is None:
+            (atk_action, def_action), detected, rewarded = outcome
+            atk_delta = -self._costs[atk_action]
+            def_delta = -self._costs[def_action]
+            if detected >= 0:
+                damage = self._def_damage[detected]
+                atk_delta, def_delta = atk_delta - damage, def_delta + damage
+            if rewarded >= 0:
+                damage = self._atk_damage[rewarded]
+                atk_delta, def_delta = atk_delta + damage, def_delta - damage
+            deltas = self._deltas_by_outcome[outcome] = (atk_delta, def_delta)
+        return deltas
+
+    def _expand(self, idx, state):
+        # list the transitions of a numbered state, returning the
+        # numbers of the states they lead to
+        chain = self._chain
+        successors = []
+        for branch in self._round(state):
+            outcome = (branch.actions, branch.detected, branch.rewarded)
+            outcome = chain.outcomes.setdefault(outcome, len(chain.outcomes))
+            dst = -1 if branch.ends else chain.number(branch.state)
+            if dst >= 0:
+                successors.append(dst)
+            for column, value in zip(chain.transitions, (idx, dst,
+                    branch.prob, outcome,
+                    -1 if branch.victor is None else branch.victor,
+                    branch.ends)):
+                column.append(value)
+        chain.successors[idx] = successors
+        # the branches live on as transitions
+        chain.rounds.pop(state, None)
+        return successors
+
+    def _transitions(self, states, num_rounds):
+        """
+        Expand whatever `states` can reach in the `num_rounds` rounds to
+        go and return all the transitions of the chain as arrays.
+        """
+        chain = self._chain
+        layer = [chain.number(x) for x in states]
+        seen = set(layer)
+        for _ in range(num_rounds):
+            nxt = []
+            for idx in layer:
+                successors = chain.successors[idx]
+                if successors is None:
+                    successors = self._expand(idx, chain.states[idx])
+                for dst in successors:
+                    if dst not in seen:
+                        seen.add(dst)
+                        nxt.append(dst)
+            layer = nxt
+        return chain.compile()
+
+    def _propagate(self, dist, first_turn, absorbed, victory_probs,
+            turns_played_probs):
+        """
+        Push the mass of `dist`, merged by state, through the rounds
+        from `first_turn` to the end of the game, all transitions at once,
+        adding what is absorbed as evaluate() does.
+        """
+        chain = self._chain
+        src, dst, prob, outcome, victor, ends = self._transitions(
+                [state for state, _ in dist],
+                (self._num_turns - first_turn) // 2)
+        by_outcome = [None] * len(chain.outcomes)
+        for key, idx in chain.outcomes.items():
+            by_outcome[idx] = self._deltas(key)
+        deltas = np.array(by_outcome, dtype=float)[outcome]
+        size = len(chain.states)
+        p = np.zeros(size)
+        r1 = np.zeros((size, 2))
+        r2 = np.zeros((size, 2))
+        for (state, _), mass in dist.items():
+            idx = chain.index[state]
+            p[idx] += mass.p
+            r1[idx] += mass.r1
+            r2[idx] += mass.r2
+        prob_2d = prob[:, None]
+        for turn in range(first_turn, self._num_turns, 2):
+            # see _Mass.branch()
+            p_src, r1_src = p[src], r1[src]
+            p_src_2d = p_src[:, None]
+            taken_p = p_src * prob
+            taken_r1 = (r1_src + p_src_2d * deltas) * prob_2d
+            taken_r2 = (r2[src] + 2 * deltas * r1_src
+                    + deltas * deltas * p_src_2d) * prob_2d
+            over = ends if turn + 2 < self._num_turns \
+                    else np.ones(len(ends), dtype=bool)
+            over_p = float(taken_p[over].sum())
+            if over_p > 0:
+                absorbed.add(_Mass(over_p,
+                        taken_r1[over].sum(axis=0).tolist(),
+                        taken_r2[over].sum(axis=0).tolist()))
+                turns_played_probs[turn + 2] += over_p
+                won = over & (victor >= 0)
+                for player, won_p in enumerate(np.bincount(victor[won],
+                        taken_p[won], minlength=2)):
+                    victory_probs[player] += float(won_p)
+            going = ~over
+            to = dst[going]
+            p = np.bincount(to, taken_p[going], minlength=size)
+            r1 = np.stack([np.bincount(to, taken_r1[going, i],
+                minlength=size) for i in range(2)], axis=1)
+            r2 = np.stack([np.bincount(to, taken_r2[going, i],
+                minlength=size) for i in range(2)], axis=1)
+
+    def evaluate(self):
+        """
+        Return the ExactResults of a game.
+        """
+        start = ChainState(atk_pos=0, atk_cur=-1, atk_remaining=0,
+                atk_expended=False, atk_done=(0,) * self._num_actions,
+                def_cur=-1, def_remaining=0, def_expended=False,
+                def_any_completed=False)
+        # keyed by (state, history) while paths are followed, by state
+        # once they are merged
+        histories = {}
+        dist = { (start, ()): _Mass(1.0) }
+        absorbed = _Mass()
+        victory_probs = [0.0, 0.0]
+        turns_played_probs = collections.defaultdict(float)
+        for turn in range(0, self._num_turns, 2):
+            if not dist:
+                break
+            if histories is None:
+                # merged by state, the rest of the game goes by arrays
+                self._propagate(dist, turn, absorbed, victory_probs,
+                        turns_played_probs)
+                dist = {}
+                break
+            follow = histories is not None
+            last_round = turn + 2 >= self._num_turns
+            nxt = {}
+            for (state, history), mass in dist.items():
+                for branch in self._round(state):
+                    taken = mass.branch(branch.prob, self._deltas((branch.actions,
+                            branch.detected, branch.rewarded)))
+                    next_history = history + branch.actions \
+                            if follow else ()
+                    if branch.ends or last_round:
+                        absorbed.add(taken)
+                        turns_played_probs[turn + 2] += taken.p
+                        if branch.victor is not None:
+                            victory_probs[branch.victor] += taken.p
+                        if follow:
+                            histories[next_history] = \
+                                    histories.get(next_history, 0.0) \
+                                    + taken.p
+                        continue
+                    key = (branch.state, next_history)
+                    if key in nxt:
+                        nxt[key].add(taken)
+                    else:
+                        nxt[key] = taken
+            if follow and len(nxt) + len(histories) > self._max_paths:
+                # too many paths to follow, merge them by state
+                histories = None
+                merged = {}
+                for (state, _), mass in nxt.items():
+                    key = (state, ())
+                    if key in merged:
+                        merged[key].add(mass)
+                    else:
+                        merged[key] = mass
+                nxt = merged
+            dist = nxt
+        assert not dist, "mass left over at the end of the game"
+        mean_returns = [x / absorbed.p for x in absorbed.r1]
+        var_returns = [max(absorbed.r2[i] / absorbed.p - mean * mean, 0.0)
+                for i, mean in enumerate(mean_returns)]
+        return ExactResults(mean_returns=mean_returns,
+                var_returns=var_returns, victory_probs=victory_probs,
+                inconclusive_prob=max(absorbed.p - sum(victory_probs), 0.0),
+                turns_played_probs=dict(sorted(turns_played_probs.items())),
+                history_probs=histories)
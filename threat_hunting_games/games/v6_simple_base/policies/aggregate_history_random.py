@@ -28,7 +28,9 @@ class ActionPickerIncrement:
 
     pct_per_interval = 0.10
 
-    def __init__(self, all_actions, pct_per_interval=None, **kwargs):
+    def __init__(self, all_actions, pct_per_interval=None, rng=None,
+            **kwargs):
+        self._rng = np.random if rng is None else rng
         if pct_per_interval is not None:
             # override class default
             self.pct_per_interval = abs(pct_per_interval)
@@ -54,7 +56,7 @@ class ActionPickerIncrement:
             probs = normalize_action_probs(probs)
         else:
             probs = self._running_probs
-        action = np.random.choice(list(probs.keys()), p=list(probs.values()))
+        action = self._rng.choice(list(probs.keys()), p=list(probs.values()))
         # this increments all other actions, even those not in
         # selected_actions...
         for p_action in self._running_probs:
@@ -83,7 +85,9 @@ class ActionPickerDecrement:
 
     pct_per_interval = 0.8
 
-    def __init__(self, all_actions, pct_per_interval=None, **kwargs):
+    def __init__(self, all_actions, pct_per_interval=None, rng=None,
+            **kwargs):
+        self._rng = np.random if rng is None else rng
         if pct_per_interval is not None:
             # override class default
             self.pct_per_interval = abs(pct_per_interval)
@@ -111,7 +115,7 @@ class ActionPickerDecrement:
         else:
             probs = self._running_probs
         action = None
-        action = np.random.choice(list(probs.keys()), p=list(probs.values()))
+        action = self._rng.choice(list(probs.keys()), p=list(probs.values()))
         old_prob = probs[action]
         new_prob = old_prob * self.pct_per_interval
         pct_slack = old_prob - new_prob
@@ -182,7 +186,11 @@ class AggregateHistoryPolicy(Policy):
     two types.
     """
 
-    def __init__(self, game, action_picker=None):
+    def __init__(self, game, action_picker=None, rng=None):
+        """
+        Action pickers draw from `rng`, a numpy.random.Generator, if
+        given, otherwise from np.random and the module level random.
+        """
         if action_picker is None:
             action_picker = Default_Action_Picker
         all_players = list(range(game.num_players()))
@@ -194,6 +202,7 @@ class AggregateHistoryPolicy(Policy):
             self._action_picker_name = action_picker.__name__
         self._action_picker_class = action_picker
         self._action_pickers = {}
+        self._rng = rng
 
     @classmethod
     def default_action_picker(cls):
@@ -240,10 +249,12 @@ class AggregateHistoryPolicy(Policy):
             #for action in state.arena.player_pctions[player_id]:
             #        seed_probs[action] = uniform_pct
             self._action_pickers[player_id] = \
-                self._action_picker_class(state.arena.player_actions[player_id])
+                self._action_picker_class(state.arena.player_actions[player_id],
+                        rng=self._rng)
         action = self._action_pickers[player_id].take_action(legal_actions)
         if action is None:
-            action = random.choice(legal_actions)
+            action = random.choice(legal_actions) if self._rng is None \
+                    else self._rng.choice(legal_actions)
             print("No action picked, random choice:", state.arena.a2s(action),
                     self._action_picker_name)
         return { int(action): 1.0 }
@@ -322,7 +322,11 @@ class IndependentIntervalsPolicy(Policy):
     still indicate the magnitude of staleness for that action.
     """
 
-    def __init__(self, game, action_picker=None):
+    def __init__(self, game, action_picker=None, rng=None):
+        """
+        Action pickers draw from `rng`, a numpy.random.Generator, if
+        given, otherwise from np.random and the module level random.
+        """
         if action_picker is None:
             action_picker = Default_Action_Picker
         all_players = list(range(game.num_players()))
@@ -334,6 +338,7 @@ class IndependentIntervalsPolicy(Policy):
             self._action_picker_name = action_picker.__name__
         self._action_picker_class = action_picker
         self._action_pickers = {}
+        self._rng = rng
 
     @classmethod
     def default_action_picker(cls):
@@ -373,6 +378,7 @@ class IndependentIntervalsPolicy(Policy):
         if player_id not in self._action_pickers:
             kwargs = {}
             kwargs["arena"] = state.arena
+            kwargs["rng"] = self._rng
             kwargs["action_chain"] = \
                     state.arena.player_actions_by_pos[player_id]
             all_actions = state.arena.player_actions[player_id]
@@ -380,7 +386,8 @@ class IndependentIntervalsPolicy(Policy):
                 self._action_picker_class(all_actions, **kwargs)
         action = self._action_pickers[player_id].take_action(legal_actions)
         if action is None:
-            action = random.choice(legal_actions)
+            action = random.choice(legal_actions) if self._rng is None \
+                    else self._rng.choice(legal_actions)
             print("No action picked, random choice:", state.arena.a2s(action),
                     self._action_picker_name)
         return { int(action): 1.0 }
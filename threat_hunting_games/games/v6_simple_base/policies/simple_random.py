@@ -16,11 +16,15 @@ def uniform_probs(actions):
             probs[action] = 1 / psum
     return probs
 
-def random_probs(actions):
+def random_probs(actions, rng=None):
     mid = int(100 / len(actions))
     probs = {}
     for action in actions:
-        probs[action] = random.randint(1, (mid + int(mid / 3))) / 100
+        if rng is None:
+            pct = random.randint(1, (mid + int(mid / 3)))
+        else:
+            pct = int(rng.integers(1, (mid + int(mid / 3)) + 1))
+        probs[action] = pct / 100
     probs = normalize_action_probs(probs)
     return probs
 
@@ -38,7 +42,7 @@ class ActionPickerSequentialThenCost:
     _pct = 0.5
 
     def __init__(self, all_actions, action_chain=None,
-            arena=None, pct=None, **kwargs):
+            arena=None, pct=None, rng=None, **kwargs):
         assert action_chain, "Parameter 'action_chain' should be arena.Def_Actions_By_Pos or arena.Atk_Actions_By_Pos"
         if pct is not None:
             # override class default
@@ -55,6 +59,7 @@ class ActionPickerSequentialThenCost:
                         for y in stage_actions)]:
                 self._ordered_actions.append(int(action))
         self._idx = 0
+        self._rng = rng
 
     @classmethod
     def defaults(cls):
@@ -69,7 +74,9 @@ class ActionPickerSequentialThenCost:
             try:
                 if self._ordered_actions[self._idx] not in selected_actions:
                     continue
-                if random.random() >= self._pct:
+                chance = random.random() if self._rng is None \
+                        else self._rng.random()
+                if chance >= self._pct:
                     selected_action = self._ordered_actions[self._idx]
                     break
             finally:
@@ -87,10 +94,11 @@ class ActionPickerFixedProb:
     provided, random-ish probabilities are assigned to each action.
     """
 
-    def __init__(self, action_probs, **kwargs):
+    def __init__(self, action_probs, rng=None, **kwargs):
+        self._rng = np.random if rng is None else rng
         if not isinstance(action_probs, dict):
             # just a list of actions, set to uniform random
-            probs = random_probs(action_probs)
+            probs = random_probs(action_probs, rng=rng)
         else:
             probs = normalize_action_probs(probs)
         self._probs = probs
@@ -108,7 +116,7 @@ class ActionPickerFixedProb:
             probs = normalize_action_probs(probs)
         else:
             probs = self._probs
-        action = np.random.choice(list(probs.keys()), p=list(probs.values()))
+        action = self._rng.choice(list(probs.keys()), p=list(probs.values()))
         return action
 
 
@@ -121,7 +129,8 @@ class ActionPickerCostScale:
     Note: this doesn't specify whether it should be an inverse scaling
     """
 
-    def __init__(self, all_actions, arena=None, **kwargs):
+    def __init__(self, all_actions, arena=None, rng=None, **kwargs):
+        self._rng = np.random if rng is None else rng
         self._arena = arena if arena else arena_mod.Arena()
         self._all_actions = tuple(all_actions)
         self._probs = {}
@@ -142,7 +151,7 @@ class ActionPickerCostScale:
             probs = normalize_action_probs(probs)
         else:
             probs = self._probs
-        action = np.random.choice(list(probs.keys()), p=list(probs.values()))
+        action = self._rng.choice(list(probs.keys()), p=list(probs.values()))
         return action
 
 
@@ -151,7 +160,8 @@ class ActionPickerCostScaleInverse(ActionPickerCostScale):
     Inverse scaling from example strategy 7 above.
     """
 
-    def __init__(self, all_actions, arena=None, **kwargs):
+    def __init__(self, all_actions, arena=None, rng=None, **kwargs):
+        self._rng = np.random if rng is None else rng
         self._arena = arena if arena else arena_mod.Arena()
         self._all_actions = tuple(all_actions)
         self._probs = {}
@@ -207,7 +217,11 @@ class SimpleRandomPolicy(Policy):
     sisk note: we are not sampling without replacement as of yet
     """
 
-    def __init__(self, game, action_picker=None):
+    def __init__(self, game, action_picker=None, rng=None):
+        """
+        Action pickers draw from `rng`, a numpy.random.Generator, if
+        given, otherwise from np.random and the module level random.
+        """
         if action_picker is None:
             action_picker = Default_Action_Picker
         all_players = list(range(game.num_players()))
@@ -219,6 +233,7 @@ class SimpleRandomPolicy(Policy):
             self._action_picker_name = action_picker.__name__
         self._action_picker_class = action_picker
         self._action_pickers = {}
+        self._rng = rng
 
     @classmethod
     def default_action_picker(cls):
@@ -257,6 +272,7 @@ class SimpleRandomPolicy(Policy):
         if player_id not in self._action_pickers:
             kwargs = {}
             kwargs["arena"] = state.arena
+            kwargs["rng"] = self._rng
             kwargs["action_chain"] = \
                     state.arena.player_actions_by_pos[player_id]
             all_actions = state.arena.player_actions[player_id]
@@ -265,7 +281,8 @@ class SimpleRandomPolicy(Policy):
                 self._action_picker_class(all_actions, **kwargs)
         action = self._action_pickers[player_id].take_action(legal_actions)
         if action is None:
-            action = random.choice(legal_actions)
+            action = random.choice(legal_actions) if self._rng is None \
+                    else self._rng.choice(legal_actions)
             print("No action picked, random choice:", state.arena.a2s(action),
                     self._action_picker_name)
         return { int(action): 1.0 }
@@ -0,0 +1,347 @@
+"""
+Append-only store for bot_playoffs results, kept in a single SQLite
+database per playoff run rather than one JSON file per game.
+
+Each permutation is written in a single transaction along with its
+tally (summed returns, victories, history tallies) and, optionally, its
+individual games. A permutation that is present in the store is
+therefore finished, which is what lets an interrupted sweep resume
+where it left off.
+
+Action histories are packed one byte per action.
+
+The summaries table is a catalog of the per-permutation JSON summaries,
+indexed on the permutation fields, so that filtering and grouping a run
+(see tools/group_summary.py) doesn't involve loading every summary.
+"""
+
+import os, re, json, sqlite3
+
+Schema = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS permutations (
+    perm_idx INTEGER PRIMARY KEY,
+    advancement_rewards TEXT NOT NULL,
+    detection_costs TEXT NOT NULL,
+    defender_policy TEXT NOT NULL,
+    defender_action_picker TEXT,
+    attacker_policy TEXT NOT NULL,
+    attacker_action_picker TEXT,
+    tally TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    perm_idx INTEGER NOT NULL,
+    game_idx INTEGER NOT NULL,
+    attacker_return INTEGER NOT NULL,
+    defender_return INTEGER NOT NULL,
+    victor INTEGER,
+    turns_played INTEGER NOT NULL,
+    history BLOB NOT NULL,
+    PRIMARY KEY (perm_idx, game_idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS summaries (
+    perm_idx INTEGER PRIMARY KEY,
+    advancement_rewards TEXT NOT NULL,
+    detection_costs TEXT NOT NULL,
+    defender_policy TEXT NOT NULL,
+    defender_action_picker TEXT,
+    attacker_policy TEXT NOT NULL,
+    attacker_action_picker TEXT,
+    defender TEXT NOT NULL,
+    attacker TEXT NOT NULL,
+    episodes INTEGER NOT NULL,
+    distinct_games INTEGER NOT NULL,
+    attacker_mean REAL NOT NULL,
+    defender_mean REAL NOT NULL,
+    attacker_mean_normalized REAL NOT NULL,
+    defender_mean_normalized REAL NOT NULL,
+    attacker_win_rate REAL NOT NULL,
+    defender_win_rate REAL NOT NULL,
+    inconclusive_rate REAL NOT NULL,
+    summary_file TEXT
+);
+CREATE INDEX IF NOT EXISTS summaries_by_utilities
+    ON summaries (advancement_rewards, detection_costs);
+CREATE INDEX IF NOT EXISTS summaries_by_policies
+    ON summaries (defender, attacker);
+"""
+
+Perm_Fields = (
+    "advancement_rewards",
+    "detection_costs",
+    "defender_policy",
+    "defender_action_picker",
+    "attacker_policy",
+    "attacker_action_picker",
+)
+
+# compound "policy-action_picker" names, as used by bot_playoffs and
+# group_summary, along with the utility names these are the catalog
+# fields that can be filtered and grouped on
+Catalog_Fields = Perm_Fields + ("defender", "attacker")
+
+Catalog_Metrics = (
+    "episodes",
+    "distinct_games",
+    "attacker_mean",
+    "defender_mean",
+    "attacker_mean_normalized",
+    "defender_mean_normalized",
+    "attacker_win_rate",
+    "defender_win_rate",
+    "inconclusive_rate",
+)
+
+# the "permutation.N.json" summaries of bot_playoffs, or the
+# "permutation.N/summary.json" of older runs
+Summary_Path = re.compile(r"permutation\.(\d+)(?:\.json$|/summary\.json$)")
+
+
+def compound_policy(policy, action_picker):
+    if action_picker and action_picker != "n/a":
+        policy = "-".join([policy, action_picker])
+    return policy
+
+def catalog_row(summary):
+    """
+    Return the catalog fields and metrics of a permutation summary as
+    dumped by bot_playoffs.
+    """
+    episodes = summary["episodes"]
+    row = {x: summary[x] for x in Perm_Fields}
+    for field in ("defender_action_picker", "attacker_action_picker"):
+        if row[field] == "n/a":
+            row[field] = None
+    row["defender"] = compound_policy(
+            row["defender_policy"], row["defender_action_picker"])
+    row["attacker"] = compound_policy(
+            row["attacker_policy"], row["attacker_action_picker"])
+    row["episodes"] = episodes
+    row["distinct_games"] = len(summary["history_tallies"])
+    row["attacker_mean"], row["defender_mean"] = summary["r_means"]
+    row["attacker_mean_normalized"], row["defender_mean_normalized"] = \
+            summary["r_means_normalized"]
+    row["attacker_win_rate"], row["defender_win_rate"] = \
+            [x / episodes for x in summary["sum_victories"]]
+    row["inconclusive_rate"] = summary["sum_inconclusive"] / episodes
+    return row
+
+
+def pack_history(history):
+    return bytes(int(x) for x in history)
+
+def unpack_history(packed):
+    return list(packed)
+
+
+class ResultsStore:
+
+    filename = "results.sqlite"
+
+    def __init__(self, path):
+        self._path = path
+        self._conn = sqlite3.connect(path)
+        # commits (one per permutation) only need to survive the
+        # process being interrupted, not the machine going down
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(Schema)
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_meta(self):
+        """
+        Return the settings of the run that created this store.
+        """
+        rows = self._conn.execute("SELECT key, value FROM meta")
+        return {key: json.loads(value) for key, value in rows}
+
+    def set_meta(self, **meta):
+        with self._conn:
+            self._conn.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    [(k, json.dumps(v)) for k, v in meta.items()])
+
+    def finished(self):
+        """
+        Return {perm_idx: tally} for every finished permutation.
+        """
+        rows = self._conn.execute(
+                "SELECT perm_idx, tally FROM permutations")
+        return {perm_idx: json.loads(tally) for perm_idx, tally in rows}
+
+    def permutations(self):
+        """
+        Yield a dict of the permutation fields, including perm_idx
+        and tally, for every finished permutation in order.
+        """
+        fields = ("perm_idx",) + Perm_Fields + ("tally",)
+        rows = self._conn.execute(
+                f"SELECT {', '.join(fields)} FROM permutations "
+                 "ORDER BY perm_idx")
+        for row in rows:
+            perm = dict(zip(fields, row))
+            perm["tally"] = json.loads(perm["tally"])
+            yield perm
+
+    def add_permutation(self, perm_idx, perm, tally, games=()):
+        """
+        Record a finished permutation. `perm` maps Perm_Fields to their
+        values, `tally` is a JSON serializable summary, and `games` is
+        an iterable of dicts with returns, victor, turns_played and
+        history keys.
+        """
+        game_rows = ((perm_idx, game_idx, game["returns"][0],
+                game["returns"][1], game["victor"], game["turns_played"],
+                pack_history(game["history"]))
+            for game_idx, game in enumerate(games))
+        with self._conn:
+            self._conn.executemany(
+                    "INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    game_rows)
+            self._conn.execute(
+                    "INSERT INTO permutations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (perm_idx,) + tuple(perm[x] for x in Perm_Fields)
+                    + (json.dumps(tally),))
+
+    def games(self, perm_idx):
+        """
+        Yield the games of a permutation as dicts, in the order they
+        were played.
+        """
+        rows = self._conn.execute(
+                "SELECT attacker_return, defender_return, victor, "
+                "turns_played, history FROM games WHERE perm_idx = ? "
+                "ORDER BY game_idx", (perm_idx,))
+        for atk_return, def_return, victor, turns_played, history in rows:
+            yield {
+                "returns": [atk_return, def_return],
+                "victor": victor,
+                "turns_played": turns_played,
+                "history": unpack_history(history),
+            }
+
+    def add_summary(self, perm_idx, summary, summary_file=None):
+        """
+        Add (or replace) the catalog entry for a permutation summary.
+        """
+        row = catalog_row(summary)
+        row["perm_idx"] = perm_idx
+        row["summary_file"] = summary_file
+        fields = list(row)
+        with self._conn:
+            self._conn.execute(
+                    f"INSERT OR REPLACE INTO summaries ({', '.join(fields)}) "
+                    f"VALUES ({', '.join('?' * len(fields))})",
+                    [row[x] for x in fields])
+
+    def index_summaries(self, json_dir):
+        """
+        Catalog the JSON summaries under `json_dir`, for runs that
+        predate the catalog. Returns the number of summaries indexed.
+
+        The permutation index of a summary is the one it records, or
+        failing that the one in its "permutation.N" file (or directory)
+        name, which bot_playoffs numbers from 1. Summaries with neither
+        are numbered on from the highest index known. Catalog entries
+        are replaced, not dropped, so those without a summary file under
+        `json_dir` are kept.
+        """
+        indexed = []
+        legacy = []
+        for dirpath, _, filenames in os.walk(json_dir):
+            for file in filenames:
+                if not file.endswith(".json"):
+                    continue
+                summary_file = os.path.join(dirpath, file)
+                with open(summary_file) as fh:
+                    summary = json.load(fh)
+                perm_idx = summary.get("perm_idx")
+                if perm_idx is None:
+                    match = Summary_Path.search(summary_file)
+                    if match:
+                        perm_idx = int(match.group(1)) - 1
+                if perm_idx is None:
+                    legacy.append((summary_file, summary))
+                else:
+                    indexed.append((perm_idx, summary_file, summary))
+        last_idx = self._conn.execute(
+                "SELECT MAX(perm_idx) FROM summaries").fetchone()[0]
+        last_idx = max([-1 if last_idx is None else last_idx]
+                + [x[0] for x in indexed])
+        for perm_idx, (summary_file, summary) in enumerate(sorted(legacy,
+                key=lambda x: x[0]), start=last_idx + 1):
+            indexed.append((perm_idx, summary_file, summary))
+        run_dir = os.path.dirname(self._path)
+        for perm_idx, summary_file, summary in indexed:
+            self.add_summary(perm_idx, summary,
+                    os.path.relpath(summary_file, run_dir))
+        return len(indexed)
+
+    def summary_count(self):
+        return self._conn.execute(
+                "SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def distinct(self, field):
+        """
+        Return the sorted distinct values of a catalog field.
+        """
+        if field not in Catalog_Fields:
+            raise ValueError(f"unknown catalog field: {field}")
+        rows = self._conn.execute(
+                f"SELECT DISTINCT {field} FROM summaries ORDER BY {field}")
+        return [x for x, in rows]
+
+    def query(self, filters=None, group_by=None, metrics=Catalog_Metrics):
+        """
+        Return catalog rows as dicts. `filters` maps catalog fields to
+        the values to keep (anything not mentioned matches). Given
+        `group_by` fields, rows are instead aggregated into one per group
+        with the number of permutations and the mean of each metric.
+        """
+        filters = filters or {}
+        group_by = list(group_by or ())
+        for field in list(filters) + group_by:
+            if field not in Catalog_Fields:
+                raise ValueError(f"unknown catalog field: {field}")
+        for metric in metrics:
+            if metric not in Catalog_Metrics:
+                raise ValueError(f"unknown catalog metric: {metric}")
+        where = []
+        args = []
+        for field, values in filters.items():
+            values = list(values)
+            where.append(f"{field} IN ({', '.join('?' * len(values))})")
+            args.extend(values)
+        if group_by:
+            columns = group_by + ["COUNT(*)"] \
+                    + [f"AVG({x})" for x in metrics]
+            names = group_by + ["permutations"] + list(metrics)
+        else:
+            columns = names = ["perm_idx"] + list(Catalog_Fields) \
+                    + list(metrics) + ["summary_file"]
+        sql = f"SELECT {', '.join(columns)} FROM summaries"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        if group_by:
+            sql += f" GROUP BY {', '.join(group_by)}" \
+                   f" ORDER BY {', '.join(group_by)}"
+        else:
+            sql += " ORDER BY perm_idx"
+        return [dict(zip(names, row))
+                for row in self._conn.execute(sql, args)]
@@ -181,7 +181,8 @@ def load_bot_agents(game,
         attacker_policy=DEFAULTS.attacker_policy,
         attacker_action_picker=DEFAULTS.attacker_action_picker,
         defender_policy=DEFAULTS.defender_policy,
-        defender_action_picker=DEFAULTS.defender_action_picker):
+        defender_action_picker=DEFAULTS.defender_action_picker,
+        env=None):
     agents = []
     for player_id, (policy_name, action_picker) in enumerate(
             [[attacker_policy, attacker_action_picker],
@@ -191,7 +192,8 @@ def load_bot_agents(game,
         name = policy_name
         if action_picker:
             name = '-'.join([policy_name, action_picker])
-        agent = BotAgent(len(arena.Actions), bot, name=policy_name)
+        agent = BotAgent(len(arena.Actions), bot, name=policy_name,
+                env=env)
         agents.append(agent)
     return agents
 
@@ -266,15 +268,16 @@ def main(game_name=DEFAULTS.game,
         "use_timewaits": use_timewaits,
         "use_chance_fail": use_chance_fail,
     })
-    env = rl_environment.Environment(game, include_full_state=True)
+    # the bot agents step on the live environment state rather than a
+    # serialized copy of it
+    env = rl_environment.Environment(game)
     num_actions = env.action_spec()["num_actions"]
     pm = None
     with tf.Session() as sess:
         print(f"Loading RL agents from checkpoint: {checkpoint_pm.path()}")
         rl_agents = load_rl_agents(sess, checkpoint_pm)
         fixed_agents = load_bot_agents(game,
-                detection_costs=detection_costs,
-                advancement_rewards=advancement_rewards,
+                env=env,
                 defender_policy=defender_policy,
                 defender_action_picker=defender_action_picker,
                 attacker_policy=attacker_policy,
@@ -51,6 +51,7 @@ import arena
 import policies, util, std_args
 from arena import debug
 from bot_agent import BotAgent
+from vec_env import VectorEnvironment, BatchedDQN
 
 def_defender_policy = "simple_random"
 def_dp_class = policies.get_policy_class(def_defender_policy)
@@ -100,6 +101,10 @@ class Defaults:
     seed: int = 0
     window_size: int = 30
 
+    # Vectorized environments (1: no vectorization)
+    num_envs: int = 1
+    env_workers: int = 0
+
 DEFAULTS = Defaults()
 
 # For development/debugging; scale all of the default iterations by
@@ -199,7 +204,9 @@ def train(
         replay_buffer_capacity=DEFAULTS.replay_buffer_capacity,
         batch_size=DEFAULTS.batch_size,
         seed=DEFAULTS.seed,
-        window_size=DEFAULTS.window_size
+        window_size=DEFAULTS.window_size,
+        num_envs=DEFAULTS.num_envs,
+        env_workers=DEFAULTS.env_workers,
         ):
   if ITER_SCALE:
       # for development/debugging to save time
@@ -238,6 +245,8 @@ def train(
       "batch_size": batch_size,
       "seed": seed,
       "window_size": window_size,
+      "num_envs": num_envs,
+      "env_workers": env_workers,
   }
   game_params = {
         "advancement_rewards": advancement_rewards,
@@ -272,7 +281,10 @@ def train(
 
   num_players = len(arena.Players)
 
-  env = rl_environment.Environment(game, include_full_state=True)
+  # the bot agents step on the live environment state rather than a
+  # serialized copy of it
+  env = rl_environment.Environment(game)
+  def_agent.env = atk_agent.env = env
   info_state_size = env.observation_spec()["info_state"][0]
   num_actions = env.action_spec()["num_actions"]
 
@@ -320,10 +332,8 @@ def train(
 
     train_log_fh = open(train_log_file, 'w') if train_log_file else None
 
-    for ep in range(num_train_episodes):
-      if (ep + 1) % 100 == 0:
-          print(f"training episodes: {ep + 1}/{num_train_episodes}")
-      if (ep + 1) % eval_every == 0:
+    def _evaluate(ep):
+        nonlocal rolling_value, total_value, total_value_n
         print("evaluating against fixed agents: episode", ep + 1)
         r_mean = eval_against_fixed_bots(env, learning_agents,
                 exploitee_agents, eval_episodes)
@@ -343,6 +353,46 @@ def train(
           print(status_str, file=train_log_fh)
           train_log_fh.flush()
 
+    ep = -1
+    if num_envs > 1:
+      # Play num_envs episodes of each round at a time. Each learning
+      # agent gets its own vectorized environment in which the fixed
+      # agent for the other player moves within the environment, so
+      # actions for all of the games are picked in a single batch.
+      vec_envs = [
+          VectorEnvironment(game, player_id, policy, num_envs,
+              workers=env_workers, seed=seed + player_id)
+          for player_id, policy in enumerate(
+              [defender_policy, attacker_policy])]
+      batched_agents = [BatchedDQN(agent, num_envs)
+          for agent in learning_agents]
+      time_steps = [vec_env.reset() for vec_env in vec_envs]
+      try:
+        while ep + 1 < num_train_episodes:
+          for player_id, vec_env in enumerate(vec_envs):
+            actions = batched_agents[player_id].step(time_steps[player_id])
+            time_steps[player_id] = vec_env.step(actions)
+          # episodes completed in both rounds
+          episodes = min(x.episodes for x in vec_envs)
+          while ep + 1 < min(episodes, num_train_episodes):
+            ep += 1
+            if (ep + 1) % 100 == 0:
+                print(f"training episodes: {ep + 1}/{num_train_episodes}")
+            if (ep + 1) % eval_every == 0:
+              _evaluate(ep)
+            if cp_pm and (ep + 1) % save_every == 0:
+                print("saving checkpoints: episode", ep + 1)
+                _save_checkpoints()
+      finally:
+        for vec_env in vec_envs:
+          vec_env.close()
+
+    for ep in range(ep + 1, num_train_episodes):
+      if (ep + 1) % 100 == 0:
+          print(f"training episodes: {ep + 1}/{num_train_episodes}")
+      if (ep + 1) % eval_every == 0:
+        _evaluate(ep)
+
       # in each round a learning agent goes against a fixed agent for
       # the other player
       agents_round1 = [learning_agents[0], exploitee_agents[1]]
@@ -420,6 +470,10 @@ def main():
             help=f"Seed used for everything. ({DEFAULTS.seed})")
     parser.add_argument("--window_size", default=DEFAULTS.window_size, type=int,
             help=f"Size of window for rolling average. ({DEFAULTS.window_size})")
+    parser.add_argument("--num_envs", default=DEFAULTS.num_envs, type=int,
+            help=f"Number of games per round played side by side, with the DQN agents acting on and learning from all of them in batches. ({DEFAULTS.num_envs})")
+    parser.add_argument("--env_workers", default=DEFAULTS.env_workers, type=int,
+            help=f"With --num_envs, number of subprocesses across which the games are played. ({DEFAULTS.env_workers}, in this process)")
     args = parser.parse_args()
 
     param_values = std_args.handle_std_args(args)
@@ -449,7 +503,9 @@ def main():
         replay_buffer_capacity=args.replay_buffer_capacity,
         batch_size=args.batch_size,
         seed=args.seed,
-        window_size=args.window_size
+        window_size=args.window_size,
+        num_envs=args.num_envs,
+        env_workers=args.env_workers,
     )
 
 
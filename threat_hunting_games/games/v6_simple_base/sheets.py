@@ -129,6 +129,11 @@ class Matrix:
 
 
 class Sheet:
+    """
+    Mean returns of each (defender, attacker) policy pair for one
+    utility structure, along with the number of games each mean was
+    taken over and the half-widths of their confidence intervals.
+    """
 
     def __init__(self, key, json_preamble=None, csv_preamble=None):
         self._key = key
@@ -136,6 +141,9 @@ class Sheet:
         self._csv_preamble = csv_preamble
         self._atk_matrix = Matrix()
         self._def_matrix = Matrix()
+        self._episodes_matrix = Matrix()
+        self._atk_ci_matrix = Matrix()
+        self._def_ci_matrix = Matrix()
         self._rows = {}
         self._col_keys = set()
 
@@ -155,6 +163,25 @@ class Sheet:
     def def_matrix(self):
         return self._def_matrix
 
+    @property
+    def episodes_matrix(self):
+        return self._episodes_matrix
+
+    @property
+    def atk_ci_matrix(self):
+        return self._atk_ci_matrix
+
+    @property
+    def def_ci_matrix(self):
+        return self._def_ci_matrix
+
+    def _stat_matrices(self):
+        return (
+            ("Episodes", self.episodes_matrix),
+            ("Attacker CI Half-Width", self.atk_ci_matrix),
+            ("Defender CI Half-Width", self.def_ci_matrix),
+        )
+
     @property
     def def_policies(self):
         return self.def_matrix.row_keys()
@@ -196,6 +223,11 @@ class Sheet:
         data["defender_rows"] = self.def_matrix.row_labels()
         data["attacker_matrix"] = self.atk_matrix.as_unlabeled_matrix()
         data["defender_matrix"] = self.def_matrix.as_unlabeled_matrix()
+        data["episodes_matrix"] = self.episodes_matrix.as_unlabeled_matrix()
+        data["attacker_ci_matrix"] = \
+                self.atk_ci_matrix.as_unlabeled_matrix()
+        data["defender_ci_matrix"] = \
+                self.def_ci_matrix.as_unlabeled_matrix()
         json.dump(data, fh, indent=2)
 
     def dump_csv(self, writer):
@@ -210,6 +242,11 @@ class Sheet:
         # blank row
         for row in self.def_matrix.as_matrix():
             writer.writerow(row)
+        for label, matrix in self._stat_matrices():
+            writer.writerow([])
+            writer.writerow([label])
+            for row in matrix.as_matrix():
+                writer.writerow(row)
 
     def dump_xlsx(self, xls_sheet):
         # note: does not save the workbook
@@ -247,6 +284,15 @@ class Sheet:
                 cell_name = _cell_name(row_idx, i)
                 xls_sheet[cell_name] = val
             row_idx += 1
+        for label, matrix in self._stat_matrices():
+            row_idx += 1 # blank row
+            xls_sheet[_cell_name(row_idx, 0)] = label
+            row_idx += 1
+            for row in matrix.as_matrix():
+                for i, val in enumerate(row):
+                    cell_name = _cell_name(row_idx, i)
+                    xls_sheet[cell_name] = val
+                row_idx += 1
 
     def __key__(self):
         return self._key
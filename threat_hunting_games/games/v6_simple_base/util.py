@@ -1,28 +1,112 @@
 import os
 import numpy as np
 from datetime import datetime
+from typing import NamedTuple
 from open_spiel.python.bots.policy import PolicyBot
 #from policy_bot import PolicyBot
-import policies
-from arena import debug
+from threat_hunting_games.algorithms import get_all_states, mcts
+try:
+    # for use within the package, e.g. from tests
+    from . import policies
+    from .arena import debug
+except ImportError:
+    # for scripts living in this directory
+    import policies
+    from arena import debug
 
-def get_player_policy(game, player, policy_name, action_picker=None):
+class GameSeeds(NamedTuple):
+    """
+    SeedSequences for the chance draws of one game and for the bots
+    playing it; see game_seeds().
+    """
+    chance: np.random.SeedSequence
+    attacker: np.random.SeedSequence
+    defender: np.random.SeedSequence
+
+# leading spawn key of each stream, so they never coincide
+_CHANCE_STREAM, _ATTACKER_STREAM, _DEFENDER_STREAM = range(3)
+
+def game_seeds(seed, perm_idx, game_idx, crn=False):
+    """
+    Derive the seeds of game `game_idx` of permutation `perm_idx` from
+    the seed of the overall sweep, independent of how the games are
+    split across chunks and worker processes. With common random
+    numbers (`crn`) the seeds leave out the permutation: the same game
+    of every permutation faces the same chance draws, and the bot of
+    each player draws from the same stream, so a policy plays the same
+    way for as long as the game goes the same way.
+    """
+    key = (game_idx,) if crn else (perm_idx, game_idx)
+    return GameSeeds(*(np.random.SeedSequence(seed, spawn_key=(x,) + key)
+        for x in (_CHANCE_STREAM, _ATTACKER_STREAM, _DEFENDER_STREAM)))
+
+def reseed(rng, seed_seq):
+    """
+    Restart the stream of Generator `rng` from `seed_seq` in place, for
+    bots (and their action pickers) that hold on to it across games.
+    """
+    rng.bit_generator.state = type(rng.bit_generator)(seed_seq).state
+
+def get_player_policy(game, player, policy_name, action_picker=None,
+        rng=None):
     """
     kwargs are typically keyword arguments that get passed along into
-    the action picker class
+    the action picker class. Action pickers draw from `rng`, a
+    numpy.random.Generator, if given.
     """
     policy_class = policies.get_policy_class(policy_name)
     if policy_class in (policies.UniformRandomPolicy,
             policies.FirstActionPolicy, policies.LastActionPolicy):
         return policy_class(game)
     else:
-        return policy_class(game, action_picker=action_picker)
+        return policy_class(game, action_picker=action_picker, rng=rng)
+
+# MCTS bots, selected with a policy name of "mcts"
+MCTS_POLICY = "mcts"
+MCTS_SIMULATIONS = 100
+MCTS_UCT_C = 2
+MCTS_MAX_MEMORY_NODES = 100000
+
+def get_mcts_bot(game, player, max_simulations=MCTS_SIMULATIONS,
+        uct_c=MCTS_UCT_C, max_memory_nodes=MCTS_MAX_MEMORY_NODES,
+        batch_size=1, workers=1, rng=None):
+    """
+    An MCTS bot with random rollouts. With explicit chance nodes it
+    keeps its search tree across the moves of a game and pools
+    transpositions by canonical state; when chance is sampled within
+    apply_action() the tree can't tell the hidden draws apart (the
+    same moves may lead to states with other legal actions), so each
+    search starts afresh. Draws from np.random like the policy bots, or from the stream of
+    `rng` (a numpy.random.Generator) if given. See mcts.MCTSBot for
+    `batch_size` (leaves evaluated per round) and `workers` (root
+    parallel searches).
+    """
+    # mcts wants the RandomState interface; this one shares the bit
+    # generator, and so the stream, of rng
+    random_state = np.random if rng is None \
+            else np.random.RandomState(rng.bit_generator)
+    evaluator = mcts.RandomRolloutEvaluator(random_state=random_state)
+    explicit_chance = bool(game.get_parameters().get("explicit_chance"))
+    return mcts.MCTSBot(game, uct_c, max_simulations, evaluator,
+            random_state=random_state, reuse_tree=explicit_chance,
+            transposition_key=get_all_states.canonical_key
+                if explicit_chance else None,
+            max_memory_nodes=max_memory_nodes, batch_size=batch_size,
+            workers=workers)
 
-def get_player_bot(game, player, policy_name, action_picker=None):
+def get_player_bot(game, player, policy_name, action_picker=None,
+        rng=None):
+    """
+    A bot for `policy_name`. Bots draw from np.random (and their
+    action pickers from the module level random as well) unless given
+    `rng`, a numpy.random.Generator, for all of their draws.
+    """
     debug(f"Bot selecting {player} policy: {policy_name}")
+    if policy_name == MCTS_POLICY:
+        return get_mcts_bot(game, player, rng=rng)
     policy = get_player_policy(game, player, policy_name,
-            action_picker=action_picker)
-    bot = PolicyBot(player, np.random, policy)
+            action_picker=action_picker, rng=rng)
+    bot = PolicyBot(player, np.random if rng is None else rng, policy)
     return bot
 
 
@@ -7,6 +7,7 @@ constant sum. (action cost is the opposing players gain)
 
 import sys
 
+from array import array
 from typing import NamedTuple, Mapping, Any, List
 from enum import IntEnum
 from dataclasses import dataclass, field
@@ -58,41 +59,62 @@ game_max_turns = 50
 #game_max_turns = 12
 num_players = len(arena_mod.Players)
 
-_GAME_TYPE = pyspiel.GameType(
-    short_name=game_name,
-    long_name=game_long_name,
-    dynamics=pyspiel.GameType.Dynamics.SEQUENTIAL,
-    chance_mode=pyspiel.GameType.ChanceMode.DETERMINISTIC,
-    information=pyspiel.GameType.Information.PERFECT_INFORMATION,
-    utility=game_utility,
-    # The other option here is REWARDS, which supports model-based
-    # Markov decision processes. (See spiel.h)
-    reward_model=pyspiel.GameType.RewardModel.TERMINAL,
-    # Note again: num_players doesn't count Chance
-    max_num_players=num_players,
-    min_num_players=num_players,
-    provides_information_state_string=True,
-    provides_information_state_tensor=True,
-    provides_observation_string=True,
-    provides_observation_tensor=True,
-    default_loadable=True,
-    provides_factored_observation_string=False,
-    # parameter_specification valid value types (see game_parameters.h)
-    #
-    #  int, float, str, bytes, dict (can embed other dicts)
-    #
-    # tuples, lists, and others don't work
-    parameter_specification={
-        "num_turns": game_max_turns,
-        "advancement_rewards": arena_mod.Default_Advancement_Rewards,
-        "detection_costs": arena_mod.Default_Detection_Costs,
-        "use_waits": int(arena_mod.USE_WAITS),
-        "use_timewaits": int(arena_mod.USE_TIMEWAITS),
-        "use_chance_fail": int(arena_mod.USE_CHANCE_FAIL),
-    }
-)
-
-def make_game_info(num_turns: int) -> pyspiel.GameInfo:
+def make_game_type(
+        chance_mode=pyspiel.GameType.ChanceMode.DETERMINISTIC):
+    # The registered game type is deterministic: by default timewaits
+    # and skirmishes are drawn at random while applying player actions.
+    # Games loaded with explicit_chance instead get an explicitly
+    # stochastic type (see Game).
+    return pyspiel.GameType(
+        short_name=game_name,
+        long_name=game_long_name,
+        dynamics=pyspiel.GameType.Dynamics.SEQUENTIAL,
+        chance_mode=chance_mode,
+        information=pyspiel.GameType.Information.PERFECT_INFORMATION,
+        utility=game_utility,
+        # The other option here is REWARDS, which supports model-based
+        # Markov decision processes. (See spiel.h)
+        reward_model=pyspiel.GameType.RewardModel.TERMINAL,
+        # Note again: num_players doesn't count Chance
+        max_num_players=num_players,
+        min_num_players=num_players,
+        provides_information_state_string=True,
+        provides_information_state_tensor=True,
+        provides_observation_string=True,
+        provides_observation_tensor=True,
+        default_loadable=True,
+        provides_factored_observation_string=False,
+        # parameter_specification valid value types (see game_parameters.h)
+        #
+        #  int, float, str, bytes, dict (can embed other dicts)
+        #
+        # tuples, lists, and others don't work
+        parameter_specification={
+            "num_turns": game_max_turns,
+            "advancement_rewards": arena_mod.Default_Advancement_Rewards,
+            "detection_costs": arena_mod.Default_Detection_Costs,
+            "use_waits": int(arena_mod.USE_WAITS),
+            "use_timewaits": int(arena_mod.USE_TIMEWAITS),
+            "use_chance_fail": int(arena_mod.USE_CHANCE_FAIL),
+            # resolve timewaits and skirmishes with chance nodes rather
+            # than random draws
+            "explicit_chance": 0,
+            # apply forced IN_PROGRESS moves along with the move before
+            # them rather than as nodes of their own
+            "collapse_forced_moves": 0,
+        }
+    )
+
+_GAME_TYPE = make_game_type()
+
+# Chance outcomes are either the number of progress turns of an action
+# (0 through the longest timewait) or whether a detection sweep missed
+# or detected (0 or 1).
+max_chance_outcomes = \
+        max(2, max(x.max for x in arena_mod.Time_Waits.values()) + 1)
+
+def make_game_info(num_turns: int,
+        explicit_chance: bool = False) -> pyspiel.GameInfo:
     # In this constant sum game, each player starts with 30 utility, so
     # max is 60
 
@@ -111,9 +133,15 @@ def make_game_info(num_turns: int) -> pyspiel.GameInfo:
     #  utility_sum: float = 0,
     #  max_game_length: int)
 
+    max_game_length = num_turns
+    if explicit_chance:
+        # at most one progress turns chance node per player action and
+        # one detection chance node per defender action
+        max_game_length += num_turns + num_turns // 2
+
     return pyspiel.GameInfo(
         num_distinct_actions=len(arena_mod.Actions),
-        max_chance_outcomes=0,
+        max_chance_outcomes=max_chance_outcomes if explicit_chance else 0,
         num_players=num_players,
         #min_utility=float(min_utility),
         #max_utility=float(max_utility),
@@ -123,29 +151,188 @@ def make_game_info(num_turns: int) -> pyspiel.GameInfo:
         min_utility=-100,
         max_utility=100,
         utility_sum=0.0,
-        max_game_length=num_turns,
+        max_game_length=max_game_length,
     )
 
 
-@dataclass
+# tri-state flags (None, False, True) are stored as -1, 0, 1; indexing
+# this with the stored value maps it back
+_Tristate = (False, True, None)
+
+def _tristate(value: bool|None) -> int:
+    return -1 if value is None else int(bool(value))
+
+# action ids are the enum values, in order
+_Actions_By_Id = tuple(arena_mod.Actions)
+assert all(int(x) == i for i, x in enumerate(_Actions_By_Id))
+
+
+class ActionHistory:
+    """
+    Compact storage for the (non IN_PROGRESS and IN_PROGRESS) actions
+    taken by a player along with their meta-information. Each field is
+    a column in a typed array, preallocated for `capacity` actions
+    (grown if need be), rather than an object per action. Indexing or
+    iterating yields ActionState views onto a row.
+    """
+    __slots__ = ("arena", "_size", "action", "from_turn",
+            "turns_remaining", "initial_turns", "faulty", "expended")
+
+    def __init__(self, arena: arena_mod.Arena, capacity: int = 0):
+        self.arena = arena
+        self._size = 0
+        self.action = array("b", bytes(capacity))
+        self.from_turn = array("h", bytes(2 * capacity))
+        self.turns_remaining = array("b", bytes(capacity))
+        self.initial_turns = array("b", bytes(capacity))
+        self.faulty = array("b", bytes(capacity))
+        self.expended = array("b", bytes(capacity))
+
+    def _columns(self):
+        return (self.action, self.from_turn, self.turns_remaining,
+                self.initial_turns, self.faulty, self.expended)
+
+    def copy(self) -> "ActionHistory":
+        # the arena is shared, the columns are copied
+        clone = ActionHistory.__new__(ActionHistory)
+        clone.arena = self.arena
+        clone._size = self._size
+        clone.action = self.action[:]
+        clone.from_turn = self.from_turn[:]
+        clone.turns_remaining = self.turns_remaining[:]
+        clone.initial_turns = self.initial_turns[:]
+        clone.faulty = self.faulty[:]
+        clone.expended = self.expended[:]
+        return clone
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __getstate__(self):
+        # only the recorded rows, not the unused capacity
+        size = self._size
+        return (self.arena, size) \
+                + tuple(x[:size].tobytes() for x in self._columns())
+
+    def __setstate__(self, state):
+        self.arena, self._size = state[:2]
+        self.action, self.from_turn, self.turns_remaining, \
+                self.initial_turns, self.faulty, self.expended = \
+                (array(x, data) for x, data
+                        in zip(("b", "h", "b", "b", "b", "b"), state[2:]))
+
+    def append(self, action: arena_mod.Actions, from_turn: int|None = None,
+            faulty: bool|None = None) -> int:
+        """
+        Record a new action, returning its index.
+        """
+        idx = self._size
+        if idx == len(self.action):
+            # out of preallocated space, double it
+            grow = max(idx, 8)
+            for column in self._columns():
+                column.frombytes(bytes(grow * column.itemsize))
+        self.action[idx] = action
+        self.from_turn[idx] = -1 if from_turn is None else from_turn
+        self.turns_remaining[idx] = 0
+        self.initial_turns[idx] = 0
+        self.faulty[idx] = _tristate(faulty)
+        self.expended[idx] = -1
+        self._size += 1
+        return idx
+
+    def extend(self, action: arena_mod.Actions, count: int, from_turn: int,
+            faulty: bool|None = None) -> int:
+        """
+        Record `count` repeats of an action taken every other turn
+        beginning with `from_turn` (the IN_PROGRESS moves skipped over
+        by GameState.skip_in_progress()), returning the index of the
+        last one.
+        """
+        idx = self._size
+        size = idx + count
+        if size > len(self.action):
+            grow = max(size - len(self.action), len(self.action), 8)
+            for column in self._columns():
+                column.frombytes(bytes(grow * column.itemsize))
+        self.action[idx:size] = array("b", [action]) * count
+        self.from_turn[idx:size] = \
+                array("h", range(from_turn, from_turn + 2 * count, 2))
+        self.turns_remaining[idx:size] = array("b", bytes(count))
+        self.initial_turns[idx:size] = array("b", bytes(count))
+        self.faulty[idx:size] = array("b", [_tristate(faulty)]) * count
+        self.expended[idx:size] = array("b", [-1]) * count
+        self._size = size
+        return size - 1
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return bool(self._size)
+
+    def __getitem__(self, idx: int) -> "ActionState":
+        if idx < 0:
+            idx += self._size
+        if not 0 <= idx < self._size:
+            raise IndexError("action history index out of range")
+        return ActionState(self, idx)
+
+    def __iter__(self):
+        for idx in range(self._size):
+            yield ActionState(self, idx)
+
+
 class ActionState:
     """
-    Class for storing a particular (non IN_PDROGRESS) action along with
-    some meta-information -- used for storing action histories within
-    AttackerState and DefenderState.
+    Class for accessing a particular (non IN_PDROGRESS) action along
+    with some meta-information -- a lightweight view onto one row of
+    an ActionHistory, which is what is stored within AttackerState and
+    DefenderState.
     """
-    arena: arena_mod.Arena
-    action: arena_mod.Actions|None = None
-    from_turn: int|None = None
-    turns_remaining: int = 0
-    initial_turns: int = 0
-    faulty: bool|None = None
-    expended: bool|None = None
+    __slots__ = ("_history", "_idx")
+
+    def __init__(self, history: ActionHistory, idx: int):
+        self._history = history
+        self._idx = idx
+
+    @property
+    def arena(self) -> arena_mod.Arena:
+        return self._history.arena
+
+    @property
+    def action(self) -> arena_mod.Actions:
+        return _Actions_By_Id[self._history.action[self._idx]]
+
+    @property
+    def from_turn(self) -> int|None:
+        from_turn = self._history.from_turn[self._idx]
+        return None if from_turn < 0 else from_turn
+
+    @property
+    def turns_remaining(self) -> int:
+        return self._history.turns_remaining[self._idx]
+
+    @property
+    def initial_turns(self) -> int:
+        return self._history.initial_turns[self._idx]
+
+    @property
+    def faulty(self) -> bool|None:
+        return _Tristate[self._history.faulty[self._idx]]
+
+    @faulty.setter
+    def faulty(self, faulty: bool|None):
+        self._history.faulty[self._idx] = _tristate(faulty)
+
+    @property
+    def expended(self) -> bool|None:
+        return _Tristate[self._history.expended[self._idx]]
 
     @property
     def in_progress(self) -> bool:
         # even faulty actions have to complete their progress sequence
-        return self.turns_remaining > 0
+        return self._history.turns_remaining[self._idx] > 0
 
     @property
     def completed(self) -> bool:
@@ -159,19 +346,27 @@ class ActionState:
     def primed(self) -> bool:
         return not self.in_progress and not self.faulty and not self.expended
 
-    def take_turn(self):
-        assert self.in_progress, "no turns to take"
-        self.turns_remaining -= 1
+    def take_turn(self, turns: int = 1):
+        assert self.turns_remaining >= turns, "no turns to take"
+        self._history.turns_remaining[self._idx] -= turns
 
     def set_turns(self, turns: int):
         assert turns >= 0, "turn count must be >= 0"
         assert turns <= self.arena.get_timewait(self.action).max, \
                 f"turn count for {self.arena.a2s(self.action)} must be <= {self.arena.get_timewait(self.action).max}: {turns}"
-        self.initial_turns = turns
-        self.turns_remaining = turns
+        self._history.initial_turns[self._idx] = turns
+        self._history.turns_remaining[self._idx] = turns
 
     def expend(self):
-        self.expended = True
+        self._history.expended[self._idx] = 1
+
+    def __eq__(self, other):
+        if not isinstance(other, ActionState):
+            return NotImplemented
+        return self._history is other._history and self._idx == other._idx
+
+    def __hash__(self):
+        return hash((id(self._history), self._idx))
 
     def __str__(self):
         return f"[ from turn: {self.from_turn} turns left: {self.turns_remaining} action: {self.arena.a2s(self.action)} ]"
@@ -185,18 +380,60 @@ class BasePlayerState:
     IN_PROGRESS and excluding the last action if it is still in
     progress. And "asserted" means the same thing but includes the last
     action even if it is still in progress.
+
+    Asserted and completed ActionStates are indexed as they are recorded
+    and resolved so that none of the properties below have to rescan
+    the full history. This relies on a new action only being taken once
+    the prior one has completed (i.e. IN_PROGRESS is the only legal
+    action while an action is in progress) and on progress turns only
+    being changed via set_turns() and take_turn() below.
+
+    The per-turn utility histories are kept in compact int arrays as
+    well; `max_actions` is how many actions (including IN_PROGRESS) the
+    action history is initially sized for.
     """
     arena: arena_mod.Arena
     utility: int = 0
-    history: list[ActionState] = field(default_factory=list)
+    history: ActionHistory = None
     available_actions: list[arena_mod.Actions] = field(default_factory=list)
-    costs: list[int] = field(default_factory=list)
-    rewards: list[int] = field(default_factory=list)
-    damages: list[int] = field(default_factory=list)
-    utilities: list[int] = field(default_factory=list)
+    costs: array = field(default_factory=lambda: array("i"))
+    rewards: array = field(default_factory=lambda: array("i"))
+    damages: array = field(default_factory=lambda: array("i"))
+    utilities: array = field(default_factory=lambda: array("i"))
     curr_turn: int = 0
     player_id: int = None
     player: str = None
+    max_actions: int = 0
+    # history indices of non-IN_PROGRESS actions, in order of selection
+    _asserted: list[int] = \
+            field(default_factory=list, init=False, repr=False)
+    # history indices of actions that have completed their progress
+    # turns, in order of completion (which is also their order of
+    # selection)
+    _completed: list[int] = \
+            field(default_factory=list, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.history is None:
+            self.history = ActionHistory(self.arena,
+                    capacity=self.max_actions)
+
+    def __deepcopy__(self, memo):
+        # Structural copy for GameState.clone(): the arena is shared,
+        # immutable fields (ints, strs, tuples of actions) are shared,
+        # and the histories are copied.
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.history = self.history.copy()
+        if isinstance(self.available_actions, list):
+            clone.available_actions = list(self.available_actions)
+        clone.costs = self.costs[:]
+        clone.rewards = self.rewards[:]
+        clone.damages = self.damages[:]
+        clone.utilities = self.utilities[:]
+        clone._asserted = self._asserted[:]
+        clone._completed = self._completed[:]
+        return clone
 
     @property
     def action_history(self) -> tuple[arena_mod.Actions]:
@@ -206,26 +443,28 @@ class BasePlayerState:
     def asserted_history(self) -> tuple[ActionState]:
         # Return all ActionStates excluding IN_PROGRESS actions,
         # including the last state even if it is still in progress.
-        history = self.history if self.history else []
-        return (x for x in history if x.action != \
-                self.arena.actions.IN_PROGRESS)
+        return (self.history[x] for x in self._asserted)
 
     @property
     def completed_history(self) -> tuple[ActionState]:
         # Return all ActionStates excluding IN_PROGRESS actions. Also
         # exclude the last non-IN_PROGRESS ActionState if it is still in
-        # progress.
-        if self.history and \
-                self.history[-1].action == self.arena.actions.IN_PROGRESS:
-            history = list(self.history)
-            while history and \
-                    (history[-1].action == self.arena.actions.IN_PROGRESS
-                            or history[-1].in_progress):
-                history.pop()
-        else:
-            history = self.history
-        return (x for x in history if x.action != \
-                self.arena.actions.IN_PROGRESS)
+        # progress -- unless that action was selected this very turn,
+        # i.e. it has not been followed by any IN_PROGRESS actions yet.
+        history = self.history
+        for idx in self._completed:
+            yield history[idx]
+        if self._asserted and self._asserted[-1] == len(history) - 1:
+            last = history[-1]
+            if last.in_progress:
+                yield last
+
+    @property
+    def detectable_history(self) -> tuple[ActionState]:
+        # Return the completed_history ActionStates that were not
+        # faulty. Expended states are included: a detection can still
+        # uncover an attack action that has already paid off.
+        return (x for x in self.completed_history if not x.faulty)
 
     @property
     def last_state(self) -> ActionState|None:
@@ -236,36 +475,21 @@ class BasePlayerState:
     def last_asserted_state(self) -> ActionState|None:
         # Return the just the last ActionState excluding IN_PROGRESS but
         # including the last ActionState if it is still in progress.
-        last = None
-        if self.history:
-            try:
-                idx = -1
-                while True:
-                    last = self.history[idx]
-                    idx -= 1
-                    if last.action != self.arena.actions.IN_PROGRESS:
-                        break
-            except IndexError:
-                pass
-        return last
+        if self._asserted:
+            return self.history[self._asserted[-1]]
+        # only IN_PROGRESS actions (if any) so far; falls back to the
+        # first of them as scanning history used to
+        return self.history[0] if self.history else None
 
     @property
     def last_completed_state(self) -> ActionState|None:
         # Return the just the last ActionState excluding IN_PROGRESS and
         # the last ActionState if it is still in progress.
-        last = None
-        if self.history:
-            try:
-                idx = -1
-                while True:
-                    last = self.history[idx]
-                    idx -= 1
-                    if last.action != self.arena.actions.IN_PROGRESS \
-                            and last.completed:
-                        break
-            except IndexError:
-                pass
-        return last
+        if self._completed:
+            return self.history[self._completed[-1]]
+        # nothing has completed yet; note this is the first action
+        # even while it is still in progress
+        return self.history[0] if self.history else None
 
     @property
     def state(self) -> ActionState|None:
@@ -300,15 +524,45 @@ class BasePlayerState:
         self.utilities.append(0)
 
     def record_action(self, action: arena_mod.Actions):
-        # create action_state, maintain history
+        # maintain history
         if action in self.arena.noop_actions:
             # no-op actions are never faulty
-            action_state = ActionState(self.arena, action,
-                    self.curr_turn, faulty=False)
+            idx = self.history.append(action, self.curr_turn, faulty=False)
         else:
             # but completed actions can be faulty
-            action_state = ActionState(self.arena, action, self.curr_turn)
-        self.history.append(action_state)
+            idx = self.history.append(action, self.curr_turn)
+        if action != self.arena.actions.IN_PROGRESS:
+            self._asserted.append(idx)
+
+    def set_turns(self, turns: int):
+        # set the progress turns of the action that was just selected
+        action_state = self.last_asserted_state
+        action_state.set_turns(turns)
+        if action_state.completed:
+            self._completed.append(self._asserted[-1])
+
+    def take_turn(self):
+        # count down the progress turns of the current action
+        action_state = self.last_asserted_state
+        if action_state.in_progress:
+            action_state.take_turn()
+            if action_state.completed:
+                self._completed.append(self._asserted[-1])
+        else:
+            debug(f"{self.player} WHOOPS TAKING TURN!")
+
+    def skip_turns(self, count: int):
+        # `count` IN_PROGRESS moves at once, the last of which may
+        # complete the action in progress; resolving the action is up
+        # to the caller (see GameState.skip_in_progress())
+        action_state = self.last_asserted_state
+        # each move is two turns after the last one
+        self.history.extend(self.arena.actions.IN_PROGRESS, count,
+                self.curr_turn + 2, faulty=False)
+        self.curr_turn += 2 * count
+        action_state.take_turn(count)
+        if action_state.completed:
+            self._completed.append(self._asserted[-1])
 
     def increment_cost(self, inc):
         inc = abs(inc)
@@ -332,6 +586,32 @@ class BasePlayerState:
     def record_utility(self):
         self.utilities[-1] = self.utility
 
+    def canonical_key(self) -> tuple:
+        """
+        Everything about this player that can influence the rest of the
+        game (see GameState.canonical_key()): utility, available
+        actions, the action in progress and the action that would be
+        resolved against the other player next. The rest of the
+        history doesn't matter.
+        """
+        history = self.history
+        asserted = last_asserted = None
+        if history:
+            last_asserted = self.last_asserted_state
+            asserted = (int(last_asserted.action),
+                    last_asserted.turns_remaining, last_asserted.faulty,
+                    last_asserted.expended,
+                    # completed_history peeks at an action selected
+                    # this very turn
+                    bool(self._asserted)
+                        and self._asserted[-1] == len(history) - 1)
+        completed = None
+        if history and self.state != last_asserted:
+            state = self.state
+            completed = (int(state.action), state.faulty, state.expended)
+        return (self.utility, tuple(int(x) for x in self.available_actions),
+                asserted, completed)
+
     def legal_actions(self):
         raise NotImplementedError()
 
@@ -358,6 +638,13 @@ class AttackerState(BasePlayerState):
         self.state_pos += 1
         self.available_actions = self.legal_actions()
 
+    def canonical_key(self) -> tuple:
+        # plus what the defender sweep gets to look at; each detectable
+        # action gets its own chance at being detected, so it's a
+        # multiset rather than a set
+        return super().canonical_key() + (self.state_pos,
+                tuple(sorted(int(x.action) for x in self.detectable_history)))
+
     def legal_actions(self):
         #return [x for x in arena.Atk_Actions_By_Pos[self.state_pos]
         #        if arena.action_cost(x) <= self.utility]
@@ -367,9 +654,12 @@ class AttackerState(BasePlayerState):
             actions = self.arena.atk_actions_by_pos[self.state_pos]
         return actions
 
-    def advance(self, action: arena_mod.Actions, game_state: pyspiel.State):
+    def advance(self, action: arena_mod.Actions, game_state: pyspiel.State,
+            turn_cnt: int|None = None):
         """
-        Attacker attempts to make their move.
+        Attacker attempts to make their move. The progress turns of a
+        newly selected action are drawn from its timewait unless given
+        as `turn_cnt` (by a chance node).
         """
 
         self.curr_turn = 2 * len(self.history) + 1
@@ -402,10 +692,7 @@ class AttackerState(BasePlayerState):
         if action == self.arena.actions.IN_PROGRESS:
             # still in the progress sequence of a completed action;
             # possibly conclude that action and reset available actions
-            if self.last_asserted_state.in_progress:
-                self.last_asserted_state.take_turn()
-            else:
-                debug(f"{self.player} WHOOPS TAKING TURN!")
+            self.take_turn()
             if self.last_asserted_state.completed:
                 # time to resolve the action that triggered this
                 # IN_PROGRESS sequence
@@ -419,8 +706,11 @@ class AttackerState(BasePlayerState):
             # defender until the progress turns are complete.
 
             # limit actions to just IN_PROGRESS for turn_cnt turns
-            turn_cnt = self.arena.get_timewait(action).rand_turns()
-            self.last_asserted_state.set_turns(turn_cnt)
+            if turn_cnt is None:
+                rng = game_state.turns_rng(self.player_id) \
+                        if game_state is not None else None
+                turn_cnt = self.arena.get_timewait(action).rand_turns(rng)
+            self.set_turns(turn_cnt)
             if self.last_asserted_state.completed:
                 # don't currently have any actions besides WAIT that
                 # have turn_cnt == 0, but there could be if there are
@@ -444,7 +734,13 @@ class DefenderState(BasePlayerState):
         actions = self.arena.player_actions[self.player_id]
         return actions
 
-    def detect(self, action: arena_mod.Actions, game_state: pyspiel.State):
+    def detect(self, action: arena_mod.Actions, game_state: pyspiel.State,
+            turn_cnt: int|None = None):
+        """
+        Defender selects or continues a detect action. As with
+        AttackerState.advance(), `turn_cnt` is the outcome of a chance
+        node if given.
+        """
 
         if not self.available_actions:
             self.available_actions = self.arena.defend_actions
@@ -474,10 +770,7 @@ class DefenderState(BasePlayerState):
         if action == self.arena.actions.IN_PROGRESS:
             # still in progress sequence
             #debug("defend progress:", self.progress)
-            if self.last_asserted_state.in_progress:
-                self.last_asserted_state.take_turn()
-            else:
-                debug(f"{self.player} WHOOPS TAKING TURN!")
+            self.take_turn()
             if self.last_asserted_state.completed:
                 _resolve_action()
         else:
@@ -488,8 +781,11 @@ class DefenderState(BasePlayerState):
             # turns; this initiating action does not (potentially)
             # detect an attacker action until the progress turns are
             # complete.
-            turn_cnt = self.arena.get_timewait(action).rand_turns()
-            self.last_asserted_state.set_turns(turn_cnt)
+            if turn_cnt is None:
+                rng = game_state.turns_rng(self.player_id) \
+                        if game_state is not None else None
+                turn_cnt = self.arena.get_timewait(action).rand_turns(rng)
+            self.set_turns(turn_cnt)
             if self.last_asserted_state.completed:
                 # don't currently have any actions besides WAIT that
                 # have turn_cnt == 0
@@ -500,18 +796,66 @@ class DefenderState(BasePlayerState):
                 debug(f"{self.player} (turn {self.curr_turn}): will resolve {self.arena.a2s(action)} in turn {self.curr_turn + 2*turn_cnt} after {turn_cnt} {self.arena.a2s(self.arena.actions.IN_PROGRESS)} actions")
 
 
+class _ChanceStreams:
+    """
+    The random streams of a GameState, Generators derived from the
+    numpy.random.SeedSequence it was given: one for the progress turns
+    of each player and one for skirmishes. Keeping them apart lines up
+    the draws of games with common random numbers, e.g. the attacker's
+    third action takes the third draw of the attacker's stream whatever
+    the defender did in the meantime. Without a SeedSequence all of
+    them are None, for the module level random.
+
+    Clones get copies of the streams, carrying on from where the
+    original state is without drawing from its own streams: a rollout
+    of a search leaves the draws of the game it was cloned from, and so
+    its common random numbers, as they were.
+    """
+    __slots__ = ("turns", "skirmish")
+
+    def __init__(self, seed_seq=None):
+        if seed_seq is None:
+            self.turns = { x: None for x in arena_mod.Players }
+            self.skirmish = None
+        else:
+            # the children SeedSequence.spawn() would give, without
+            # counting them as spawned, so the same seed_seq always
+            # gives the same streams
+            atk_rng, def_rng, self.skirmish = (
+                np.random.default_rng(np.random.SeedSequence(
+                    seed_seq.entropy, spawn_key=seed_seq.spawn_key + (i,),
+                    pool_size=seed_seq.pool_size))
+                for i in range(3))
+            self.turns = {
+                arena_mod.Players.ATTACKER: atk_rng,
+                arena_mod.Players.DEFENDER: def_rng,
+            }
+
+
 # pylint: disable=too-few-public-methods
 class GameState(pyspiel.State):
     """Game state, and also action resolution for some reason."""
 
-    def __init__(self, game, game_info, game_arena=None):
-        assert not (game_info.max_game_length % 2), \
-            "game length must have even number of turns"
+    def __init__(self, game, game_info, game_arena=None, seed_seq=None):
+        """
+        Timewaits and skirmishes are drawn from streams seeded by
+        `seed_seq`, a numpy.random.SeedSequence, if given, otherwise
+        from the module level random.
+        """
         super().__init__(game)
+        self._chance_streams = _ChanceStreams(seed_seq)
         game_params = game.get_parameters()
         self._num_turns = game_params["num_turns"]
+        assert not (self._num_turns % 2), \
+            "game length must have even number of turns"
+        self._explicit_chance = bool(game_params["explicit_chance"])
+        self._collapse_forced_moves = \
+                bool(game_params["collapse_forced_moves"])
+        # with collapse_forced_moves, the number of IN_PROGRESS moves
+        # applied along with each move in history()
+        self._collapsed = []
         if not game_arena:
-            game_arena = arena_mod.Arena(
+            game_arena = arena_mod.get_arena(
                     advancement_rewards=game_params["advancement_rewards"],
                     detection_costs=game_params["detection_costs"],
                     use_waits=bool(game_params["use_waits"]),
@@ -525,8 +869,12 @@ class GameState(pyspiel.State):
         # GameState._legal_actions gets called before available actions
         # can be popuated in AttackerState and DefenderState...so
         # initiaize available actions here.
-        self._attacker = AttackerState(arena=self._arena)
-        self._defender = DefenderState(arena=self._arena)
+        # each player moves every other turn
+        max_actions = self._num_turns // 2
+        self._attacker = AttackerState(arena=self._arena,
+                max_actions=max_actions)
+        self._defender = DefenderState(arena=self._arena,
+                max_actions=max_actions)
 
         # attacker always moves first
         self._current_player = self._arena.players.ATTACKER
@@ -536,13 +884,13 @@ class GameState(pyspiel.State):
         # of this will become more clear when we start building
         # harnesses around the game that actually create and use
         # observers
-        self._info_vec = np.zeros((self._num_turns,), int)
+        self._info_vec = np.zeros((self._num_turns,), np.int8)
         self._attack_vec = self._info_vec
 
         # this wasn't asked for; but we could also track things like
         # detect history, utility history, etc, if any of that might be
         # useful for determining future actions
-        self._defend_vec = np.zeros((self._num_turns,), int)
+        self._defend_vec = np.zeros((self._num_turns,), np.int8)
 
         # A few variables are used in the sample games both to
         # control game state and in assertions to document
@@ -554,6 +902,13 @@ class GameState(pyspiel.State):
         # game should terminate.
         self._game_over = False
 
+        # With explicit_chance, the pending chance node if any: either
+        # ("turns", action) for the progress turns of an action the
+        # current player just selected (the move is applied along with
+        # the outcome), or ("detect", pct_miss) for the detection sweep
+        # of the defender move just applied.
+        self._chance = None
+
         # If this were a stochastic game, _is_chance would used in
         # _apply_action (maybe elsewhere?) by convention, to determine
         # whether the chance player is expected to act. AIUI, all
@@ -570,6 +925,11 @@ class GameState(pyspiel.State):
     def arena(self):
         return self._arena
 
+    def turns_rng(self, player):
+        # the stream for the progress turns of the player, or None for
+        # the module level random
+        return self._chance_streams.turns[player]
+
     @property
     def attacker_state(self):
         return self._attacker
@@ -590,6 +950,8 @@ class GameState(pyspiel.State):
         """
         if self._game_over:
             return pyspiel.PlayerId.TERMINAL
+        elif self._chance:
+            return pyspiel.PlayerId.CHANCE
         else:
             return self._current_player
 
@@ -631,7 +993,7 @@ class GameState(pyspiel.State):
                     else self._arena.defend_actions
             case _:
                 raise ValueError(f"undefined player: {player}")
-        if not (actions and \
+        if arena_mod.DEBUG and not (actions and \
                 list(actions) == [self._arena.actions.IN_PROGRESS]) \
                     and self._curr_turn not in self._turns_seen:
             debug(f"\n{self.arena.p2s(self.current_player())} (turn {self._curr_turn+1}): legal actions: {', '.join([self.arena.a2s(x) for x in actions])}")
@@ -660,17 +1022,52 @@ class GameState(pyspiel.State):
 
         raise NotImplementedError()
 
+    def chance_outcomes(self):
+        """
+        Outcomes of the pending chance node (explicit_chance only) as
+        (outcome, probability) pairs: the number of progress turns of
+        the action just selected, uniform over its timewait, or whether
+        the detection sweep missed (0) or detected (1) an attack action.
+        """
+        assert self._chance, "not a chance node"
+        kind, data = self._chance
+        if kind == "turns":
+            timewait = self._arena.get_timewait(data)
+            prob = 1 / (timewait.max - timewait.min + 1)
+            return [(x, prob) for x in range(timewait.min, timewait.max + 1)]
+        return [(0, data), (1, 1 - data)]
+
     def _apply_action(self, action):
         """
         Apply the actions of a single player in sequential-move
         games. In all stochastic games, _apply_action is called to
-        resolve the actions of the chance player. Not used here, but
-        shown for reference.
+        resolve the actions of the chance player, which only happens
+        here with explicit_chance. With collapse_forced_moves, the
+        IN_PROGRESS moves that are then the only legal action are
+        applied as well (see skip_in_progress()), so every node of the
+        game tree is a decision or a chance node.
         """
+        self._apply_one(action)
+        if self._collapse_forced_moves:
+            self._collapsed.append(self.skip_in_progress())
+
+    def _apply_one(self, action):
+        # apply a single player move or chance outcome
+        if self._chance:
+            kind, data = self._chance
+            self._chance = None
+            if kind == "turns":
+                debug(f"{self._arena.p2s(self._current_player)}: {self._arena.a2s(data)} takes {action} turns")
+                self._apply_move(data, turn_cnt=action)
+            else:
+                self._resolve_detection(bool(action))
+            return
 
         #if action != self._arena.actions.IN_PROGRESS:
         debug(f"{self._arena.p2s(self.current_player())}: apply action {self._arena.a2s(action)} now in turn {self._curr_turn+1}")
-        debug([len(self.history()), self.history()])
+        if arena_mod.DEBUG:
+            # history() is a copy, skip building it when not debugging
+            debug([len(self.history()), self.history()])
 
         # Asserted as invariant in sample games:
         # assert self._is_chance and not self._game_over
@@ -679,6 +1076,21 @@ class GameState(pyspiel.State):
         # convert from int to actual Action
         action = self._arena.actions(action)
 
+        if self._explicit_chance \
+                and action != self._arena.actions.IN_PROGRESS:
+            timewait = self._arena.get_timewait(action)
+            if timewait.min != timewait.max:
+                # the move waits on its progress turns
+                self._chance = ("turns", action)
+                return
+            self._apply_move(action, turn_cnt=timewait.min)
+        else:
+            self._apply_move(action)
+
+    def _apply_move(self, action, turn_cnt=None):
+        # apply a player action, with its progress turns if already
+        # determined by a chance node
+
         # _curr_turn is 0-based; this value is for display purposes
         dsp_turn = self._curr_turn + 1
 
@@ -694,7 +1106,7 @@ class GameState(pyspiel.State):
             # defender still has a chance to detect. Game will not
             # terminate here by reaching self._num_turns either because
             # defender always gets the last action.
-            self._attacker.advance(action, self)
+            self._attacker.advance(action, self, turn_cnt=turn_cnt)
             cost = self._arena.utilities.action_cost(action)
             self._attacker.increment_cost(cost)
             if USE_ZSUM:
@@ -715,7 +1127,7 @@ class GameState(pyspiel.State):
 
         # register cost of action, add to history, initiate IN_PROGRESS
         # sequences, etc
-        self._defender.detect(action, self)
+        self._defender.detect(action, self, turn_cnt=turn_cnt)
 
         self._defend_vec[self._curr_turn] = action
         #debug(f"DEFEND({self._curr_turn}): {self._defend_vec}")
@@ -725,9 +1137,18 @@ class GameState(pyspiel.State):
         if USE_ZSUM:
             self._attacker.increment_reward(cost)
 
-        # All completed attack action states -- does not include last
-        # state if it is still in progress.
-        attack_action_states = list(self._attacker.completed_history)
+        if self._explicit_chance:
+            pct_miss = self._detection_pct_miss()
+            if 0 < pct_miss < 1:
+                # the sweep is up to chance
+                self._chance = ("detect", pct_miss)
+                return
+            self._resolve_detection(not pct_miss)
+            return
+
+        # All completed (non-faulty) attack action states -- does not
+        # include last state if it is still in progress.
+        attack_action_states = self._attacker.detectable_history
 
         detected = False
         atk_action = None
@@ -747,27 +1168,10 @@ class GameState(pyspiel.State):
                     continue
                 # attack action was not faulty and is not still in progress
                 attack_action = attack_action_state.action
-                if self._arena.action_succeeds(defend_action, attack_action):
+                if self._arena.action_succeeds(defend_action, attack_action,
+                        rng=self._chance_streams.skirmish):
                     # attack action is *actually* detected by the
-                    # current defend action; defender gets reward,
-                    # attacker takes damage
-                    if self._arena.use_defender_clawback:
-                        # it could be interesting for the defender to
-                        # regain all of the damage it took up until the
-                        # latest attacker stage -- the way these work at
-                        # the moment is to regain the damage from just
-                        # the attack action that was detected.
-                        reward = \
-                            self._arena.utilities.defend_reward(defend_action)
-                        damage = \
-                            self._arena.utilities.defend_damage(defend_action)
-                    else:
-                        # no damage is regained by defender, no rewards
-                        # are lost by attacker
-                        reward = 0
-                        damage = 0
-                    dmg = self._attacker.increment_damage(damage)
-                    self._defender.increment_reward(dmg)
+                    # current defend action
                     detected = True
                     # atk_action is merely used for debug
                     # statements below
@@ -778,6 +1182,44 @@ class GameState(pyspiel.State):
                     # detected the attack action, but failed, we
                     # continue sweeping the attack action history.
                     pass
+        self._resolve_detection(detected, atk_action=atk_action)
+
+    def _detection_pct_miss(self):
+        # probability that the sweep in _apply_move() detects none of
+        # the attack actions, each of which gets its own draw
+        if not self._defender.state.primed:
+            return 1.0
+        defend_action = self._defender.state.action
+        pct_miss = 1.0
+        for attack_action_state in self._attacker.detectable_history:
+            pct_miss *= 1 - self._arena.action_success_pct(
+                    defend_action, attack_action_state.action)
+        return pct_miss
+
+    def _resolve_detection(self, detected, atk_action=None):
+        # conclude the defender move given the outcome of its detection
+        # sweep, the attacker's pending action pays off if undetected
+        dsp_turn = self._curr_turn + 1
+        defend_action = self._defender.state.action
+        if detected:
+            # defender gets reward, attacker takes damage
+            if self._arena.use_defender_clawback:
+                # it could be interesting for the defender to
+                # regain all of the damage it took up until the
+                # latest attacker stage -- the way these work at
+                # the moment is to regain the damage from just
+                # the attack action that was detected.
+                reward = \
+                    self._arena.utilities.defend_reward(defend_action)
+                damage = \
+                    self._arena.utilities.defend_damage(defend_action)
+            else:
+                # no damage is regained by defender, no rewards
+                # are lost by attacker
+                reward = 0
+                damage = 0
+            dmg = self._attacker.increment_damage(damage)
+            self._defender.increment_reward(dmg)
         # this defend action is spent
         self._defender.state.expend()
 
@@ -824,6 +1266,114 @@ class GameState(pyspiel.State):
             debug(f"{self.arena.p2s(self.arena.players.DEFENDER)} util history:", self._defender.utilities)
             debug(f"{self.arena.p2s(self.arena.players.ATTACKER)} util history:", self._attacker.utilities)
 
+    def _turns_to_skip(self) -> int:
+        # The number of moves from here on that are nothing but
+        # IN_PROGRESS: the mover has no other legal action and, on
+        # defender moves, the defend action does not complete (and
+        # sweep) on the move and neither player has a primed action to
+        # resolve. An attack action completing on an attacker move does
+        # nothing until the following defender move resolves it, which
+        # ends the stretch. The final turn of the game is never
+        # skipped.
+        if self._game_over or self._chance:
+            return 0
+        in_progress = (self._arena.actions.IN_PROGRESS,)
+        remaining = [0, 0]
+        for player_state in (self._attacker, self._defender):
+            if tuple(player_state.available_actions) == in_progress:
+                remaining[player_state.player_id] = \
+                        player_state.last_asserted_state.turns_remaining
+        if not any(remaining):
+            return 0
+        primed = any(x.state and x.state.primed
+                for x in (self._attacker, self._defender))
+        attacker = self._arena.players.ATTACKER
+        player = self._current_player
+        turn = self._curr_turn
+        count = 0
+        while remaining[player]:
+            if player == attacker:
+                # (possibly not if faulty, but either way the defender
+                # move goes by the book)
+                primed = primed or remaining[player] == 1
+            elif remaining[player] == 1 or primed \
+                    or turn + 1 >= self._num_turns:
+                break
+            remaining[player] -= 1
+            count += 1
+            turn += 1
+            player = 1 - player
+        return count
+
+    def _skip_turns(self, count: int):
+        # apply the next `count` moves, as found by _turns_to_skip(), in
+        # bulk: just the bookkeeping of IN_PROGRESS moves
+        attacker = self._arena.players.ATTACKER
+        first = self._curr_turn
+        turns = range(first, first + count)
+        # every other turn is the attacker's, starting with the current
+        # player
+        atk_first = first if self._current_player == attacker else first + 1
+        atk_count = len(range(atk_first, first + count, 2))
+        def_count = count - atk_count
+        if atk_count:
+            self._attacker.skip_turns(atk_count)
+            self._attack_vec[atk_first:first + count:2] = \
+                    self._arena.actions.IN_PROGRESS
+        if def_count:
+            self._defender.skip_turns(def_count)
+            def_first = first + 1 if atk_first == first else first
+            self._defend_vec[def_first:first + count:2] = \
+                    self._arena.actions.IN_PROGRESS
+            # as in _resolve_detection(), which expends the completed
+            # defend action, if any, on every defender move
+            self._defender.state.expend()
+        zeros = array("i", bytes(4 * count))
+        for player_state in (self._attacker, self._defender):
+            player_state.costs.extend(zeros)
+            player_state.rewards.extend(zeros)
+            player_state.damages.extend(zeros)
+            # utilities are recorded on defender moves, attacker moves
+            # leave theirs at zero
+            utility = player_state.utility
+            player_state.utilities.extend(array("i",
+                    (0 if (x - atk_first) % 2 == 0 else utility
+                        for x in turns)))
+        self._curr_turn += count
+        if count % 2:
+            self._current_player = \
+                    self._arena.players(1 - self._current_player)
+
+    def skip_in_progress(self) -> int:
+        """
+        Apply IN_PROGRESS moves for as long as they are the only legal
+        action, up to the next decision of either player (or the end of
+        the game). Stretches of moves on which nothing can happen are
+        jumped over in one step: the turns up to the next one on which
+        a defend action completes and sweeps the attack history or a
+        completed attack action is resolved. The moves on which those
+        happen are applied as usual, random draws and all, so the state
+        ends up just as if each IN_PROGRESS move had been applied in
+        turn. Returns the number of moves applied.
+
+        The moves bypass apply_action(), so they are missing from
+        history(); whoever skips them has to keep the history (see
+        event_sim.play_game() and full_history()).
+        """
+        in_progress = (self._arena.actions.IN_PROGRESS,)
+        players = (self._attacker, self._defender)
+        skipped = 0
+        while not self._game_over and not self._chance \
+                and tuple(players[self._current_player].available_actions) \
+                    == in_progress:
+            count = self._turns_to_skip()
+            if count:
+                self._skip_turns(count)
+            else:
+                count = 1
+                self._apply_move(self._arena.actions.IN_PROGRESS)
+            skipped += count
+        return skipped
 
     ### Not sure if these methods are required, but they are
     ### implemented in sample games. We should probably do some
@@ -832,6 +1382,10 @@ class GameState(pyspiel.State):
     def _action_to_string(self, player, action):
         """Convert an action to a string representation, presumably
         for logging."""
+        if player == pyspiel.PlayerId.CHANCE:
+            if self._chance and self._chance[0] == "detect":
+                return f"Chance: {'Detected' if action else 'Missed'}"
+            return f"Chance: {action} Turns"
         player_str = self._arena.player_to_str(player)
         action_str = self._arena.action_to_str(action)
         return f"{player_str}: {action_str}"
@@ -850,6 +1404,22 @@ class GameState(pyspiel.State):
         far."""
         return [self._attacker.utility, self._defender.utility]
 
+    def full_history(self) -> list[int]:
+        """
+        The history() of this game as played without
+        collapse_forced_moves, i.e. including the IN_PROGRESS moves
+        applied along with other moves.
+        """
+        history = self.history()
+        if not self._collapse_forced_moves:
+            return history
+        in_progress = int(self._arena.actions.IN_PROGRESS)
+        full_history = []
+        for action, count in zip(history, self._collapsed):
+            full_history.append(action)
+            full_history.extend([in_progress] * count)
+        return full_history
+
     def turns_played(self):
         """Number of turns played thus far."""
         return self._curr_turn
@@ -861,6 +1431,27 @@ class GameState(pyspiel.State):
         """
         return self._victor
 
+    def canonical_key(self) -> tuple:
+        """
+        Hashable key shared by all states with the same future: the
+        same legal actions, the same transitions and the same returns
+        from here on out, regardless of the history that led to them.
+        Histories that transpose into one another (e.g. reaching the
+        same attack stage and utilities with different detect actions
+        along the way) share a key, which lets state enumeration treat
+        the game tree as a DAG. Not an information state: observations
+        (which include the history) still differ between such states.
+        """
+        if self._game_over:
+            return (self._victor, self._attacker.utility,
+                    self._defender.utility)
+        key = (int(self._current_player), self._num_turns - self._curr_turn,
+                self._attacker.canonical_key(), self._defender.canonical_key())
+        if self._chance:
+            # the move or sweep awaiting a chance outcome
+            key += (self._chance,)
+        return key
+
     def __str__(self):
         """String for debugging. No particular semantics."""
         return f"Attacker pos at Turn {self._curr_turn+1}: {self._attacker.state_pos}"
@@ -876,7 +1467,7 @@ class OmniscientObserver:
     is algorithms.generate_playthrough. See examples/playthrough.py.
     """
 
-    def __init__(self, params):  # pylint: disable=unused-argument
+    def __init__(self, params, hist_size=game_max_turns):  # pylint: disable=unused-argument
         # note: params is invariant, it can't be used to pass things
         # back and forth between states and observer
 
@@ -884,7 +1475,6 @@ class OmniscientObserver:
         #num_turns = params["num_turns"]
 
         board_size = 3 # atk_pos, atk_util, def_util
-        hist_size = game_max_turns
         tensor_size = board_size + hist_size
         self.tensor = np.zeros(tensor_size, int)
         self.dict = {}
@@ -953,14 +1543,37 @@ class Game(pyspiel.Game):
         called with a single argument of the parameters for this game
         instance.
         """
-        self.game_type = _GAME_TYPE
-        self.game_info = make_game_info(params["num_turns"])
+        explicit_chance = bool(params.get("explicit_chance", 0))
+        if explicit_chance:
+            self.game_type = make_game_type(
+                    pyspiel.GameType.ChanceMode.EXPLICIT_STOCHASTIC)
+        else:
+            self.game_type = _GAME_TYPE
+        self.game_info = make_game_info(params["num_turns"],
+                explicit_chance=explicit_chance)
         super().__init__(self.game_type, self.game_info, params)
         #print("\ngame params:\n", self.get_parameters(), "\n")
+        # the arena is not modified during play, so all states of this
+        # game share a single one
+        game_params = self.get_parameters()
+        self._arena = arena_mod.get_arena(
+                advancement_rewards=game_params["advancement_rewards"],
+                detection_costs=game_params["detection_costs"],
+                use_waits=bool(game_params["use_waits"]),
+                use_timewaits=bool(game_params["use_timewaits"]),
+                use_chance_fail=bool(game_params["use_chance_fail"]))
 
-    def new_initial_state(self):
-        """Return a new GameState object"""
-        return GameState(self, self.game_info)
+    @property
+    def arena(self):
+        return self._arena
+
+    def new_initial_state(self, seed_seq=None):
+        """
+        Return a new GameState object, drawing from streams seeded by
+        `seed_seq` (a numpy.random.SeedSequence) if given.
+        """
+        return GameState(self, self.game_info, game_arena=self._arena,
+                seed_seq=seed_seq)
 
     #def make_py_observer(self, iig_obs_type=None, params=None):
     #    return OmniscientObserver(params)
@@ -975,7 +1588,9 @@ class Game(pyspiel.Game):
         #    debug(dir(iig_obs_type))
         #    debug(iig_obs_type.private_info)
         #    debug(dir(iig_obs_type.private_info))
-        return OmniscientObserver(params)
+        # histories include chance outcomes with explicit_chance
+        return OmniscientObserver(params,
+                hist_size=max(game_max_turns, self.max_game_length()))
 
 
 pyspiel.register_game(_GAME_TYPE, Game)
@@ -0,0 +1,274 @@
+"""
+Vectorized RL environments for training DQN agents against fixed
+policies.
+
+A VectorEnvironment runs a number of rl_environment.Environment games
+side by side, each with its own fixed policy bot for the opposing
+player. The opponent moves are played within the environment, so every
+game is always waiting on the learning player and their info_state
+tensors can be stacked into a single batch. The games can be spread
+across subprocess workers in order to use more than one core.
+
+BatchedDQN does for a DQN agent (open_spiel.python.algorithms.dqn, the
+TF1 version used by rl_train.py) what DQN.step() does for a single
+environment: one forward pass per batch to pick epsilon-greedy actions
+for all of the games, one transition per game into the replay buffer,
+and learning/target network updates at the same rate per transition as
+DQN.step() would.
+"""
+
+import multiprocessing as mp
+
+import numpy as np
+import pyspiel
+
+from open_spiel.python import rl_environment
+
+try:
+    # as part of the package
+    from . import util
+except ImportError:
+    # as a sibling of the scripts in this directory
+    import util
+
+
+class _Environment(rl_environment.Environment):
+    """
+    An rl_environment.Environment whose games draw their chance events
+    from streams spawned from `seed_seq`, a numpy.random.SeedSequence,
+    rather than from the module level random.
+    """
+
+    def __init__(self, game, seed_seq):
+        super().__init__(game,
+                chance_event_sampler=rl_environment.ChanceEventSampler(
+                    seed=int(seed_seq.generate_state(1)[0])))
+        self._seed_seq = seed_seq
+
+    def reset(self):
+        time_step = super().reset()
+        # the same initial state (never a chance node), with streams of
+        # its own
+        self._state = self._game.new_initial_state(
+                seed_seq=self._seed_seq.spawn(1)[0])
+        return time_step
+
+
+class _EnvSlice:
+    """
+    Environments played in one process, each advanced to the turns of
+    the learning player.
+    """
+
+    def __init__(self, game_string, player_id, opponent_policy,
+            num_envs, opponent_action_picker=None, seed=None):
+        # the bots and games draw from streams of their own, played in
+        # the caller's process they would otherwise draw from (and a
+        # seed would reset) its np.random and random
+        bot_seed_seq, *env_seed_seqs = \
+                np.random.SeedSequence(seed).spawn(num_envs + 1)
+        rng = np.random.default_rng(bot_seed_seq)
+        game = pyspiel.load_game(game_string)
+        self._player_id = player_id
+        self._envs = [_Environment(game, x) for x in env_seed_seqs]
+        self._bots = [util.get_player_bot(game, 1 - player_id,
+            opponent_policy, action_picker=opponent_action_picker, rng=rng)
+            for _ in range(num_envs)]
+
+    def _advance(self, idx, time_step):
+        env, bot = self._envs[idx], self._bots[idx]
+        while not time_step.last() and \
+                time_step.observations["current_player"] != self._player_id:
+            time_step = env.step([bot.step(env.get_state)])
+        return time_step
+
+    def _reset(self, idx):
+        self._bots[idx].restart()
+        return self._advance(idx, self._envs[idx].reset())
+
+    def reset(self):
+        return [self._reset(i) for i in range(len(self._envs))]
+
+    def step(self, actions):
+        time_steps = []
+        for i, action in enumerate(actions):
+            if action is None:
+                time_steps.append(self._reset(i))
+            else:
+                time_steps.append(
+                        self._advance(i, self._envs[i].step([action])))
+        return time_steps
+
+
+def _worker(conn, args, kwargs):
+    env_slice = _EnvSlice(*args, **kwargs)
+    while True:
+        cmd, data = conn.recv()
+        if cmd == "reset":
+            conn.send(env_slice.reset())
+        elif cmd == "step":
+            conn.send(env_slice.step(data))
+        elif cmd == "close":
+            conn.close()
+            break
+
+
+class VectorEnvironment:
+    """
+    `num_envs` games of `game` in which `player_id` is played by the
+    caller and the other player by a bot with the given policy.
+
+    reset() and step() return one TimeStep per game, always at a turn of
+    `player_id` or at the end of the game. step() takes one action per
+    game; a game that ended on the previous step is reset (and its
+    action, which should be None, is ignored).
+
+    With `workers` the games are split across that many subprocesses,
+    otherwise they are all played in this process.
+    """
+
+    def __init__(self, game, player_id, opponent_policy, num_envs,
+            opponent_action_picker=None, workers=0, seed=None):
+        assert num_envs > 0
+        game_string = str(game)
+        self._num_envs = num_envs
+        self._player_id = player_id
+        self._episodes = 0
+        self._last = [False] * num_envs
+        self._local = None
+        self._conns = []
+        self._procs = []
+        if not workers or workers <= 1:
+            self._local = _EnvSlice(game_string, player_id,
+                    opponent_policy, num_envs,
+                    opponent_action_picker=opponent_action_picker,
+                    seed=seed)
+            return
+        self._slices = [x.tolist() for x in
+                np.array_split(np.arange(num_envs), workers) if len(x)]
+        for i, idxs in enumerate(self._slices):
+            parent_conn, child_conn = mp.Pipe()
+            worker_seed = None if seed is None else seed + i
+            proc = mp.Process(target=_worker, args=(child_conn,
+                (game_string, player_id, opponent_policy, len(idxs)),
+                {"opponent_action_picker": opponent_action_picker,
+                    "seed": worker_seed}), daemon=True)
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+
+    @property
+    def num_envs(self):
+        return self._num_envs
+
+    @property
+    def player_id(self):
+        return self._player_id
+
+    @property
+    def episodes(self):
+        """
+        Number of games played to the end so far.
+        """
+        return self._episodes
+
+    def _tally(self, time_steps):
+        self._last = [x.last() for x in time_steps]
+        self._episodes += sum(self._last)
+        return time_steps
+
+    def reset(self):
+        if self._local:
+            return self._tally(self._local.reset())
+        for conn in self._conns:
+            conn.send(("reset", None))
+        return self._tally([x for conn in self._conns for x in conn.recv()])
+
+    def step(self, actions):
+        assert len(actions) == self._num_envs
+        actions = [None if last else action
+                for action, last in zip(actions, self._last)]
+        if self._local:
+            return self._tally(self._local.step(actions))
+        for conn, idxs in zip(self._conns, self._slices):
+            conn.send(("step", [actions[i] for i in idxs]))
+        return self._tally([x for conn in self._conns for x in conn.recv()])
+
+    def close(self):
+        for conn in self._conns:
+            conn.send(("close", None))
+            conn.close()
+        for proc in self._procs:
+            proc.join()
+        self._conns = []
+        self._procs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BatchedDQN:
+    """
+    Drive a DQN agent over the time steps of a VectorEnvironment. Keeps
+    the previous time step and action of each game, which DQN itself
+    only keeps for a single environment.
+    """
+
+    def __init__(self, agent, num_envs):
+        self._agent = agent
+        self._prev_time_steps = [None] * num_envs
+        self._prev_actions = [None] * num_envs
+
+    @property
+    def agent(self):
+        return self._agent
+
+    def _q_values(self, info_states):
+        agent = self._agent
+        return agent._session.run(agent._q_values,
+                feed_dict={agent._info_state_ph: info_states})
+
+    def step(self, time_steps, is_evaluation=False):
+        """
+        Return an action for each time step (None for the last step of
+        a game), recording transitions and learning unless evaluating.
+        """
+        agent = self._agent
+        player_id = agent.player_id
+        actions = [None] * len(time_steps)
+        live = [i for i, x in enumerate(time_steps) if not x.last()]
+        if live:
+            info_states = np.array(
+                    [time_steps[i].observations["info_state"][player_id]
+                        for i in live])
+            q_values = self._q_values(info_states)
+            epsilon = agent._get_epsilon(is_evaluation)
+            for row, i in enumerate(live):
+                legal_actions = \
+                        time_steps[i].observations["legal_actions"][player_id]
+                if np.random.rand() < epsilon:
+                    actions[i] = int(np.random.choice(legal_actions))
+                else:
+                    legal_q_values = q_values[row][legal_actions]
+                    actions[i] = int(legal_actions[np.argmax(legal_q_values)])
+        if is_evaluation:
+            return actions
+        for i, time_step in enumerate(time_steps):
+            agent._step_counter += 1
+            if agent._step_counter % agent._learn_every == 0:
+                agent._last_loss_value = agent.learn()
+            if agent._step_counter % agent._update_target_network_every == 0:
+                agent._session.run(agent._update_target_network)
+            if self._prev_time_steps[i] is not None:
+                agent.add_transition(self._prev_time_steps[i],
+                        self._prev_actions[i], time_step)
+            if time_step.last():
+                self._prev_time_steps[i] = self._prev_actions[i] = None
+            else:
+                self._prev_time_steps[i] = time_step
+                self._prev_actions[i] = actions[i]
+        return actions
@@ -1,11 +1,24 @@
 #!/bin/env python3
 #
-# Extract all of the leaf nodes from tools.states (via
-# algorithms.get_all_states) and feed them one by one through
-# algorithms.generate_playthrough. Parse the output and save each of
-# these playthroughs to JSON files.
+# Generate a playthrough for every leaf (terminal) node of a game and
+# save each of them to a JSON file.
+#
+# The text playthroughs are produced by extracting all of the leaf nodes
+# from tools.states (via algorithms.get_all_states) and feeding them one
+# by one through algorithms.generate_playthrough.
+#
+# The JSON playthroughs skip the text round trip (generating the text,
+# then parsing it with tools.parsers). Instead the game tree is walked
+# once, depth first, and records equivalent to what parse_playthrough()
+# yields are built directly from the states along the way; each state
+# on the path to a leaf is only examined once no matter how many leaves
+# share it. Leaves are sharded the same way as
+# generate_playthrough.update_path(): shard `i` of `n` gets every `n`th
+# leaf starting at `i`, so shards can be spread across processes
+# (--workers) or machines (--shard/--num-shards).
 
-import os, sys, json
+import os, sys, json, argparse
+from concurrent.futures import ProcessPoolExecutor
 
 import pyspiel
 
@@ -15,62 +28,256 @@ from tools.states import get_leaf_states
 from algorithms import generate_playthrough
 from gameload import game_name
 
-def playthroughs(game):
-    for state_actions, text in playthroughs_text(game):
-        yield state_actions, parse_playthrough(text)
+# Game attributes and GameType attributes in playthrough records, as
+# in tools.parsers.parse_playthrough()
+Game_Attrs = (
+    'num_distinct_actions',
+    'policy_tensor_shape',
+    'max_chance_outcomes',
+    'get_parameters',
+    'num_players',
+    'min_utility',
+    'max_utility',
+    'utility_sum',
+    'information_state_tensor_shape',
+    'information_state_tensor_layout',
+    'information_state_tensor_size',
+    'observation_tensor_shape',
+    'observation_tensor_layout',
+    'observation_tensor_size',
+    'max_game_length',
+)
+
+Game_Type_Attrs = (
+    "parameter_specification",
+    "provides_information_state_string",
+    "provides_information_state_tensor",
+    "provides_observation_string",
+    "provides_observation_tensor",
+    "provides_factored_observation_string",
+    "reward_model",
+    "short_name",
+    "utility",
+)
+
+def _jsonable(value):
+    try:
+        json.dumps(value)
+    except TypeError:
+        value = str(value)
+    return value
+
+def _load_game(game):
+    if isinstance(game, str):
+        game = pyspiel.load_game(game)
+    return game
+
+def game_record(game):
+    """
+    The game portion of a playthrough record.
+    """
+    record = {"name": str(game)}
+    for attr in Game_Attrs:
+        try:
+            value = getattr(game, attr)()
+        except (pyspiel.SpielError, RuntimeError):
+            # not applicable to this game (e.g. UtilitySum for
+            # general-sum games)
+            continue
+        record[attr] = _jsonable(value)
+    record["to_string"] = str(game)
+    game_type = game.get_type()
+    gt = record["GameType"] = {}
+    for attr in Game_Type_Attrs:
+        value = getattr(game_type, attr)
+        if callable(value):
+            value = value()
+        gt[attr] = _jsonable(value)
+    return record
+
+def state_record(state):
+    """
+    The per state portion of a playthrough record.
+    """
+    game = state.get_game()
+    game_type = game.get_type()
+    players = range(game.num_players())
+    record = {
+        "is_terminal": state.is_terminal(),
+        "history": [int(x) for x in state.history()],
+        "history_string": state.history_str(),
+        "is_chance_node": state.is_chance_node(),
+        "is_simultaneous_node": state.is_simultaneous_node(),
+        "current_player": int(state.current_player()),
+    }
+    if game_type.provides_information_state_string:
+        record["information_state_string"] = \
+                [state.information_state_string(x) for x in players]
+    if game_type.provides_observation_string:
+        record["observation_string"] = \
+                [state.observation_string(x) for x in players]
+    if not state.is_chance_node():
+        record["rewards"] = [float(x) for x in state.rewards()]
+        record["returns"] = [float(x) for x in state.returns()]
+    if not state.is_terminal():
+        player = state.current_player()
+        actions = _actions(state)
+        record["legal_actions"] = [int(x) for x in actions]
+        record["string_legal_actions"] = \
+                [state.action_to_string(player, x) for x in actions]
+    return record
+
+def _actions(state):
+    if state.is_chance_node():
+        return [x for x, _ in state.chance_outcomes()]
+    return state.legal_actions()
+
+def playthrough_records(game, shard_index=0, num_shards=1):
+    """
+    Walk the game tree once and yield (history, record) for each leaf
+    in the given shard. Each record has a "states" list of [action,
+    action string, state record] for every state from the root to the
+    leaf, where the action is the one that led to that state.
+    """
+    game = _load_game(game)
+    if game.get_type().dynamics != pyspiel.GameType.Dynamics.SEQUENTIAL:
+        raise ValueError(f"only sequential games are supported: {game}")
+    header = game_record(game)
+    # the current root to leaf path: [state, action, action string,
+    # state record] with the latter two filled in only once a leaf in
+    # this shard needs them
+    path = []
+    stack = [(0, None, game.new_initial_state())]
+    leaf_idx = 0
+    while stack:
+        depth, action, state = stack.pop()
+        del path[depth:]
+        path.append([state, action, None, None])
+        if not state.is_terminal():
+            for child_action in reversed(_actions(state)):
+                stack.append(
+                        (depth + 1, child_action, state.child(child_action)))
+            continue
+        if leaf_idx % num_shards == shard_index:
+            for i, entry in enumerate(path):
+                if entry[3] is None:
+                    if i:
+                        parent = path[i - 1][0]
+                        entry[2] = parent.action_to_string(
+                                parent.current_player(), entry[1])
+                    entry[3] = state_record(entry[0])
+            record = dict(header)
+            record["states"] = [[x[1], x[2], x[3]] for x in path]
+            yield state.history(), record
+        leaf_idx += 1
+
+def playthroughs(game, shard_index=0, num_shards=1):
+    yield from playthrough_records(game, shard_index=shard_index,
+            num_shards=num_shards)
 
 def playthroughs_text(game):
     if isinstance(game, str):
         game_name = game
     else:
-        game_type = game.get_type()
-        game_name = game_type.short_name
-    for state_actions in get_leaf_states(game):
+        game_name = str(game)
+    for state in get_leaf_states(game):
+        state_actions = state.history()
         playthrough_text = generate_playthrough.playthrough(
                 game_name, state_actions)
         yield state_actions, playthrough_text
 
+def playthroughs_parsed(game):
+    # the text round trip, for comparison
+    for state_actions, text in playthroughs_text(game):
+        yield state_actions, parse_playthrough(text)
+
 def playthroughs_json(game, indent=None):
     for state_actions, playthrough in playthroughs(game):
         yield state_actions, json.dumps(playthrough, indent=indent)
 
+def _action_groups(history, num_players):
+    # one group per round of moves
+    return [history[i:i+num_players]
+            for i in range(0, len(history), num_players)]
+
 def _action_groups_to_str(action_groups):
-    action_str = (f"{x},{y}" for x, y in action_groups)
+    action_str = (','.join(str(y) for y in x) for x in action_groups)
     action_str = '_'.join(action_str)
     return action_str
 
 def gen_playthrough_text_files(game, tgt_dir):
     if not os.path.isdir(tgt_dir):
         raise ValueError(f"not a dir: {tgt_dir}")
-    if isinstance(game, str):
-        game = pyspiel.load_game(game)
+    game = _load_game(game)
     game_type = game.get_type()
-    for action_groups, playthrough_text in playthroughs_text(game):
-        action_str = _action_groups_to_str(action_groups)
+    for state_actions, playthrough_text in playthroughs_text(game):
+        action_str = _action_groups_to_str(
+                _action_groups(state_actions, game.num_players()))
         fname = f"{game_type.short_name}.{action_str}.txt"
         f = os.path.join(tgt_dir, fname)
         with open(f, 'w') as fh:
             print(playthrough_text, file=fh)
 
-def gen_playthrough_json_files(game, tgt_dir, indent=None):
-    if not os.path.isdir(tgt_dir):
-        raise ValueError(f"not a dir: {tgt_dir}")
-    if isinstance(game, str):
-        game = pyspiel.load_game(game)
-    game_type = game.get_type()
+def _gen_shard_json_files(game_string, tgt_dir, indent, shard_index,
+        num_shards):
+    game = pyspiel.load_game(game_string)
+    short_name = game.get_type().short_name
     cnt = 0
-    for action_groups, playthrough in playthroughs(game):
-        action_str = _action_groups_to_str(action_groups)
-        fname = f"{game_type.short_name}.{action_str}.json"
+    for state_actions, playthrough in playthrough_records(game,
+            shard_index=shard_index, num_shards=num_shards):
+        action_str = _action_groups_to_str(
+                _action_groups(state_actions, game.num_players()))
+        fname = f"{short_name}.{action_str}.json"
         f = os.path.join(tgt_dir, fname)
         with open(f, 'w') as fh:
             json.dump(playthrough, fh, indent=indent)
         cnt += 1
     return cnt
 
+def gen_playthrough_json_files(game, tgt_dir, indent=None,
+        shard_index=0, num_shards=1, workers=1):
+    """
+    Write a JSON playthrough file for every leaf in the given shard of
+    the game tree, split further across `workers` processes. Returns
+    the number of files written.
+    """
+    if not os.path.isdir(tgt_dir):
+        raise ValueError(f"not a dir: {tgt_dir}")
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"invalid shard {shard_index} of {num_shards}")
+    game_string = str(_load_game(game))
+    if not workers or workers <= 1:
+        return _gen_shard_json_files(game_string, tgt_dir, indent,
+                shard_index, num_shards)
+    # worker w takes sub-shard w of this shard, i.e. every
+    # (num_shards * workers)th leaf starting at shard_index + w * num_shards
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_gen_shard_json_files, game_string,
+            tgt_dir, indent, shard_index + w * num_shards,
+            num_shards * workers) for w in range(workers)]
+        return sum(x.result() for x in futures)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("output dir required")
-        sys.exit(1)
-    cnt = gen_playthrough_json_files(game_name, sys.argv[1], indent=2)
-    print(f"{cnt} files generated in {sys.argv[1]}")
+    parser = argparse.ArgumentParser(
+            description="Generate a JSON playthrough for every leaf of a game.")
+    parser.add_argument("output_dir",
+            help="Directory in which to save playthroughs.")
+    parser.add_argument("--game", default=game_name,
+            help=f"Game, with optional parameters, e.g. 'chain_game_v6_seq(num_turns=8)'. ({game_name})")
+    parser.add_argument("--text", action="store_true",
+            help="Generate text playthroughs (via generate_playthrough) rather than JSON.")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+            help="Number of worker processes across which to split this shard. (1)")
+    parser.add_argument("--shard", type=int, default=0,
+            help="The shard to generate. (0)")
+    parser.add_argument("--num-shards", type=int, default=1,
+            help="How many shards the leaves are split into, e.g. one per machine. (1)")
+    args = parser.parse_args()
+    if args.text:
+        gen_playthrough_text_files(args.game, args.output_dir)
+        print(f"text playthroughs generated in {args.output_dir}")
+        sys.exit()
+    cnt = gen_playthrough_json_files(args.game, args.output_dir, indent=2,
+            shard_index=args.shard, num_shards=args.num_shards,
+            workers=args.workers)
+    print(f"{cnt} files generated in {args.output_dir}")
@@ -4,6 +4,7 @@ import os, sys, json, glob, argparse
 from datetime import datetime
 
 import games
+from games.v6_simple_base import results_store
 
 game_mod = games.current_game
 game_stub = os.path.dirname(game_mod.__file__)
@@ -22,6 +23,11 @@ if dat_dirs:
 else:
     latest_dump = "no playoff directories currently present"
 
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
 parser = argparse.ArgumentParser(prog="Bot Playoff Selection Filter")
 parser.add_argument("--playoff-dir", "--pd", default=latest_dump,
         help=f"Playoff output directory from which to filter. ({latest_dump})")
@@ -29,155 +35,126 @@ parser.add_argument("--list-playoffs", "--lp", action="store_true",
         help="List available playoff output choices from which to choose.")
 parser.add_argument("--output-dir", "--od", default=default_tmp_dir,
         help=f"Directory in which to store filtered results. ({default_tmp_dir})")
+parser.add_argument("--advancement-rewards", "--ar", nargs="+",
+        help="Advancement rewards to select. (all)")
+parser.add_argument("--detection-costs", "--dc", nargs="+",
+        help="Detection costs to select. (all)")
+parser.add_argument("--attacker-policy", "--ap", nargs="+",
+        help="Attacker policies to select, as policy-action_picker. (all)")
+parser.add_argument("--defender-policy", "--dp", nargs="+",
+        help="Defender policies to select, as policy-action_picker. (all)")
+parser.add_argument("--group-by", "--gb", nargs="+",
+        choices=results_store.Catalog_Fields,
+        help="Rather than collecting the selected summary files, print the mean metrics of the selected permutations grouped by these fields.")
+parser.add_argument("--metrics", nargs="+",
+        choices=results_store.Catalog_Metrics,
+        default=results_store.Catalog_Metrics,
+        help="Metrics to report when grouping. (all)")
+parser.add_argument("--json", action="store_true",
+        help="Print grouped results as JSON.")
+parser.add_argument("--no-prompt", action="store_true",
+        help="Select everything not given on the command line rather than prompting for it. (implied by any of the selection or grouping options)")
+parser.add_argument("--reindex", action="store_true",
+        help="Rebuild the summary catalog of the playoff directory from its JSON summaries.")
 args = parser.parse_args()
-dat_dir = args.playoff_dir
-if not dat_dir.endswith("json"):
-    dat_dir = os.path.join(dat_dir, "json")
-summaries = set()
-for dirpath, _, filenames in os.walk(dat_dir):
-    for file in filenames:
-        if file.endswith(".json"):
-            summaries.add(os.path.join(dirpath, file))
-summaries = sorted(summaries)
-
-print(f"\ndat dir: {dat_dir}")
-print(f"{len(summaries)} summaries found\n")
-if not summaries:
+if args.list_playoffs:
+    for playoff_dir in dat_dirs:
+        print(playoff_dir)
+    sys.exit()
+run_dir = args.playoff_dir
+if run_dir.rstrip(os.sep).endswith("json"):
+    run_dir = os.path.dirname(run_dir.rstrip(os.sep))
+json_dir = os.path.join(run_dir, "json")
+if not os.path.isdir(json_dir):
+    print("whoops, playoff json dir not found:", json_dir)
     sys.exit()
 
-# collect all values for interesting fields
-params = {
-    "defender_policy": set(),
-    "attacker_policy": set(),
-    "advancement_rewards": set(),
-    "detection_costs": set(),
-}
+# the catalog lives in the results store of the playoff run, which is
+# populated as summaries are dumped; runs that predate it (or that
+# were interrupted) are indexed from the JSON summaries here, once
+store = results_store.ResultsStore(
+        os.path.join(run_dir, results_store.ResultsStore.filename))
+# keep stdout clean for --json
+info_fh = sys.stderr if args.json else sys.stdout
+if args.reindex or not store.summary_count():
+    print(f"\nindexing summaries in: {json_dir}", file=info_fh)
+    store.index_summaries(json_dir)
+
+print(f"\nplayoff dir: {run_dir}", file=info_fh)
+print(f"{store.summary_count()} summaries found\n", file=info_fh)
+if not store.summary_count():
+    sys.exit()
 
-for summary in summaries:
-    with open(summary, "r") as f:
-        j = json.load(f)
-        def_policy = (j["defender_policy"],)
-        def_policy = (j["defender_policy"], j.get("defender_action_picker"))
-        params["defender_policy"].add(def_policy)
-        atk_policy = (j["attacker_policy"], j.get("attacker_action_picker"))
-        params["attacker_policy"].add(atk_policy)
-        params["advancement_rewards"].add(j["advancement_rewards"])
-        params["detection_costs"].add(j["detection_costs"])
-for param, vals in params.items():
-    params[param] = sorted(vals)
-
-advancement_rewards = sorted(params["advancement_rewards"])
-print("\nSelect advancement rewards: single reward, comma-separated list,\nor hit return for all:\n")
-choices = set(x+1 for x in range(len(params["advancement_rewards"])))
-for i, val in enumerate(advancement_rewards):
-    print(f"{i+1}: {val}")
-selected = None
-while not selected:
-    selected = input("\nAdvancement rewards: ")
-    if not selected:
-        selected = choices
-    else:
-        selected = [int(x) for x in selected.split(",")]
-        diff = set(selected).difference(choices)
-        if diff:
-            print("invalid choices:", ','.join(sorted(diff)))
-            continue
-    advancement_rewards = set(advancement_rewards[x-1] for x in selected)
-
-detection_costs = sorted(params["detection_costs"])
-print("\nSelect detection costs: single cost, comma-separated list,\nor hit return for all:\n")
-choices = set(x+1 for x in range(len(params["detection_costs"])))
-for i, val in enumerate(params["detection_costs"]):
-    print(f"{i+1}: {val}")
-selected = None
-while not selected:
-    selected = input("\nDetection costs: ")
-    if not selected:
-        selected = choices
-    else:
-        selected = [int(x) for x in selected.split(",")]
-        diff = set(selected).difference(choices)
+prompt = not (args.no_prompt or args.group_by or args.advancement_rewards
+        or args.detection_costs or args.attacker_policy
+        or args.defender_policy)
+
+def _select(field, label, selected=None):
+    """
+    Return the selected values of a catalog field, either as given on
+    the command line, all of them, or as chosen at a prompt.
+    """
+    values = store.distinct(field)
+    if selected:
+        diff = set(selected).difference(values)
         if diff:
-            print("invalid choices:", ','.join(sorted(diff)))
-            continue
-    detection_costs = set(detection_costs[x-1] for x in selected)
-
-atk_compound_policies = set()
-for compound_policy, ap in sorted(params["attacker_policy"]):
-    if ap == "n/a":
-        ap = None
-    if ap:
-        compound_policy = "-".join([compound_policy, ap])
-    atk_compound_policies.add(compound_policy)
-atk_compound_policies = sorted(atk_compound_policies)
-print("\nSelect attacker policy: single policy, comma-separated list,\nor hit return for all:\n")
-choices = set(x+1 for x in range(len(atk_compound_policies)))
-for i, val in enumerate(sorted(atk_compound_policies)):
-    print(f"{i+1}: {val}")
-selected = None
-while not selected:
-    selected = input("\nAttacker policies: ")
-    if not selected:
-        selected = list(choices)
-    else:
-        selected = [int(x) for x in selected.split(",")]
-        diff = set(selected).difference(choices)
-        if diff:
-            print("invalid choices:", ','.join(sorted(diff)))
-            continue
-    atk_compound_policies = set(atk_compound_policies[x-1] for x in selected)
-
-def_compound_policies = set()
-for compound_policy, ap in sorted(params["defender_policy"]):
-    if ap == "n/a":
-        ap = None
-    if ap:
-        compound_policy = "-".join([compound_policy, ap])
-    def_compound_policies.add(compound_policy)
-def_compound_policies = sorted(def_compound_policies)
-print("\nSelect defender policy: single policy, comma-separated list,\nor hit return for all:\n")
-choices = set(x+1 for x in range(len(def_compound_policies)))
-for i, val in enumerate(sorted(def_compound_policies)):
-    print(f"{i+1}: {val}")
-selected = None
-while not selected:
-    selected = input("\nDefender policies: ")
-    if not selected:
-        selected = list(choices)
+            print(f"invalid {label}:", ", ".join(sorted(diff)))
+            sys.exit(1)
+        return selected
+    if not prompt:
+        return values
+    print(f"\nSelect {label}: single choice, comma-separated list,\nor hit return for all:\n")
+    choices = set(x+1 for x in range(len(values)))
+    for i, val in enumerate(values):
+        print(f"{i+1}: {val}")
+    selected = None
+    while not selected:
+        selected = input(f"\n{label.capitalize()}: ")
+        if not selected:
+            selected = choices
+        else:
+            selected = [int(x) for x in selected.split(",")]
+            diff = set(selected).difference(choices)
+            if diff:
+                print("invalid choices:", ','.join(str(x) for x in sorted(diff)))
+                selected = None
+                continue
+    return [values[x-1] for x in sorted(selected)]
+
+filters = {
+    "advancement_rewards": _select("advancement_rewards",
+        "advancement rewards", args.advancement_rewards),
+    "detection_costs": _select("detection_costs",
+        "detection costs", args.detection_costs),
+    "attacker": _select("attacker", "attacker policies",
+        args.attacker_policy),
+    "defender": _select("defender", "defender policies",
+        args.defender_policy),
+}
+
+if args.group_by:
+    rows = store.query(filters=filters, group_by=args.group_by,
+            metrics=args.metrics)
+    if args.json:
+        print(json.dumps(rows, indent=2))
     else:
-        selected = [int(x) for x in selected.split(",")]
-        diff = set(selected).difference(choices)
-        if diff:
-            print("invalid choices:", ','.join(sorted(diff)))
-            continue
-    def_compound_policies = set(def_compound_policies[x-1] for x in selected)
+        names = list(rows[0]) if rows else []
+        widths = [max([len(x)] + [len(_fmt(row[x])) for row in rows])
+                for x in names]
+        print("  ".join(x.ljust(w) for x, w in zip(names, widths)))
+        for row in rows:
+            print("  ".join(_fmt(row[x]).ljust(w)
+                for x, w in zip(names, widths)))
+    sys.exit()
 
 now = datetime.now().isoformat(timespec="seconds")
 tmp_dir = os.path.join(args.output_dir, now)
 if not os.path.exists(tmp_dir):
     os.makedirs(tmp_dir)
 
-for summary in summaries:
-    with open(summary, "r") as f:
-        j = json.load(f)
-        json_keys = j.keys()
-        if j["advancement_rewards"] not in advancement_rewards:
-            continue
-        if j["detection_costs"] not in detection_costs:
-            continue
-        atk_policy = j["attacker_policy"]
-        if j["attacker_action_picker"] \
-                and j["attacker_action_picker"] != "n/a":
-            atk_policy = '-'.join([atk_policy, j["attacker_action_picker"]])
-        if atk_policy not in atk_compound_policies:
-            continue
-        def_policy = j["defender_policy"]
-        if j["defender_action_picker"] \
-                and j["defender_action_picker"] != "n/a":
-            def_policy = '-'.join([def_policy, j["defender_action_picker"]])
-        if def_policy not in def_compound_policies:
-            continue
-        summary_stub = os.path.basename(summary)
-        os.link(summary, os.path.join(tmp_dir, summary_stub))
+for row in store.query(filters=filters):
+    summary = os.path.join(run_dir, row["summary_file"])
+    summary_stub = os.path.basename(summary)
+    os.link(summary, os.path.join(tmp_dir, summary_stub))
 
 print(f"Done! JSON summary files with the parameters selected are in {tmp_dir}")